@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端到端基准测试：启动本地模拟股吧站点（独立进程），用真实的爬取/解析/批量写入流程抓取，输出吞吐、分阶段延迟与峰值内存（JSON）
+用法：python bench/benchCrawl.py --stocks 20 --pages 10 --latency-ms 50 --sink sqlite --output result.json
+      python bench/benchCrawl.py ... --baseline result.json --tolerance 0.1   # 吞吐低于基线超过10%时退出码为1
+写入端：sqlite（临时SQLite文件，默认）或 mysql（使用crawl.conf中的[MYSQL]配置，可用--mysql-db指定基准测试库）
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+import urllib.request
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from common.Config import getconfig
+from common.Metrics import get_metrics
+from bench.sqliteSink import SqliteSink
+
+CONFIG_PATH = os.path.join(PROJECT_DIR, "stockpost", "crawl.conf")
+
+def start_site(args):
+    """在独立进程中启动模拟站点（避免站点占用被测进程的CPU与GIL），返回(进程, 站点地址)"""
+    command = [
+        sys.executable, os.path.join(PROJECT_DIR, "bench", "fakeGuba.py"), "--port", "0",
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        "--error-rate", str(args.error_rate), "--rate-429", str(args.rate_429), "--seed", str(args.seed),
+        "--max-rps", str(args.max_rps),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    site_url = process.stdout.readline().strip()
+    if not site_url:
+        process.kill()
+        raise RuntimeError("模拟站点启动失败")
+    return process, site_url
+
+def write_config(args, site_url, work_dir):
+    """基于crawl.conf生成基准测试配置：关闭代理、缓存、归档、详情页与请求延时（速率控制与重试按参数开启），站点指向本地"""
+    config = getconfig(CONFIG_PATH)
+    overrides = {
+        "BASE": {
+            "STOCK_CODES": ",".join(f"{600000 + i:06d}" for i in range(args.stocks)),
+            "MAX_PAGE": args.pages,
+            "INCREMENTAL": False,
+            "REQUEST_DELAY": 0,
+            "THREAD_NUM": args.threads,
+            "FETCH_ENGINE": args.engine,
+            "ASYNC_CONCURRENCY": args.concurrency,
+            "PARSER": args.parser,
+            "EMBEDDED_JSON": args.embedded_json,
+            "PARSE_EXECUTOR": args.parse_executor,
+            "ADAPTIVE_WORKERS": args.adaptive,
+            "RESULT_QUEUE_SIZE": args.result_queue_size,
+            "LOG_DIR": os.path.join(work_dir, "logs"),
+            "CACHE_DIR": os.path.join(work_dir, "cache"),
+        },
+        "REQUEST": {"BASE_URL": site_url, "PAGE_CACHE": False},
+        "PROXY": {"PROXY_ENABLE": False},
+        "WRITER": {"SEEN_FILTER": False, "WRITE_MODE": args.write_mode},
+        "ARCHIVE": {"ENABLE": False},
+        "DETAIL": {"ENABLE": False},
+        "RATE": {"ENABLE": args.rate_control, "INITIAL_RATE": args.initial_rate, "MAX_RATE": args.max_rate,
+                 "INCREASE": args.rate_increase, "MAX_CONCURRENCY": max(args.threads, args.concurrency)},
+        "RETRY": {"MAX_RETRIES": args.retries, "BASE_DELAY": args.retry_delay, "MAX_DELAY": args.retry_delay * 8},
+        "METRICS": {"PORT": 0, "SNAPSHOT_FILE": ""},
+        "ROLLUP": {"ENABLE": args.rollup},
+    }
+    if args.mysql_db:
+        overrides["MYSQL"] = {"DB_NAME": args.mysql_db}
+    for section, values in overrides.items():
+        if not config.has_section(section):
+            config.add_section(section)
+        for key, value in values.items():
+            config.set(section, key, str(value))
+    config_path = os.path.join(work_dir, "crawl.conf")
+    with open(config_path, "w", encoding="utf-8") as f:
+        config.write(f)
+    return config_path
+
+def count_rows(client):
+    result = client.execute_sql("SELECT COUNT(*) AS n FROM guba_stock_post") if client else None
+    return result[0]["n"] if result else 0
+
+def rollup_mismatches(client):
+    """按小时汇总表与原始表GROUP BY结果不一致的时间段数（未启用汇总时为None）"""
+    from stockpost.postRollup import get_post_rollup, HOURLY_TABLE
+
+    if not client or get_post_rollup() is None:
+        return None
+    expected = client.execute_sql(
+        "SELECT stock_code, DATE_FORMAT(publish_time, '%%Y-%%m-%%d %%H:00:00') AS bucket, COUNT(*) AS post_count, "
+        "SUM(read_count) AS read_sum, SUM(comment_count) AS comment_sum FROM guba_stock_post "
+        "WHERE publish_time IS NOT NULL GROUP BY stock_code, bucket"
+    ) or []
+    actual = client.execute_sql(
+        f"SELECT stock_code, bucket, post_count, read_sum, comment_sum FROM {HOURLY_TABLE} WHERE post_count > 0"
+    ) or []
+    key = lambda row: (row["stock_code"], str(row["bucket"]))
+    value = lambda row: (int(row["post_count"]), int(row["read_sum"] or 0), int(row["comment_sum"] or 0))
+    expected = {key(row): value(row) for row in expected}
+    actual = {key(row): value(row) for row in actual}
+    return sum(1 for k in expected.keys() | actual.keys() if expected.get(k) != actual.get(k))
+
+def peak_rss_mb():
+    """峰值常驻内存（MB）：本进程与已退出的子进程（解析进程池）分别统计"""
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {"self": round(self_kb / 1024, 1), "children": round(children_kb / 1024, 1)}
+
+def run_crawl(args, config_path, work_dir):
+    """运行真实爬取流程，返回(耗时, 入库行数, 汇总不一致的时间段数)"""
+    import crawlStockPostMutilThread as crawler
+
+    crawler.CONFIG_PATH = config_path
+    if args.sink == "sqlite":
+        sink = SqliteSink(os.path.join(work_dir, "bench.db"))
+        crawler.init_mysql = lambda config: sink
+        crawler.upgrade_post_table = lambda client: None
+
+    try:
+        crawler.init_env()
+        rows_before = count_rows(crawler.mysql_client)
+        crawler.init_crawl_queue()
+        elapsed = crawler.start_threads()
+        rows = count_rows(crawler.mysql_client) - rows_before
+        crawler.post_writer.stop()
+        mismatches = rollup_mismatches(crawler.mysql_client)
+    finally:
+        crawler.release_env()
+    return elapsed, rows, mismatches
+
+def compare(report, baseline_path, tolerance):
+    """与基线结果比较吞吐，返回回退项列表"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = []
+    for key in ("pages_per_sec", "rows_per_sec"):
+        if baseline.get(key) and report[key] < baseline[key] * (1 - tolerance):
+            regressions.append({"metric": key, "baseline": baseline[key], "current": report[key]})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端爬取基准测试")
+    parser.add_argument("--stocks", type=int, default=20, help="股票数量")
+    parser.add_argument("--pages", type=int, default=10, help="每个股票的页数")
+    parser.add_argument("--engine", choices=("thread", "async"), default="thread", help="抓取引擎")
+    parser.add_argument("--threads", type=int, default=8, help="爬取线程数（thread引擎）")
+    parser.add_argument("--concurrency", type=int, default=100, help="最大在途请求数（async引擎）")
+    parser.add_argument("--parser", default="lxml", help="列表页解析器")
+    parser.add_argument("--no-embedded-json", dest="embedded_json", action="store_false",
+                        help="不解码列表页内嵌的帖子数据，全部走HTML解析")
+    parser.add_argument("--parse-executor", choices=("thread", "process"), default="thread", help="解析执行方式")
+    parser.add_argument("--no-adaptive", dest="adaptive", action="store_false", help="关闭线程数自适应调整")
+    parser.add_argument("--result-queue-size", type=int, default=200, help="结果队列容量")
+    parser.add_argument("--write-mode", choices=("insert", "load_data"), default="insert", help="写入模式")
+    parser.add_argument("--no-rollup", dest="rollup", action="store_false", help="不维护按股票按小时/按天的汇总表")
+    parser.add_argument("--sink", choices=("sqlite", "mysql"), default="sqlite", help="写入端")
+    parser.add_argument("--mysql-db", default="", help="mysql写入端使用的数据库（默认取crawl.conf）")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="模拟站点固定延迟（毫秒）")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="模拟站点随机延迟上限（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟站点500概率")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="模拟站点429概率")
+    parser.add_argument("--seed", type=int, default=1, help="模拟站点随机种子")
+    parser.add_argument("--max-rps", type=float, default=0.0, help="模拟站点封禁阈值：每秒超出该请求数的部分返回429（0不限）")
+    parser.add_argument("--rate-control", action="store_true", help="启用自适应速率控制（默认关闭，不限速）")
+    parser.add_argument("--initial-rate", type=float, default=20.0, help="自适应速率控制的初始速率（次/秒）")
+    parser.add_argument("--max-rate", type=float, default=1000.0, help="自适应速率控制的速率上限（次/秒）")
+    parser.add_argument("--rate-increase", type=float, default=2.0, help="自适应速率控制每秒增加的速率（次/秒）")
+    parser.add_argument("--retries", type=int, default=0, help="失败页面最多重试次数")
+    parser.add_argument("--retry-delay", type=float, default=0.5, help="第1次重试的退避上限（秒）")
+    parser.add_argument("--output", default="", help="结果JSON输出文件")
+    parser.add_argument("--baseline", default="", help="基线结果JSON，吞吐低于基线超过容差时退出码为1")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="相对基线允许的吞吐下降比例")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="guba_bench_")
+    site_process, site_url = start_site(args)
+    try:
+        config_path = write_config(args, site_url, work_dir)
+        elapsed, rows, mismatches = run_crawl(args, config_path, work_dir)
+        with urllib.request.urlopen(f"{site_url}/stats", timeout=5) as response:
+            site_stats = json.loads(response.read().decode("utf-8"))
+    finally:
+        site_process.terminate()
+        site_process.wait(timeout=10)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    pages_ok = site_stats["status"].get("200", 0)
+    snapshot = get_metrics().snapshot()
+    gauges = snapshot["gauges"]
+    report = {
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "elapsed_seconds": round(elapsed, 3),
+        "pages_requested": args.stocks * args.pages,
+        "pages_ok": pages_ok,
+        "rows": rows,
+        "pages_per_sec": round(pages_ok / elapsed, 2) if elapsed else 0.0,
+        "rows_per_sec": round(rows / elapsed, 2) if elapsed else 0.0,
+        "stages": snapshot["histograms"],
+        "parse_paths": {k: v for k, v in snapshot["counters"].items() if k.startswith("parse_pages")},
+        "rate_control": {k: v for k, v in gauges.items() if k.startswith(("rate_control_", "retry_"))},
+        "rollup_mismatches": mismatches,
+        "peak_rss_mb": peak_rss_mb(),
+        "site": site_stats,
+    }
+    if args.baseline:
+        report["regressions"] = compare(report, args.baseline, args.tolerance)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    sys.exit(1 if report.get("regressions") else 0)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列表页解析器比对与性能测试
+用法：python bench/benchParser.py [--rounds 200]
+对fixtures下的每个样例页：校验lxml实现与BeautifulSoup参考实现输出完全一致，并输出各实现的pages/sec（JSON）
+带内嵌帖子数据（var article_list）的样例页另外校验内嵌数据解析与HTML解析的帖子ID、标题、作者、链接一致，
+并比较两条路径的吞吐（内嵌数据的计数为精确值、发表时间含秒，与HTML的"1.2万"、"MM-DD HH:MM"不要求一致）
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from stockpost.postParser import PARSERS, parse_list_page_with_path
+
+FIXTURE_DIR = os.path.join(PROJECT_DIR, "bench", "fixtures")
+
+def load_fixtures():
+    """读取样例页，文件名格式：list_<布局>_<股票代码>.html"""
+    fixtures = []
+    for name in sorted(os.listdir(FIXTURE_DIR)):
+        if name.startswith("list_") and name.endswith(".html"):
+            stock_code = name[:-len(".html")].rsplit("_", 1)[-1]
+            with open(os.path.join(FIXTURE_DIR, name), "r", encoding="utf-8") as f:
+                fixtures.append((name, stock_code, f.read()))
+    return fixtures
+
+def check_identical(fixtures, now):
+    """校验各解析实现输出一致，返回不一致的样例列表"""
+    mismatches = []
+    for name, stock_code, html in fixtures:
+        reference = PARSERS["bs4"](html, stock_code, now)
+        if not reference:
+            mismatches.append({"fixture": name, "error": "参考实现未解析出帖子"})
+            continue
+        for parser_name, parser in PARSERS.items():
+            result = parser(html, stock_code, now)
+            if result != reference:
+                diff = next((i for i, (a, b) in enumerate(zip(result, reference)) if a != b), min(len(result), len(reference)))
+                mismatches.append({"fixture": name, "parser": parser_name, "first_diff_row": diff,
+                                   "rows": len(result), "reference_rows": len(reference)})
+    return mismatches
+
+# 两条解析路径必须一致的字段
+_IDENTITY_FIELDS = ("stock_code", "post_title", "author_name", "author_id", "author_url", "post_url", "post_id")
+
+def check_embedded(fixtures, now):
+    """各样例页使用的解析路径；内嵌数据路径与HTML路径的身份字段不一致时记为mismatch"""
+    paths, mismatches = {}, []
+    for name, stock_code, html in fixtures:
+        result, path = parse_list_page_with_path(html, stock_code, now)
+        paths[name] = {"path": path, "rows": len(result)}
+        if path != "json":
+            continue
+        reference = PARSERS["lxml"](html, stock_code, now)
+        identity = [tuple(getattr(post, f) for f in _IDENTITY_FIELDS) for post in result]
+        if identity != [tuple(getattr(post, f) for f in _IDENTITY_FIELDS) for post in reference]:
+            mismatches.append({"fixture": name, "parser": "embedded", "rows": len(result), "reference_rows": len(reference)})
+        paths[name]["rounded_in_html"] = sum(1 for a, b in zip(result, reference)
+                                          if (a.read_count, a.comment_count) != (b.read_count, b.comment_count))
+    return paths, mismatches
+
+def bench_embedded(fixtures, rounds, now):
+    """带内嵌数据的样例页：内嵌数据路径与HTML路径的吞吐"""
+    fixtures = [f for f in fixtures if parse_list_page_with_path(f[2], f[1], now)[1] == "json"]
+    if not fixtures:
+        return None
+    report = {}
+    for path, embedded in (("json", True), ("html", False)):
+        pages = 0
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for _, stock_code, html in fixtures:
+                parse_list_page_with_path(html, stock_code, now, embedded=embedded)
+                pages += 1
+        elapsed = time.perf_counter() - start
+        report[path] = {"pages": pages, "seconds": round(elapsed, 4), "pages_per_sec": round(pages / elapsed, 1)}
+    report["speedup_json_vs_html"] = round(report["json"]["pages_per_sec"] / report["html"]["pages_per_sec"], 2)
+    return report
+
+def bench(fixtures, rounds, now):
+    """各解析实现的吞吐（pages/sec、rows/sec）"""
+    report = {}
+    for parser_name, parser in PARSERS.items():
+        pages = rows = 0
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for _, stock_code, html in fixtures:
+                rows += len(parser(html, stock_code, now))
+                pages += 1
+        elapsed = time.perf_counter() - start
+        report[parser_name] = {
+            "pages": pages,
+            "seconds": round(elapsed, 4),
+            "pages_per_sec": round(pages / elapsed, 1),
+            "rows_per_sec": round(rows / elapsed, 1),
+        }
+    report["speedup_lxml_vs_bs4"] = round(report["lxml"]["pages_per_sec"] / report["bs4"]["pages_per_sec"], 2)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="列表页解析器比对与性能测试")
+    parser.add_argument("--rounds", type=int, default=100, help="每个样例页重复解析次数")
+    parser.add_argument("--year", type=int, default=2024, help="补全发表时间用的年份（固定以保证输出可比）")
+    args = parser.parse_args()
+
+    # 参考时间取该年最后一刻，列表页的"MM-DD HH:MM"全部补全为该年份
+    now = datetime.datetime(args.year, 12, 31, 23, 59, 59)
+    fixtures = load_fixtures()
+    mismatches = check_identical(fixtures, now)
+    paths, embedded_mismatches = check_embedded(fixtures, now)
+    mismatches += embedded_mismatches
+    report = {
+        "fixtures": [name for name, _, _ in fixtures],
+        "identical": not mismatches,
+        "mismatches": mismatches,
+        "parse_paths": paths,
+        "throughput": bench(fixtures, args.rounds, now),
+        "embedded_throughput": bench_embedded(fixtures, args.rounds, now),
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动耗时基准测试：在全新解释器进程中测量主模块导入耗时、各依赖的导入耗时排行，
+以及从进程启动到抓取到第一个列表页的耗时（对本地模拟站点，区分新建连接与keep-alive复用）
+用法：python bench/benchStartup.py --rounds 5 --output startup.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from bench.benchCrawl import start_site
+
+# 在子进程中执行：导入主模块，创建抓取会话，请求首个列表页与后续列表页
+FIRST_REQUEST_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import crawlStockPostMutilThread
+imported = time.perf_counter()
+from stockpost.httpClient import create_session
+session = create_session({"User-Agent": "bench"}, pool_maxsize=1)
+site_url, requests_num = sys.argv[1], int(sys.argv[2])
+response = session.get(f"{site_url}/list,600000_1.html", timeout=10)
+response.raise_for_status()
+first = time.perf_counter()
+warm = []
+for page in range(2, requests_num + 2):
+    t = time.perf_counter()
+    session.get(f"{site_url}/list,600000_{page}.html", timeout=10).raise_for_status()
+    warm.append(time.perf_counter() - t)
+print(json.dumps({"import": imported - start, "first_request": first - imported,
+                  "to_first_page": first - start, "warm_request": sum(warm) / len(warm)}))
+"""
+
+def measure_import(rounds):
+    """主模块导入耗时（每轮一个全新进程），返回(各轮耗时, 最后一轮的-X importtime输出)"""
+    timings = []
+    importtime = ""
+    for _ in range(rounds):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c",
+             "import time; t = time.perf_counter(); import crawlStockPostMutilThread; "
+             "print(time.perf_counter() - t)"],
+            cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+        )
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+        importtime = result.stderr
+    return timings, importtime
+
+def top_imports(importtime, top):
+    """解析-X importtime输出，返回主模块直接导入的依赖中累计耗时最高的若干项（毫秒）"""
+    entries = []
+    for line in importtime.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # 主模块的直接依赖缩进为3个空格（顶层为1个）
+        if name.startswith("   ") and not name.startswith("    "):
+            try:
+                entries.append((name.strip(), int(cumulative) / 1000))
+            except ValueError:
+                continue
+    entries.sort(key=lambda item: item[1], reverse=True)
+    return [{"module": name, "ms": round(ms, 1)} for name, ms in entries[:top]]
+
+def measure_first_request(site_url, rounds, requests_num):
+    """从进程启动到抓取到第一个列表页的耗时（每轮一个全新进程）"""
+    results = []
+    for _ in range(rounds):
+        result = subprocess.run(
+            [sys.executable, "-c", FIRST_REQUEST_SCRIPT, site_url, str(requests_num)],
+            cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+        )
+        results.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return results
+
+def summarize(values):
+    return {
+        "median_ms": round(statistics.median(values) * 1000, 2),
+        "min_ms": round(min(values) * 1000, 2),
+        "max_ms": round(max(values) * 1000, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时基准测试")
+    parser.add_argument("--rounds", type=int, default=5, help="测量轮数（每轮一个全新进程）")
+    parser.add_argument("--requests", type=int, default=20, help="首个页面之后继续请求的页面数（测量keep-alive复用）")
+    parser.add_argument("--top", type=int, default=10, help="输出导入耗时最高的依赖数量")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="模拟站点固定延迟（毫秒）")
+    parser.add_argument("--output", default="", help="结果JSON输出文件")
+    args = parser.parse_args()
+
+    import_timings, importtime = measure_import(args.rounds)
+    site_args = argparse.Namespace(latency_ms=args.latency_ms, jitter_ms=0.0, error_rate=0.0, rate_429=0.0, seed=1,
+                                   max_rps=0.0)
+    site_process, site_url = start_site(site_args)
+    try:
+        first_results = measure_first_request(site_url, args.rounds, args.requests)
+    finally:
+        site_process.terminate()
+        site_process.wait(timeout=10)
+
+    report = {
+        "params": vars(args),
+        "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "import": summarize(import_timings),
+        "top_imports": top_imports(importtime, args.top),
+        "to_first_page": summarize([r["to_first_page"] for r in first_results]),
+        "first_request": summarize([r["first_request"] for r in first_results]),
+        "warm_request": summarize([r["warm_request"] for r in first_results]),
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
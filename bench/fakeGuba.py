@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模拟股吧站点：用fixtures下录制的列表页响应 GET /list,<股票代码>_<页码>.html，可配置延迟、错误率与429限流
+每个股票+页码返回的帖子ID互不相同（改写帖子链接），入库行数与真实抓取一致
+--max-rps模拟站点的封禁阈值：每秒请求数超过该值的部分返回429（Retry-After: 1），用于验证自适应速率控制
+用法：python bench/fakeGuba.py --port 8900 --latency-ms 50 --jitter-ms 20 --error-rate 0.01 --rate-429 0.01 --max-rps 50
+启动后第一行输出站点地址；GET /stats 返回各状态码的响应次数（JSON）
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+_LIST_PATH = re.compile(r"^/list,(\w+)_(\d+)\.html$")
+_POST_LINK = re.compile(r"/news,\w+,(\d+)\.html")
+# 内嵌帖子数据（var article_list）中的帖子ID与股吧代码
+_JSON_POST_ID = re.compile(r'"post_id":"?(\d+)"?')
+_JSON_BAR_CODE = re.compile(r'"stockbar_code":"\w+"')
+
+def load_templates():
+    """读取录制的列表页（list_<布局>_<股票代码>.html）"""
+    templates = []
+    for name in sorted(os.listdir(FIXTURE_DIR)):
+        if name.startswith("list_") and name.endswith(".html"):
+            with open(os.path.join(FIXTURE_DIR, name), "r", encoding="utf-8") as f:
+                templates.append(f.read())
+    if not templates:
+        raise FileNotFoundError(f"未找到列表页样例：{FIXTURE_DIR}")
+    return templates
+
+class FakeGubaServer:
+    """模拟股吧站点（可在测试代码中直接start/stop）"""
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_429=0.0,
+                 seed=None, max_rps=0.0):
+        """
+        :param latency_ms: 每个请求的固定延迟（毫秒）
+        :param jitter_ms: 在固定延迟上叠加的随机延迟上限（毫秒）
+        :param error_rate: 返回500的概率
+        :param rate_429: 返回429（Retry-After: 1）的概率
+        :param seed: 随机种子（固定后错误分布可复现）
+        :param max_rps: 每秒允许的请求数（令牌桶，突发为1秒的量），超出返回429；0表示不限
+        """
+        self.templates = load_templates()
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.max_rps = max_rps
+        self._tokens = max_rps
+        self._tokens_time = time.monotonic()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.status_counts = {}
+        self.bytes_sent = 0
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # 响应头与响应体分两次发送，关闭Nagle避免keep-alive连接上每个响应多等一个延迟ACK（约40ms）
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                if self.path == "/stats":
+                    self._send(200, json.dumps(site.stats()).encode("utf-8"), "application/json", count=False)
+                    return
+                match = _LIST_PATH.match(self.path)
+                if not match:
+                    self._send(404, b"not found")
+                    return
+                with site._lock:
+                    delay = site.latency + site._random.random() * site.jitter
+                    roll = site._random.random()
+                    over_limit = not site._take_token()
+                if delay > 0:
+                    time.sleep(delay)
+                if over_limit or roll < site.rate_429:
+                    self._send(429, b"too many requests", headers={"Retry-After": "1"})
+                elif roll < site.rate_429 + site.error_rate:
+                    self._send(500, b"internal error")
+                else:
+                    self._send(200, site.render(match.group(1), int(match.group(2))))
+
+            def _send(self, status, body, content_type="text/html; charset=utf-8", headers=None, count=True):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+                if count:
+                    with site._lock:
+                        site.status_counts[status] = site.status_counts.get(status, 0) + 1
+                        site.bytes_sent += len(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self._thread = None
+
+    def _take_token(self):
+        """按max_rps消耗一个令牌（调用方持有锁），令牌不足时返回False"""
+        if self.max_rps <= 0:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.max_rps, self._tokens + (now - self._tokens_time) * self.max_rps)
+        self._tokens_time = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def render(self, stock_code, page):
+        """
+        生成指定股票与页码的列表页：帖子链接改写为 /news,股票代码,股票代码+原ID+页码.html
+        内嵌帖子数据中的帖子ID同样改写（改为字符串，股票代码可能以0开头）
+        """
+        html = self.templates[page % len(self.templates)]
+        html = _POST_LINK.sub(lambda m: f"/news,{stock_code},{stock_code}{m.group(1)}{page:05d}.html", html)
+        html = _JSON_POST_ID.sub(lambda m: f'"post_id":"{stock_code}{m.group(1)}{page:05d}"', html)
+        html = _JSON_BAR_CODE.sub(f'"stockbar_code":"{stock_code}"', html)
+        return html.encode("utf-8")
+
+    def stats(self):
+        with self._lock:
+            return {"status": {str(k): v for k, v in sorted(self.status_counts.items())}, "bytes_sent": self.bytes_sent}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟股吧站点")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900, help="监听端口（0表示随机端口）")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="固定响应延迟（毫秒）")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="随机延迟上限（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500的概率")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="返回429的概率")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    parser.add_argument("--max-rps", type=float, default=0.0, help="每秒允许的请求数，超出返回429（0不限）")
+    args = parser.parse_args()
+    site = FakeGubaServer(args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate, args.rate_429, args.seed,
+                          args.max_rps)
+    print(site.url, flush=True)
+    try:
+        site.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    sys.exit(0)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
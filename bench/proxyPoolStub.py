@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+代理池接口本地桩：GET /get 依次返回配置的代理地址，用于在本地验证ProxyManage的预取、打分与淘汰
+用法：python bench/proxyPoolStub.py --port 5010 --proxies 127.0.0.1:8001,127.0.0.1:8002
+"""
+import json
+import argparse
+import itertools
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class ProxyPoolStub:
+    """代理池桩服务（可在测试代码中直接start/stop）"""
+    def __init__(self, proxies, host="127.0.0.1", port=0):
+        self.proxies = list(proxies)
+        self._cycle = itertools.cycle(self.proxies) if self.proxies else None
+        self._lock = threading.Lock()
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/get"):
+                    with stub._lock:
+                        stub.requests += 1
+                        body = next(stub._cycle) if stub._cycle else ""
+                elif self.path.startswith("/stats"):
+                    body = json.dumps({"requests": stub.requests, "proxies": stub.proxies})
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.server.server_address[1]}/get"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="代理池接口本地桩")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5010)
+    parser.add_argument("--proxies", default="127.0.0.1:8001,127.0.0.1:8002,127.0.0.1:8003",
+                        help="逗号分隔的代理地址列表")
+    args = parser.parse_args()
+    stub = ProxyPoolStub([p for p in args.proxies.split(",") if p], args.host, args.port)
+    print(f"代理池桩已启动：{stub.url}")
+    stub.server.serve_forever()
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
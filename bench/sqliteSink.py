@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试用SQLite写入端：提供与MysqlDB相同的transaction/execute_sql/batch_execute_sql接口，
+把写入SQL中MySQL特有的语法（%s占位符、ON DUPLICATE KEY UPDATE、DATE_FORMAT、FOR UPDATE等行锁）改写为SQLite等价语法
+（SQLite单连接写操作串行，行锁语句直接去掉）
+"""
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS guba_stock_post (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    stock_code TEXT NOT NULL,
+    post_id TEXT NOT NULL DEFAULT '',
+    post_title TEXT NOT NULL,
+    author_name TEXT DEFAULT '',
+    author_id TEXT DEFAULT '',
+    author_url TEXT DEFAULT '',
+    publish_time TEXT DEFAULT NULL,
+    read_count INTEGER NOT NULL DEFAULT 0,
+    comment_count INTEGER NOT NULL DEFAULT 0,
+    like_count INTEGER DEFAULT NULL,
+    post_url TEXT DEFAULT '',
+    crawl_time TEXT DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (post_id)
+)
+"""
+
+CREATE_ROLLUP_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    stock_code TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    post_count INTEGER NOT NULL DEFAULT 0,
+    read_sum INTEGER NOT NULL DEFAULT 0,
+    comment_sum INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (stock_code, bucket)
+)
+"""
+
+# 各表ON DUPLICATE KEY UPDATE对应的冲突键
+_CONFLICT_KEYS = {
+    "guba_stock_post_hourly": "stock_code, bucket",
+    "guba_stock_post_daily": "stock_code, bucket",
+}
+
+_UPSERT = re.compile(r"ON DUPLICATE KEY UPDATE", re.IGNORECASE)
+_VALUES_REF = re.compile(r"VALUES\((\w+)\)", re.IGNORECASE)
+_INSERT_TABLE = re.compile(r"INSERT\s+INTO\s+(\w+)", re.IGNORECASE)
+_ROW_LOCK = re.compile(r"\s+(FOR UPDATE|LOCK IN SHARE MODE)\s*$", re.IGNORECASE)
+_DATE_FORMAT = re.compile(r"DATE_FORMAT\(([^,]+),\s*('[^']*')\)", re.IGNORECASE)
+_GREATEST = re.compile(r"\bGREATEST\(", re.IGNORECASE)
+
+def to_sqlite_sql(sql):
+    """MySQL语法改写为SQLite语法"""
+    sql = sql.replace("%s", "?").replace("%%", "%")
+    sql = _ROW_LOCK.sub("", sql)
+    sql = _GREATEST.sub("MAX(", sql)
+    sql = _DATE_FORMAT.sub(lambda m: f"strftime({m.group(2).replace('%i', '%M')}, {m.group(1)})", sql)
+    if _UPSERT.search(sql):
+        table = _INSERT_TABLE.search(sql)
+        conflict = _CONFLICT_KEYS.get(table.group(1) if table else "", "post_id")
+        sql = _UPSERT.sub(f"ON CONFLICT({conflict}) DO UPDATE SET", sql)
+    return _VALUES_REF.sub(r"excluded.\1", sql)
+
+class _Cursor:
+    """游标包装：执行前改写SQL，查询结果为字典（与DictCursor一致）"""
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        return self._cursor.execute(to_sqlite_sql(sql), params or ())
+
+    def executemany(self, sql, params_list):
+        return self._cursor.executemany(to_sqlite_sql(sql), params_list)
+
+    def fetchall(self):
+        return [dict(row) for row in self._cursor.fetchall()]
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+class SqliteSink:
+    """SQLite写入端（单连接，写操作串行）"""
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(CREATE_TABLE_SQL)
+        for table in _CONFLICT_KEYS:
+            self._conn.execute(CREATE_ROLLUP_TABLE_SQL.format(table=table))
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            cursor = _Cursor(self._conn.cursor())
+            try:
+                yield cursor
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def execute_sql(self, sql, params=None):
+        if sql.strip().upper().startswith("CREATE TABLE"):
+            # 表已按SQLite语法建好，MySQL建表语句直接视为成功
+            return True
+        try:
+            with self.transaction() as cursor:
+                cursor.execute(sql, params or ())
+                return cursor.fetchall() if sql.strip().upper().startswith("SELECT") else True
+        except sqlite3.Error:
+            return False
+
+    def batch_execute_sql(self, sql, params_list):
+        try:
+            with self.transaction() as cursor:
+                cursor.executemany(sql, params_list)
+            return True
+        except sqlite3.Error:
+            return False
+
+    def pool_stats(self):
+        return {}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
\ No newline at end of file
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 import configparser
 import os
+from dataclasses import dataclass
 
 def getconfig(config_file_path):
     """
@@ -15,4 +16,70 @@ def getconfig(config_file_path):
     config = configparser.ConfigParser()
     config.optionxform = str  # 保留配置项大小写
     config.read(config_file_path, encoding='utf-8')
-    return config
\ No newline at end of file
+    return config
+
+@dataclass(frozen=True)
+class CrawlSettings:
+    """爬取主流程配置（[BASE]、[REQUEST]），启动时解析一次并转换类型，运行中只读，工作线程不再逐次解析配置字符串"""
+    log_dir: str
+    cache_dir: str
+    max_page: int
+    incremental: bool
+    request_delay: float
+    thread_num: int
+    max_thread_num: int
+    fetch_engine: str
+    async_concurrency: int
+    parser: str
+    embedded_json: bool
+    parse_executor: str
+    parse_processes: int
+    max_parse_thread_num: int
+    crawl_queue_size: int
+    result_queue_size: int
+    adaptive_workers: bool
+    control_interval: float
+    interleave_window: int
+    base_url: str
+    user_agent: str
+    timeout: float
+
+def load_settings(config):
+    """
+    从配置解析爬取主流程配置
+    :param config: getconfig返回的ConfigParser对象
+    :return: CrawlSettings（取值非法时抛出ValueError）
+    """
+    thread_num = config.getint("BASE", "THREAD_NUM")
+    settings = CrawlSettings(
+        log_dir=config.get("BASE", "LOG_DIR"),
+        cache_dir=config.get("BASE", "CACHE_DIR"),
+        max_page=config.getint("BASE", "MAX_PAGE"),
+        incremental=config.getboolean("BASE", "INCREMENTAL", fallback=False),
+        request_delay=config.getfloat("BASE", "REQUEST_DELAY"),
+        thread_num=thread_num,
+        max_thread_num=config.getint("BASE", "MAX_THREAD_NUM", fallback=thread_num),
+        fetch_engine=config.get("BASE", "FETCH_ENGINE", fallback="thread").strip().lower(),
+        async_concurrency=config.getint("BASE", "ASYNC_CONCURRENCY", fallback=100),
+        parser=config.get("BASE", "PARSER", fallback="lxml").strip(),
+        embedded_json=config.getboolean("BASE", "EMBEDDED_JSON", fallback=True),
+        parse_executor=config.get("BASE", "PARSE_EXECUTOR", fallback="thread").strip().lower(),
+        parse_processes=config.getint("BASE", "PARSE_PROCESSES", fallback=0),
+        # 0表示与初始解析线程数相同
+        max_parse_thread_num=config.getint("BASE", "MAX_PARSE_THREAD_NUM", fallback=0),
+        crawl_queue_size=config.getint("BASE", "CRAWL_QUEUE_SIZE", fallback=1000),
+        result_queue_size=config.getint("BASE", "RESULT_QUEUE_SIZE", fallback=200),
+        adaptive_workers=config.getboolean("BASE", "ADAPTIVE_WORKERS", fallback=False),
+        control_interval=config.getfloat("BASE", "CONTROL_INTERVAL", fallback=2.0),
+        interleave_window=config.getint("SOURCE", "INTERLEAVE_WINDOW", fallback=50),
+        base_url=config.get("REQUEST", "BASE_URL", fallback="https://guba.eastmoney.com").rstrip("/"),
+        user_agent=config.get("REQUEST", "USER_AGENT"),
+        timeout=config.getfloat("REQUEST", "TIMEOUT")
+    )
+    if settings.fetch_engine not in ("thread", "async"):
+        raise ValueError(f"不支持的抓取引擎：{settings.fetch_engine}")
+    if settings.parse_executor not in ("thread", "process"):
+        raise ValueError(f"不支持的解析执行方式：{settings.parse_executor}")
+    if settings.max_page < 1 or settings.thread_num < 1:
+        raise ValueError("MAX_PAGE与THREAD_NUM必须大于0")
+    return settings
\ No newline at end of file
@@ -2,45 +2,249 @@
 # -*- coding: utf-8 -*-
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import copy
+import json
+import time
+import queue
+import atexit
+import threading
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 
-def getLogger(log_file_path):
+# 文本日志格式
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(funcName)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 日志设置（init_logging按[LOG]配置更新；未调用时为同步写入，与原行为一致）
+_settings = {
+    "async": False,
+    "format": "text",
+    "console": True,
+    "level": logging.INFO,
+    "rate_limit": 0.0,
+    "rate_burst": 20,
+    "queue_size": 10000,
+}
+_lock = threading.RLock()
+# 已创建的日志对象：日志文件路径 -> logging.Logger
+_loggers = {}
+# 异步模式：日志文件路径 -> 该文件的处理器列表（由后台写入线程调用）
+_targets = {}
+_queue_handler = None
+_listener = None
+_stats = {"dropped": 0, "suppressed": 0}
+
+class JsonFormatter(logging.Formatter):
+    """JSON lines格式：每条日志一行JSON，便于日志平台直接采集"""
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "file": record.filename,
+            "line": record.lineno,
+            "func": record.funcName,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class RateLimitFilter(logging.Filter):
     """
-    创建可滚动分割的日志对象
-    :param log_file_path: 日志文件完整路径
-    :return: logging.Logger对象
+    按调用位置（文件+行号）限流的令牌桶：每个位置先放行rate_burst条，之后每秒最多rate_limit条，
+    只限制INFO及以下级别；恢复放行时在消息后注明期间省略的条数
     """
-    # 创建日志目录
-    log_dir = os.path.dirname(log_file_path)
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir, exist_ok=True)
+    def __init__(self, rate_limit, rate_burst):
+        super().__init__()
+        self.rate_limit = rate_limit
+        self.rate_burst = max(1, int(rate_burst))
+        self._buckets = {}
+        self._lock = threading.Lock()
 
-    # 日志格式配置
-    log_formatter = logging.Formatter(
-        '%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(funcName)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, suppressed = self._buckets.get(key, (self.rate_burst, now, 0))
+            tokens = min(self.rate_burst, tokens + (now - last) * self.rate_limit)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now, suppressed + 1)
+                _stats["suppressed"] += 1
+                return False
+            self._buckets[key] = (tokens - 1, now, 0)
+        if suppressed:
+            record.msg = f"{record.getMessage()}（期间省略 {suppressed} 条同类日志）"
+            record.args = None
+        return True
+
+class _DropQueueHandler(QueueHandler):
+    """队列满时丢弃日志并计数，不阻塞工作线程"""
+    def prepare(self, record):
+        """入队前合并消息参数、格式化异常堆栈（保留为exc_text，由写入线程按各自格式输出）"""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
 
-    # 创建logger对象
-    logger = logging.getLogger(log_file_path)
-    logger.setLevel(logging.INFO)
-    logger.handlers.clear()  # 清除重复处理器
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _stats["dropped"] += 1
 
-    # 文件处理器（按大小分割，最大100MB，保留5个备份）
+class _DispatchHandler(logging.Handler):
+    """后台写入线程使用：按日志对象名称（日志文件路径）分发到对应文件的处理器"""
+    def handle(self, record):
+        for handler in _targets.get(record.name, ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+def _build_handlers(log_file_path):
+    """创建文件处理器（按大小分割，最大100MB，保留5个备份）与控制台处理器"""
+    log_dir = os.path.dirname(log_file_path)
+    if log_dir and not os.path.exists(log_dir):
+        os.makedirs(log_dir, exist_ok=True)
+
+    text_formatter = logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT)
     file_handler = RotatingFileHandler(
         log_file_path,
         maxBytes=1024 * 1024 * 100,
         backupCount=5,
         encoding='utf-8'
     )
-    file_handler.setFormatter(log_formatter)
+    file_handler.setFormatter(JsonFormatter() if _settings["format"] == "json" else text_formatter)
+    handlers = [file_handler]
+
+    if _settings["console"]:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(text_formatter)
+        handlers.append(console_handler)
+    return handlers
+
+def _close_handlers(handlers):
+    for handler in handlers:
+        try:
+            handler.close()
+        except Exception:
+            pass
+
+def _configure(logger):
+    """按当前设置为日志对象挂载处理器（同步：直接写文件/终端；异步：只入队，由后台线程写入）"""
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        if handler is not _queue_handler:
+            _close_handlers([handler])
+    _close_handlers(_targets.pop(logger.name, ()))
+    logger.filters.clear()
+
+    logger.setLevel(_settings["level"])
+    logger.propagate = False
+    if _settings["rate_limit"] > 0:
+        logger.addFilter(RateLimitFilter(_settings["rate_limit"], _settings["rate_burst"]))
+
+    handlers = _build_handlers(logger.name)
+    if _settings["async"]:
+        _targets[logger.name] = handlers
+        logger.addHandler(_queue_handler)
+    else:
+        for handler in handlers:
+            logger.addHandler(handler)
+
+def _get_logger(log_file_path):
+    logger = _loggers.get(log_file_path)
+    if logger is None:
+        with _lock:
+            logger = _loggers.get(log_file_path)
+            if logger is None:
+                logger = logging.getLogger(log_file_path)
+                _configure(logger)
+                _loggers[log_file_path] = logger
+    return logger
+
+class LazyLogger:
+    """
+    延迟创建的日志对象：模块导入时只记录日志文件路径，首次使用时才创建目录与处理器，
+    因此在init_logging之前导入的模块也按配置的模式输出
+    """
+    __slots__ = ("_path", "_logger")
+
+    def __init__(self, log_file_path):
+        self._path = log_file_path
+        self._logger = None
+
+    def __getattr__(self, name):
+        logger = self._logger
+        if logger is None:
+            logger = self._logger = _get_logger(self._path)
+        return getattr(logger, name)
+
+def getLogger(log_file_path):
+    """
+    获取可滚动分割的日志对象（延迟创建）
+    :param log_file_path: 日志文件完整路径
+    :return: LazyLogger对象，用法与logging.Logger一致
+    """
+    return LazyLogger(log_file_path)
+
+def init_logging(config):
+    """
+    按[LOG]配置设置日志模式，并重新配置已创建的日志对象
+    ASYNC：工作线程只把日志放入队列（队列满时丢弃），由单个后台线程写文件与终端
+    FORMAT：text / json（JSON lines，只作用于日志文件）
+    RATE_LIMIT / RATE_BURST：每个调用位置每秒最多输出的INFO日志条数（0不限）与突发条数
+    """
+    global _queue_handler, _listener
+    with _lock:
+        _stop_listener()
+        _settings.update({
+            "async": config.getboolean("LOG", "ASYNC", fallback=False),
+            "format": config.get("LOG", "FORMAT", fallback="text").strip().lower(),
+            "console": config.getboolean("LOG", "CONSOLE", fallback=True),
+            "level": logging.getLevelName(config.get("LOG", "LEVEL", fallback="INFO").strip().upper()),
+            "rate_limit": config.getfloat("LOG", "RATE_LIMIT", fallback=0),
+            "rate_burst": config.getint("LOG", "RATE_BURST", fallback=20),
+            "queue_size": config.getint("LOG", "QUEUE_SIZE", fallback=10000),
+        })
+        if _settings["format"] not in ("text", "json"):
+            raise ValueError(f"不支持的日志格式：{_settings['format']}")
+        if not isinstance(_settings["level"], int):
+            raise ValueError(f"不支持的日志级别：{config.get('LOG', 'LEVEL')}")
+
+        if _settings["async"]:
+            log_queue = queue.Queue(_settings["queue_size"])
+            _queue_handler = _DropQueueHandler(log_queue)
+            _listener = QueueListener(log_queue, _DispatchHandler())
+            _listener.start()
+        for logger in _loggers.values():
+            _configure(logger)
+
+def _stop_listener():
+    global _queue_handler, _listener
+    if _listener is None:
+        return False
+    _listener.stop()
+    _listener = None
+    _queue_handler = None
+    _settings["async"] = False
+    return True
 
-    # 控制台处理器（输出到终端）
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(log_formatter)
+def stop_logging():
+    """停止后台写入线程（写完队列中剩余的日志），日志对象恢复为同步写入"""
+    with _lock:
+        if _stop_listener():
+            for logger in _loggers.values():
+                _configure(logger)
 
-    # 添加处理器
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+def logging_stats():
+    """队列满丢弃与限流省略的日志条数"""
+    return dict(_stats)
 
-    return logger
\ No newline at end of file
+atexit.register(stop_logging)
\ No newline at end of file
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import bisect
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+def _log_buckets(start=0.0001, factor=1.25, stop=120.0):
+    """按固定倍率生成的桶上界（相邻桶相差25%，分位数估算误差不超过一个桶宽）"""
+    buckets = []
+    bound = start
+    while bound < stop:
+        buckets.append(round(bound, 6))
+        bound *= factor
+    buckets.append(float("inf"))
+    return tuple(buckets)
+
+# 耗时类指标（秒）
+DEFAULT_BUCKETS = _log_buckets()
+# 数量类指标（行数、批量大小）
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, float("inf"))
+
+def _metric_name(name, labels):
+    """name + 标签 -> Prometheus样式名称，如 fetch_seconds{status="200"}"""
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+def _label_key(labels):
+    """标签字典 -> 有序元组（值统一转为字符串，状态码等数值标签可直接传入）"""
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class Histogram:
+    """固定桶直方图：记录为一次二分查找加计数，内存占用固定，可估算任意分位数"""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """记录一个观测值（秒或个数）"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q):
+        """估算分位数（在所在桶内线性插值，不超过最大观测值）"""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = q * self.count
+            seen = 0
+            lower = 0.0
+            for bound, bucket_count in zip(self.buckets, self.counts):
+                if bucket_count and seen + bucket_count >= target:
+                    upper = min(bound, self.max)
+                    return lower + (upper - lower) * (target - seen) / bucket_count
+                seen += bucket_count
+                lower = bound
+            return self.max
+
+    def summary(self):
+        """统计摘要（次数、均值、p50/p90/p99、最大值）"""
+        count = self.count
+        return {
+            "count": count,
+            "mean": round(self.sum / count, 6) if count else 0.0,
+            "p50": round(self.quantile(0.5), 6),
+            "p90": round(self.quantile(0.9), 6),
+            "p99": round(self.quantile(0.99), 6),
+            "max": round(self.max, 6),
+        }
+
+    def prometheus_lines(self, name, labels):
+        """Prometheus文本格式：累计桶、_sum、_count（只输出有数据变化的桶，+Inf必输出）"""
+        with self._lock:
+            counts, total, value_sum = list(self.counts), self.count, self.sum
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            if bucket_count or bound == float("inf"):
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{_metric_name(name + '_bucket', labels + (('le', le),))} {cumulative}")
+        lines.append(f"{_metric_name(name + '_sum', labels)} {value_sum}")
+        lines.append(f"{_metric_name(name + '_count', labels)} {total}")
+        return lines
+
+class Metrics:
+    """
+    指标注册表：直方图与计数器按名称+标签在首次使用时创建；
+    队列深度、代理成功率等状态类指标注册为回调，只在采集（导出/快照）时计算，不占用热路径
+    """
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._snapshot_thread = None
+        self._stop_event = threading.Event()
+
+    def histogram(self, name, buckets=None, **labels):
+        """获取直方图（已存在时无锁返回）"""
+        key = (name, _label_key(labels))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(buckets or DEFAULT_BUCKETS))
+        return histogram
+
+    def totals(self, name):
+        """同名直方图（所有标签）的累计次数与总和"""
+        count, total = 0, 0.0
+        for (metric_name, _), histogram in list(self._histograms.items()):
+            if metric_name == name:
+                count += histogram.count
+                total += histogram.sum
+        return count, total
+
+    def observe(self, name, value, **labels):
+        """记录一个耗时观测值"""
+        self.histogram(name, **labels).observe(value)
+
+    def observe_count(self, name, value, **labels):
+        """记录一个数量观测值（批量大小、行数等）"""
+        self.histogram(name, COUNT_BUCKETS, **labels).observe(value)
+
+    def inc(self, name, value=1, **labels):
+        """计数器累加"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def register_gauge(self, name, callback):
+        """
+        注册状态类指标回调
+        :param callback: 无参函数，返回数值；返回 {后缀: 数值} 字典时展开为多个指标 name_后缀
+        """
+        with self._lock:
+            self._gauges[name] = callback
+
+    def _collect_gauges(self):
+        values = {}
+        for name, callback in list(self._gauges.items()):
+            try:
+                value = callback()
+            except Exception:
+                continue
+            if isinstance(value, dict):
+                for suffix, sub_value in value.items():
+                    values[f"{name}_{suffix}"] = sub_value
+            elif value is not None:
+                values[name] = value
+        return values
+
+    def summary(self):
+        """所有直方图的统计摘要"""
+        return {_metric_name(name, labels): histogram.summary()
+                for (name, labels), histogram in sorted(self._histograms.items())}
+
+    def snapshot(self):
+        """全部指标的JSON快照（直方图摘要、计数器、状态值）"""
+        with self._lock:
+            counters = {_metric_name(name, labels): value for (name, labels), value in sorted(self._counters.items())}
+        return {
+            "timestamp": int(time.time()),
+            "histograms": self.summary(),
+            "counters": counters,
+            "gauges": self._collect_gauges(),
+        }
+
+    def render_prometheus(self):
+        """Prometheus文本格式导出"""
+        lines = []
+        typed = set()
+        for (name, labels), histogram in sorted(self._histograms.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            lines.extend(histogram.prometheus_lines(name, labels))
+        with self._lock:
+            counters = sorted(self._counters.items())
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{_metric_name(name, labels)} {value}")
+        for name, value in sorted(self._collect_gauges().items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def start_server(self, host="0.0.0.0", port=9108):
+        """启动指标HTTP服务：/metrics（Prometheus文本）、/stats（JSON快照）"""
+        if self._server is not None:
+            return
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics"):
+                    body = registry.render_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path.startswith("/stats"):
+                    body = json.dumps(registry.snapshot(), ensure_ascii=False).encode("utf-8")
+                    content_type = "application/json; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="MetricsServerThread", daemon=True).start()
+
+    def start_snapshot(self, snapshot_file, interval=30):
+        """启动定期JSON快照线程（写临时文件后原子替换）"""
+        if self._snapshot_thread is not None:
+            return
+        snapshot_dir = os.path.dirname(snapshot_file)
+        if snapshot_dir:
+            os.makedirs(snapshot_dir, exist_ok=True)
+
+        def run():
+            while not self._stop_event.wait(interval):
+                self.write_snapshot(snapshot_file)
+            self.write_snapshot(snapshot_file)
+
+        self._snapshot_thread = threading.Thread(target=run, name="MetricsSnapshotThread", daemon=True)
+        self._snapshot_thread.start()
+
+    def write_snapshot(self, snapshot_file):
+        tmp_file = snapshot_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False)
+        os.replace(tmp_file, snapshot_file)
+
+    def stop(self):
+        """停止指标服务与快照线程（停止前写最后一次快照）"""
+        self._stop_event.set()
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join(timeout=5)
+            self._snapshot_thread = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+# 全局指标实例
+metrics = Metrics()
+
+def init_metrics(config):
+    """按[METRICS]配置启动指标HTTP服务与JSON快照（指标本身始终记录）"""
+    if config.getint("METRICS", "PORT", fallback=0) > 0:
+        metrics.start_server(config.get("METRICS", "HOST", fallback="0.0.0.0"), config.getint("METRICS", "PORT"))
+    snapshot_file = config.get("METRICS", "SNAPSHOT_FILE", fallback="")
+    if snapshot_file:
+        metrics.start_snapshot(snapshot_file, config.getfloat("METRICS", "SNAPSHOT_INTERVAL", fallback=30))
+    return metrics
+
+def get_metrics():
+    """获取全局指标实例"""
+    return metrics
\ No newline at end of file
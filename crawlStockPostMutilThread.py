@@ -2,73 +2,188 @@
 # -*- coding: utf-8 -*-
 import os
 import time
-import datetime
+import signal
+import argparse
 import threading
 import queue
-from requests_html import HTMLSession
-from bs4 import BeautifulSoup
-import requests
 
-# 导入自定义模块
-from common.Logger import getLogger
-from common.Config import getconfig
+# 导入自定义模块（异步引擎与解析进程池按配置在使用时导入）
+from common.Logger import getLogger, init_logging, stop_logging, logging_stats
+from common.Config import getconfig, load_settings
+from common.Metrics import init_metrics, get_metrics
 from mysql.mysql_db import init_mysql, get_mysql_client
 from stockpost.crawlTaskManage import init_task_manager, get_task_manager
 from stockpost.proxyManage import init_proxy_manager, get_proxy_manager
+from stockpost.postWriter import init_post_writer, POST_COLUMNS
+from stockpost.postDedup import init_seen_filter, upgrade_post_table
+from stockpost.postParser import get_parser, parse_rows, parse_list_page_with_path
+from stockpost.pageCache import init_page_cache, UNCONDITIONAL_HEADERS, UncachedNotModified
+from stockpost.htmlArchive import init_html_archive
+from stockpost.detailCrawler import init_detail_crawler
+from stockpost.httpClient import init_http_session
+from stockpost.sharedTaskQueue import init_shared_task_queue
+from stockpost.rateControl import init_rate_controller, init_retry_scheduler, retry_after_seconds
+from stockpost.stockScheduler import init_stock_scheduler
+from stockpost.stockSource import init_stock_source, iter_stock_codes, interleave_tasks
+from stockpost.postMigrate import post_table_is_typed, migrate_post_table
+from stockpost.postExport import init_post_exporter, ensure_export_index
+from stockpost.postRollup import init_post_rollup
+from stockpost.workerPool import CrawlTaskQueue, WorkerPool, AdaptiveController
 
 # 全局变量
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "stockpost", "crawl.conf")
 config = None
+settings = None
 logger = None
 mysql_client = None
 task_manager = None
 proxy_manager = None
-crawl_queue = queue.Queue()
+post_writer = None
+seen_filter = None
+page_cache = None
+html_archive = None
+detail_crawler = None
+shared_tasks = None
+http_session = None
+rate_controller = None
+retry_scheduler = None
+stock_scheduler = None
+stock_source = None
+post_rollup = None
+daemon_stop = threading.Event()
+crawl_queue = CrawlTaskQueue()
 result_queue = queue.Queue()
-current_year = datetime.datetime.now().year
-
-def init_env():
-    """初始化爬虫环境（配置、日志、数据库、任务管理、代理）"""
-    global config, logger, mysql_client, task_manager, proxy_manager
-
-    # 读取配置
+task_feeder = None
+crawl_done = threading.Event()
+incremental = False
+run_high_water = {}
+# 常驻模式：每只股票本轮的 [新帖数, 最早新帖发表时间, 是否因翻页深度截断]
+run_round_stats = {}
+run_high_water_lock = threading.Lock()
+parse_executor = None
+crawl_pool = None
+parse_pool = None
+
+def init_env(replay=False, daemon=False):
+    """
+    初始化爬虫环境（配置、日志、数据库、任务管理、代理）
+    :param replay: 离线回放模式：不初始化代理与页面缓存，强制打开HTML归档，不使用增量模式
+    :param daemon: 常驻模式：按发帖速度调度各股票的刷新间隔与翻页深度，强制使用增量模式，不使用共享任务队列
+    """
+    global config, settings, logger, mysql_client, task_manager, proxy_manager, post_writer, seen_filter, incremental, page_cache, html_archive, detail_crawler, shared_tasks
+    global crawl_queue, result_queue, rate_controller, retry_scheduler, stock_scheduler, stock_source, post_rollup
+
+    # 读取配置（主流程配置解析为只读的CrawlSettings，工作线程直接读取字段）
     config = getconfig(CONFIG_PATH)
-    logger = getLogger(os.path.join(config.get("BASE", "LOG_DIR"), "crawl_main.log"))
+    settings = load_settings(config)
+    init_logging(config)
+    logger = getLogger(os.path.join(settings.log_dir, "crawl_main.log"))
+    incremental = False if replay else daemon or settings.incremental
+    # 校验解析器名称（配置错误时启动即失败）
+    get_parser(settings.parser)
+
+    # 有界队列：任务生成与爬取结果都受队列容量限制（背压），在途HTML数量不随任务总数增长
+    crawl_queue = CrawlTaskQueue(settings.crawl_queue_size)
+    result_queue = queue.Queue(settings.result_queue_size)
 
     # 初始化任务管理
-    task_manager = init_task_manager(config.get("BASE", "CACHE_DIR"))
+    task_manager = init_task_manager(
+        settings.cache_dir,
+        backend=config.get("BASE", "CHECKPOINT_BACKEND", fallback="log"),
+        flush_every=config.getint("BASE", "CHECKPOINT_FLUSH_EVERY", fallback=500),
+        flush_interval=config.getfloat("BASE", "CHECKPOINT_FLUSH_INTERVAL", fallback=1.0)
+    )
+
+    # 初始化原始HTML归档（回放模式下作为数据源）
+    html_archive = init_html_archive(config, force=replay)
+
+    if not replay:
+        # 初始化列表页缓存（条件请求与未变化页面短路）
+        page_cache = init_page_cache(config)
+
+        # 初始化代理管理
+        proxy_manager = init_proxy_manager(config)
 
-    # 初始化代理管理
-    proxy_manager = init_proxy_manager(config)
+        # 初始化自适应速率控制（按主机与代理AIMD调整请求速率）与失败页面重试调度
+        rate_controller = init_rate_controller(config)
+        retry_scheduler = init_retry_scheduler(config, crawl_queue)
 
     # 初始化数据库
     mysql_client = init_mysql(config)
+    upgrade_post_table(mysql_client)
+    if mysql_client and post_table_is_typed(mysql_client) is False:
+        logger.warning("guba_stock_post仍为旧表结构（计数与发表时间为字符串），请运行 --migrate-schema 迁移")
+
+    # 初始化按股票按小时/按天的汇总表（与原始数据在同一事务内增量更新）
+    post_rollup = init_post_rollup(config, mysql_client)
+
+    # 初始化股票代码来源（配置、文件、数据库表或代码区间，爬取时按需读取）
+    if not replay:
+        stock_source = init_stock_source(config, mysql_client)
+
+    # 初始化共享任务队列（多进程/多节点共同消费同一任务表；回放模式与常驻模式不使用）
+    if daemon:
+        stock_scheduler = init_stock_scheduler(config)
+        if config.getboolean("SHARED_QUEUE", "ENABLE", fallback=False):
+            logger.warning("常驻模式按本地调度爬取，忽略[SHARED_QUEUE]配置")
+    elif not replay:
+        shared_tasks = init_shared_task_queue(config, mysql_client)
+
+    # 初始化已入库帖子过滤器（从数据库预热；回放用于修正解析结果，不过滤）
+    seen_filter = None if replay else init_seen_filter(config, mysql_client)
+
+    # 初始化批量写入（数据提交成功后才标记断点；增量模式按高水位判断，不使用页码断点）
+    post_writer = init_post_writer(config, mysql_client, None if incremental else task_manager, seen_filter, post_rollup)
+
+    # 初始化详情页爬取（回填点赞数；回放模式不发起网络请求）
+    if not replay:
+        detail_crawler = init_detail_crawler(config, mysql_client, build_headers(), proxy_manager, post_rollup, daemon)
+
+    # 启动指标导出，注册队列深度等状态指标（采集时计算）
+    register_gauges(init_metrics(config))
 
     logger.info("爬虫环境初始化完成")
 
+def register_gauges(metrics):
+    """注册队列深度、代理池、连接池等状态指标"""
+    metrics.register_gauge("crawl_queue_depth", crawl_queue.qsize)
+    metrics.register_gauge("result_queue_depth", result_queue.qsize)
+    metrics.register_gauge("writer_queue_depth", lambda: post_writer.queue.qsize() if post_writer else None)
+    metrics.register_gauge("crawl_workers", lambda: crawl_pool.size if crawl_pool else None)
+    metrics.register_gauge("parse_workers", lambda: parse_pool.size if parse_pool else None)
+    metrics.register_gauge("detail_queue_depth", lambda: detail_crawler.queue.qsize() if detail_crawler else None)
+    metrics.register_gauge("proxy", lambda: proxy_manager.health() if proxy_manager else None)
+    metrics.register_gauge("db_pool", lambda: mysql_client.pool_stats() if mysql_client else None)
+    metrics.register_gauge("rate_control", lambda: rate_controller.health() if rate_controller else None)
+    metrics.register_gauge("retry", lambda: retry_scheduler.stats() if retry_scheduler else None)
+    metrics.register_gauge("scheduler", lambda: stock_scheduler.health() if stock_scheduler else None)
+    metrics.register_gauge("rollup", lambda: dict(post_rollup.stats) if post_rollup else None)
+    metrics.register_gauge("log", logging_stats)
+
 def build_url(stock_code, page):
-    """构造股吧列表URL"""
-    base_url = "https://guba.eastmoney.com/list,{stock_code}_{page}.html"
-    return base_url.format(stock_code=stock_code, page=page)
-
-def crawl_worker():
-    """爬取工作线程（负责从队列获取任务，爬取页面）"""
-    session = HTMLSession()
-    session.headers = {
-        "User-Agent": config.get("REQUEST", "USER_AGENT"),
+    """构造股吧列表URL（站点地址取自[REQUEST] BASE_URL，基准测试时指向本地模拟站点）"""
+    return f"{settings.base_url}/list,{stock_code}_{page}.html"
+
+def build_headers():
+    """构造请求头（多线程引擎与异步引擎共用）"""
+    return {
+        "User-Agent": settings.user_agent,
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
         "Accept-Language": "zh-CN,zh;q=0.9",
         "Connection": "keep-alive"
     }
 
+def crawl_worker(pool, index):
+    """爬取工作线程（负责从队列获取任务，爬取页面；超出线程组活跃数时挂起）"""
     while True:
         try:
-            task = crawl_queue.get(timeout=10)
+            pool.wait_active(index)
+            task = crawl_queue.get(timeout=1)
             stock_code, page = task
             task_key = f"{stock_code}_{page}"
 
-            # 跳过已爬取的任务
-            if task_manager.is_crawled(stock_code, page):
+            # 跳过已爬取的任务（增量模式每次都从第1页重新爬取；共享任务队列模式以任务表状态为准）
+            if not incremental and shared_tasks is None and task_manager.is_crawled(stock_code, page):
                 logger.info(f"跳过已爬取任务：{task_key}")
                 crawl_queue.task_done()
                 continue
@@ -80,208 +195,610 @@ def crawl_worker():
             # 获取代理
             proxy = proxy_manager.get_proxy() if proxy_manager else None
 
-            # 爬取页面
+            # 按主机与代理的当前速率等待请求名额（未启用速率控制时请求后固定等待REQUEST_DELAY）
+            ticket = rate_controller.acquire(url, proxy) if rate_controller else None
+
+            # 爬取页面（有缓存记录时发送条件请求）
+            request_start = time.monotonic()
             try:
-                response = session.get(
+                response = http_session.get(
                     url,
+                    headers=page_cache.conditional_headers(url) if page_cache else None,
                     proxies=proxy,
-                    timeout=int(config.get("REQUEST", "TIMEOUT"))
+                    timeout=settings.timeout
                 )
+                if response.status_code == 304 and not (page_cache and page_cache.has_entry(url)):
+                    # 没有缓存记录却返回304（中间缓存按自身记录应答），不能当作空页面，不带条件请求头重新请求
+                    logger.warning(f"没有缓存记录的页面返回304，重新请求：{task_key}")
+                    response = http_session.get(url, headers=UNCONDITIONAL_HEADERS, proxies=proxy, timeout=settings.timeout)
+                    if response.status_code == 304:
+                        raise UncachedNotModified(url, response.headers)
                 response.raise_for_status()
                 response.encoding = "utf-8"
-                time.sleep(float(config.get("BASE", "REQUEST_DELAY")))
-
-                # 提交结果到队列
-                result_queue.put((stock_code, page, url, response.text))
-                logger.info(f"爬取成功：{task_key}")
+                fetch_elapsed = time.monotonic() - request_start
+                get_metrics().observe("fetch_seconds", fetch_elapsed, status=response.status_code)
+                if proxy_manager:
+                    proxy_manager.report_result(proxy, True, fetch_elapsed)
+                if ticket is not None:
+                    rate_controller.release(ticket, response.status_code, fetch_elapsed)
+                    ticket = None
+                else:
+                    time.sleep(settings.request_delay)
+                if retry_scheduler is not None:
+                    retry_scheduler.succeeded((stock_code, page))
+
+                # 页面未变化时跳过解析与写库，否则提交结果到队列
+                cache_hit = page_cache.check(url, response.status_code, response.headers, response.text) if page_cache else None
+                if cache_hit:
+                    handle_unchanged_page(stock_code, page, url, cache_hit)
+                else:
+                    if html_archive is not None:
+                        html_archive.append(stock_code, page, url, response.text)
+                    result_queue.put((stock_code, page, url, response.text, None))
+                    logger.info(f"爬取成功：{task_key}，缓存：未命中")
 
             except Exception as e:
                 logger.error(f"爬取失败：{task_key}，URL：{url}，错误：{e}")
-                result_queue.put((stock_code, page, url, ""))
+                fetch_elapsed = time.monotonic() - request_start
+                response = getattr(e, "response", None)
+                status = getattr(response, "status_code", None) or getattr(e, "status", None) or "error"
+                retry_after = retry_after_seconds(response.headers) if response is not None else None
+                get_metrics().observe("fetch_seconds", fetch_elapsed, status=status)
+                if proxy_manager:
+                    proxy_manager.report_result(proxy, False, fetch_elapsed)
+                if ticket is not None:
+                    rate_controller.release(ticket, status, fetch_elapsed, retry_after)
+                # 按指数退避稍后重试，重试次数用尽后按无效页面处理
+                if retry_scheduler is None or not retry_scheduler.schedule((stock_code, page), retry_after):
+                    result_queue.put((stock_code, page, url, "", None))
 
             finally:
                 crawl_queue.task_done()
 
         except queue.Empty:
-            logger.info("爬取队列已空，爬取线程退出")
-            break
+            if pool.stopped:
+                logger.info("爬取任务已完成，爬取线程退出")
+                break
         except Exception as e:
             logger.error(f"爬取线程异常：{e}")
             continue
 
-def parse_worker():
-    """解析工作线程（负责解析爬取结果，提取数据）"""
+def chain_callbacks(*callbacks):
+    """合并多个提交回调（忽略None），全部为None时返回None；某个回调异常时记录日志并继续执行其余回调"""
+    callbacks = [cb for cb in callbacks if cb is not None]
+    if not callbacks:
+        return None
+    if len(callbacks) == 1:
+        return callbacks[0]
+
+    def chained():
+        for cb in callbacks:
+            try:
+                cb()
+            except Exception as e:
+                logger.error(f"回调执行失败：{e}")
+    return chained
+
+def handle_unchanged_page(stock_code, page, url, cache_hit):
+    """
+    处理未变化的列表页（304或帖子列表哈希相同）：不解析、不写库，只按正常流程标记断点
+    增量模式下页面未变化说明没有新帖子，直接结束该股票的翻页
+    """
+    logger.info(f"页面未变化，跳过解析：{stock_code}_{page}，缓存：命中（{cache_hit}）")
+    on_commit = (lambda: finish_incremental_stock(stock_code)) if incremental else None
+    post_writer.submit(stock_code, page, [], chain_callbacks(on_commit, complete_shared_task(stock_code, page)),
+                       page_failure_callback(stock_code, page))
+
+def complete_shared_task(stock_code, page):
+    """共享任务队列模式下返回标记任务完成的提交回调，否则返回None"""
+    if shared_tasks is None:
+        return None
+    return lambda: shared_tasks.complete(stock_code, page)
+
+def page_failure_callback(stock_code, page):
+    """页面写入失败或解析异常时的回调：增量模式下以失败结束该股票本轮（不推进高水位），共享任务队列模式下归还租约"""
+    on_failure = (lambda: finish_incremental_stock(stock_code, commit=False)) if incremental else None
+    return chain_callbacks(on_failure, release_shared_task(stock_code, page))
+
+def release_shared_task(stock_code, page):
+    """共享任务队列模式下返回归还租约的失败回调（写入失败或解析异常时由任意节点重试），否则返回None"""
+    if shared_tasks is None:
+        return None
+    return lambda: shared_tasks.release(stock_code, page)
+
+def parse_page(html, stock_code, fetched_at=None):
+    """
+    解析列表页：配置了进程池时交给子进程解析（绕开GIL），否则在当前线程解析
+    :param fetched_at: 页面抓取时间（推断发表时间年份的参考时间；回放归档时为归档记录的抓取时间，None为当前时间）
+    :return: (帖子列表, 解析路径 json：内嵌数据 / html：HTML选择器)
+    """
+    if parse_executor is not None:
+        return parse_executor.submit(parse_rows, settings.parser, html, stock_code, fetched_at, settings.embedded_json).result()
+    return parse_list_page_with_path(html, stock_code, fetched_at, parser_name=settings.parser, embedded=settings.embedded_json)
+
+def parse_worker(pool, index):
+    """解析工作线程（负责解析爬取结果，提取数据；超出线程组活跃数时挂起）"""
     while True:
         try:
-            result = result_queue.get(timeout=10)
-            stock_code, page, url, html = result
+            pool.wait_active(index)
+            result = result_queue.get(timeout=1)
+            stock_code, page, url, html, fetched_at = result
             task_key = f"{stock_code}_{page}"
 
+            # 增量模式以失败结束本轮；归还租约，由任意节点重试（超过MAX_ATTEMPTS后不再租用）
+            on_failure = page_failure_callback(stock_code, page)
             if not html:
                 logger.warning(f"无有效HTML，跳过解析：{task_key}")
+                if on_failure is not None:
+                    on_failure()
                 result_queue.task_done()
                 continue
 
             # 解析页面
+            submitted = False
             try:
-                soup = BeautifulSoup(html, "lxml")
-                post_list = []
-
-                # 定位帖子列表
-                post_items = soup.find_all("div", class_="articleh normal_post")
-                if not post_items:
-                    post_items = soup.find_all("tr", class_="listitem")
-
-                for item in post_items:
-                    try:
-                        # 阅读数
-                        read_elem = item.find("span", class_="l1 a1") or item.find("div", class_="read")
-                        read_count = read_elem.get_text().strip() if read_elem else "0"
-
-                        # 评论数
-                        comment_elem = item.find("span", class_="l2 a2") or item.find("div", class_="reply")
-                        comment_count = comment_elem.get_text().strip() if comment_elem else "0"
-
-                        # 标题 & 帖子链接
-                        title_elem = item.find("span", class_="l3 a3") or item.find("div", class_="title")
-                        title_a = title_elem.find("a") if title_elem else None
-                        post_title = title_a.get("title", "").strip() if title_a else "无标题"
-                        if not post_title and title_a:
-                            post_title = title_a.get_text().strip()
-                        post_url = title_a.get("href", "") if title_a else ""
-                        if post_url and not post_url.startswith("http"):
-                            post_url = "https://guba.eastmoney.com" + post_url
-
-                        # 作者信息
-                        author_elem = item.find("span", class_="l4 a4") or item.find("div", class_="author")
-                        author_a = author_elem.find("a") if author_elem else None
-                        author_id = author_a.get("data-popper", "") if (author_a and "data-popper" in author_a.attrs) else ""
-                        author_name = author_a.get_text().strip() if author_a else "匿名"
-                        author_url = author_a.get("href", "") if author_a else ""
-                        if author_url and not author_url.startswith("http"):
-                            author_url = "https://guba.eastmoney.com" + author_url
-
-                        # 发表时间
-                        time_elem = item.find("span", class_="l5 a5") or item.find("div", class_="update")
-                        publish_time_str = time_elem.get_text().strip() if time_elem else ""
-                        if publish_time_str and len(publish_time_str.split(" ")) == 2:
-                            publish_time = f"{current_year}-{publish_time_str}:00"
-                        else:
-                            publish_time = publish_time_str
-
-                        # 点赞数（列表页无，标记为需爬详情页）
-                        like_count = "需爬详情页"
-
-                        # 组装数据
-                        post_data = (
-                            stock_code,
-                            post_title,
-                            author_name,
-                            author_id,
-                            author_url,
-                            publish_time,
-                            read_count,
-                            comment_count,
-                            like_count,
-                            post_url
-                        )
-                        post_list.append(post_data)
-
-                    except Exception as e:
-                        logger.error(f"解析单条帖子失败：{e}")
-                        continue
-
-                # 标记任务为已爬取
-                task_manager.mark_crawled(stock_code, page)
-
-                # 批量插入数据库
-                if post_list and mysql_client:
-                    insert_sql = """
-                    INSERT INTO guba_stock_post (
-                        stock_code, post_title, author_name, author_id, author_url,
-                        publish_time, read_count, comment_count, like_count, post_url
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """
-                    mysql_client.batch_execute_sql(insert_sql, post_list)
-                    logger.info(f"解析完成：{task_key}，提取 {len(post_list)} 条数据，已插入数据库")
+                parse_start = time.monotonic()
+                post_list, parse_path = parse_page(html, stock_code, fetched_at)
+                get_metrics().observe("parse_seconds", time.monotonic() - parse_start, path=parse_path)
+                get_metrics().observe_count("parse_rows", len(post_list))
+                get_metrics().inc("parse_pages", path=parse_path)
+
+                # 增量模式：根据高水位决定是否继续翻页（本页提交后才加入下一页；写入失败时以失败结束本轮）
+                on_commit = None
+                if incremental:
+                    on_commit, round_failure = schedule_next_page(stock_code, page, post_list)
+                    on_failure = chain_callbacks(round_failure, release_shared_task(stock_code, page))
+                # 数据提交后页面缓存记录才生效
+                if page_cache is not None:
+                    on_commit = chain_callbacks(lambda: page_cache.commit(url), on_commit)
+
+                # 丢弃已入库且计数未变化的帖子
+                if seen_filter is not None and post_list:
+                    parsed_count = len(post_list)
+                    post_list = [row for row in post_list if not seen_filter.is_unchanged(row)]
+                    if len(post_list) < parsed_count:
+                        logger.info(f"{task_key}：{parsed_count - len(post_list)} 条帖子未变化，已跳过")
+
+                # 数据提交后（帖子已入库）再加入详情页队列
+                if detail_crawler is not None and post_list:
+                    on_commit = chain_callbacks(on_commit, lambda rows=post_list: detail_crawler.offer(rows))
+
+                # 数据提交后才在共享任务表中标记完成（提交前崩溃时租约到期后由其它节点重爬）
+                on_commit = chain_callbacks(on_commit, complete_shared_task(stock_code, page))
+
+                # 提交到批量写入线程（写库成功后由写入线程标记任务为已爬取）
+                post_writer.submit(stock_code, page, post_list, on_commit, on_failure)
+                submitted = True
+                if post_list:
+                    logger.info(f"解析完成（{parse_path}）：{task_key}，提取 {len(post_list)} 条数据，已提交批量写入")
                 else:
-                    logger.warning(f"解析完成：{task_key}，无有效数据或数据库未连接")
+                    logger.warning(f"解析完成（{parse_path}）：{task_key}，无有效数据")
 
             except Exception as e:
                 logger.error(f"解析页面失败：{task_key}，URL：{url}，错误：{e}")
+                # 增量模式以失败结束本轮；归还租约，否则心跳持续续租，任务表永远无法完成
+                if not submitted and on_failure is not None:
+                    on_failure()
 
             finally:
                 result_queue.task_done()
 
         except queue.Empty:
-            logger.info("结果队列已空，解析线程退出")
-            break
+            if pool.stopped:
+                logger.info("解析任务已完成，解析线程退出")
+                break
         except Exception as e:
             logger.error(f"解析线程异常：{e}")
             continue
 
-def init_crawl_queue():
-    """初始化爬取队列（添加股票+页码任务）"""
-    stock_codes = config.get("BASE", "STOCK_CODES").split(",")
-    max_page = int(config.get("BASE", "MAX_PAGE"))
-
-    for stock_code in stock_codes:
-        stock_code = stock_code.strip()
-        if not stock_code:
-            continue
-        for page in range(1, max_page + 1):
-            crawl_queue.put((stock_code, page))
-
-    logger.info(f"爬取队列初始化完成，共 {crawl_queue.qsize()} 个任务")
+def schedule_next_page(stock_code, page, post_list):
+    """
+    增量模式翻页判断：本页存在比高水位更新的帖子且未到翻页深度时继续翻页，否则结束该股票
+    同一股票的页面逐页提交：本页数据提交后才加入下一页（先计入爬取队列的未完成任务，等待提交期间爬取不会结束），
+    本页写入失败时以失败结束本轮，后续页不会越过丢失的页面推进高水位
+    翻页深度为MAX_PAGE，常驻模式下按该股票的发帖速度确定
+    :return: (提交回调, 写入失败回调)，均由写入线程调用
+    """
+    mark = task_manager.get_high_water_mark(stock_code)
+    mark_time = mark["publish_time"] if mark else ""
+    idx_time = POST_COLUMNS.index("publish_time")
+    idx_post_id = POST_COLUMNS.index("post_id")
+
+    # 发表时间无法识别（NULL）的帖子不参与高水位比较
+    newer_posts = [row for row in post_list if row[idx_time] and row[idx_time] > mark_time]
+    max_page = stock_scheduler.get_max_page(stock_code) if stock_scheduler else settings.max_page
+    if newer_posts:
+        newest = max(newer_posts, key=lambda row: row[idx_time])
+        oldest_time = min(row[idx_time] for row in newer_posts)
+        with run_high_water_lock:
+            current = run_high_water.get(stock_code)
+            if current is None or newest[idx_time] > current[0]:
+                run_high_water[stock_code] = (newest[idx_time], newest[idx_post_id])
+            if stock_scheduler is not None:
+                round_stats = run_round_stats.setdefault(stock_code, [0, oldest_time, False])
+                round_stats[0] += len(newer_posts)
+                round_stats[1] = min(round_stats[1], oldest_time)
+                round_stats[2] = page >= max_page
+
+    abort_round = lambda: finish_incremental_stock(stock_code, commit=False)
+    if newer_posts and page < max_page:
+        crawl_queue.hold()
+        return (lambda: crawl_queue.put_followup((stock_code, page + 1), held=True),
+                chain_callbacks(crawl_queue.task_done, abort_round))
+
+    logger.info(f"增量爬取结束：{stock_code}，共 {page} 页，高水位：{mark_time or '无'}")
+    return lambda: finish_incremental_stock(stock_code), abort_round
+
+def finish_incremental_stock(stock_code, commit=True):
+    """
+    结束股票本轮增量爬取；commit为True时把本轮最新帖子写入高水位
+    常驻模式下按本轮新帖数更新该股票的发帖速度并重新调度（commit为False时视为本轮失败）
+    """
+    with run_high_water_lock:
+        newest = run_high_water.pop(stock_code, None)
+        round_stats = run_round_stats.pop(stock_code, None)
+    if commit and newest:
+        task_manager.set_high_water_mark(stock_code, newest[0], newest[1])
+    if stock_scheduler is not None:
+        new_posts, oldest_time, truncated = round_stats or (0, None, False)
+        stock_scheduler.complete(stock_code, new_posts, truncated, oldest_time, ok=commit)
+
+def load_stock_codes():
+    """逐个读取要爬取的股票代码（[SOURCE]配置的来源，按需读取，不一次性加载）"""
+    return iter_stock_codes(stock_source)
+
+def generate_tasks():
+    """
+    按需生成股票+页码任务（增量模式只生成第1页，后续页由解析结果决定）
+    每INTERLEAVE_WINDOW只股票为一组按页码交错，同一股票的相邻请求之间隔着组内其它股票的请求
+    """
+    max_page = 1 if incremental else settings.max_page
+    return interleave_tasks(load_stock_codes(), max_page, settings.interleave_window)
+
+def init_crawl_queue(seed_tasks=False):
+    """
+    启动任务生成线程：任务按需放入有界爬取队列，队列满时等待爬取线程消费，不一次性生成全部任务
+    共享任务队列模式下先把任务写入任务表，再从任务表租用任务，直到所有节点把任务全部完成
+    常驻模式下按调度把到期股票的第1页放入爬取队列，直到收到停止信号
+    :param seed_tasks: 共享任务队列模式下是否把任务表中的已有任务重置为待爬（开始新一轮）
+    """
+    global task_feeder
+
+    def feed():
+        if stock_scheduler is not None:
+            feed_scheduled_stocks()
+            return
+        if shared_tasks is not None:
+            # 后台分块写入任务表，写入第一块后即开始租用
+            shared_tasks.seed_async(generate_tasks(), reset=seed_tasks)
+            shared_tasks.start()
+            shared_tasks.feed(crawl_queue)
+            return
+        count = 0
+        for task in generate_tasks():
+            crawl_queue.put(task)
+            count += 1
+        logger.info(f"爬取任务生成完成，共 {count} 个任务")
+
+    task_feeder = threading.Thread(target=feed, name="TaskFeederThread", daemon=True)
+    task_feeder.start()
+
+def feed_scheduled_stocks():
+    """常驻模式：按到期时间先后把股票第1页放入爬取队列（只取队列放得下的数量，其余留在堆中按到期先后排队）"""
+    count = stock_scheduler.set_stocks(load_stock_codes())
+    logger.info(f"常驻模式启动，调度股票数：{count}")
+    while not daemon_stop.is_set():
+        room = crawl_queue.maxsize - crawl_queue.qsize() if crawl_queue.maxsize else None
+        if room is None or room > 0:
+            for stock_code in stock_scheduler.pop_due(limit=room):
+                crawl_queue.put((stock_code, 1))
+        wait = stock_scheduler.seconds_until_next()
+        daemon_stop.wait(1.0 if wait is None else min(max(wait, 0.05), 1.0))
+    logger.info("常驻模式收到停止信号，不再调度新任务")
+
+def install_stop_handler():
+    """常驻模式：SIGINT/SIGTERM时停止调度，等待在途任务完成并写库后退出"""
+    def handle(signum, frame):
+        logger.info(f"收到停止信号（{signum}），等待在途任务完成后退出")
+        daemon_stop.set()
+    signal.signal(signal.SIGINT, handle)
+    signal.signal(signal.SIGTERM, handle)
+
+def async_crawl_worker():
+    """异步爬取线程（在单个线程内运行asyncio抓取引擎）"""
+    from stockpost.asyncCrawler import AsyncCrawler
+
+    crawler = AsyncCrawler(
+        headers=build_headers(),
+        timeout=settings.timeout,
+        request_delay=settings.request_delay,
+        concurrency=settings.async_concurrency,
+        proxy_manager=proxy_manager,
+        rate_controller=rate_controller,
+        retry_scheduler=retry_scheduler,
+        task_manager=None if incremental or shared_tasks is not None else task_manager,
+        page_cache=page_cache,
+        on_unchanged=handle_unchanged_page,
+        html_archive=html_archive,
+        stop_event=crawl_done
+    )
+    try:
+        crawler.run(crawl_queue, result_queue, build_url)
+    except Exception as e:
+        logger.error(f"异步爬取线程异常：{e}", exc_info=True)
+
+def init_parse_executor():
+    """
+    初始化解析进程池（PARSE_EXECUTOR = process时）
+    :return: 解析线程数（进程池模式下每个解析线程对应一个在途子进程任务）
+    """
+    global parse_executor
+    if settings.parse_executor != "process":
+        return max(1, settings.thread_num // 2)
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    process_num = settings.parse_processes or os.cpu_count() or 1
+    # 爬取线程已在运行，使用spawn启动子进程，避免fork复制线程持有的锁
+    parse_executor = ProcessPoolExecutor(max_workers=process_num, mp_context=multiprocessing.get_context("spawn"))
+    logger.info(f"启动解析进程池，进程数：{process_num}")
+    return process_num
+
+def shutdown_parse_executor():
+    """关闭解析进程池"""
+    global parse_executor
+    if parse_executor is not None:
+        parse_executor.shutdown(wait=True)
+        parse_executor = None
+
+def start_parse_threads(adaptive=False):
+    """
+    启动解析线程组（线程模式：初始线程数=爬取线程数/2；进程模式：与进程数一致，不再伸缩）
+    :param adaptive: 是否允许自适应增加解析线程（上限MAX_PARSE_THREAD_NUM）
+    """
+    parse_thread_num = init_parse_executor()
+    max_size = parse_thread_num
+    if adaptive and parse_executor is None:
+        max_size = settings.max_parse_thread_num or parse_thread_num
+    return WorkerPool("ParseThread", parse_worker, parse_thread_num, max_size=max_size).start()
 
 def start_threads():
-    """启动爬取线程和解析线程"""
-    thread_num = int(config.get("BASE", "THREAD_NUM"))
-
-    # 启动爬取线程
-    crawl_threads = []
-    for i in range(thread_num):
-        t = threading.Thread(target=crawl_worker, name=f"CrawlThread-{i+1}")
-        t.daemon = True
-        t.start()
-        crawl_threads.append(t)
-        logger.info(f"启动爬取线程：{t.name}")
-
-    # 启动解析线程（解析线程数=爬取线程数/2，避免解析积压）
-    parse_thread_num = max(1, thread_num // 2)
-    parse_threads = []
-    for i in range(parse_thread_num):
-        t = threading.Thread(target=parse_worker, name=f"ParseThread-{i+1}")
-        t.daemon = True
-        t.start()
-        parse_threads.append(t)
-        logger.info(f"启动解析线程：{t.name}")
-
-    # 等待爬取队列完成
-    crawl_queue.join()
+    """
+    启动爬取线程和解析线程，等待全部任务完成
+    :return: 从启动到数据全部写入的耗时（秒，不含等待线程退出的时间）
+    """
+    global crawl_pool, parse_pool, http_session
+    start_time = time.monotonic()
+    thread_num = settings.thread_num
+    adaptive = settings.adaptive_workers
+    crawl_done.clear()
+    if retry_scheduler is not None:
+        retry_scheduler.start()
+
+    # 启动爬取线程（async引擎只占用一个线程）
+    async_thread = None
+    if settings.fetch_engine == "async":
+        async_thread = threading.Thread(target=async_crawl_worker, name="AsyncCrawlThread")
+        async_thread.daemon = True
+        async_thread.start()
+        logger.info(f"启动异步爬取线程：{async_thread.name}")
+    else:
+        max_thread_num = settings.max_thread_num if adaptive else thread_num
+        # 所有爬取线程共用一个连接池会话（keep-alive），每个主机的连接数不小于最大线程数
+        http_session = init_http_session(config, build_headers(), max_thread_num)
+        crawl_pool = WorkerPool("CrawlThread", crawl_worker, thread_num, max_size=max_thread_num).start()
+
+    # 启动批量写入线程与解析线程
+    post_writer.start()
+    parse_pool = start_parse_threads(adaptive)
+
+    # 按队列水位与抓取延迟自适应调整线程数
+    controller = None
+    if adaptive:
+        controller = AdaptiveController(
+            crawl_pool, parse_pool, crawl_queue, result_queue,
+            interval=settings.control_interval
+        ).start()
+
+    # 启动详情页线程（先补回上次未回填的帖子）
+    if detail_crawler is not None:
+        detail_crawler.load_pending()
+        detail_crawler.start()
+
+    # 等待任务生成完毕，再等待爬取队列与结果队列完成（增量模式下解析线程会继续加入下一页任务，
+    # 等待重试的页面也计入爬取队列的未完成任务，需循环等待）
+    task_feeder.join()
+    while True:
+        crawl_queue.join()
+        result_queue.join()
+        if crawl_queue.unfinished_tasks == 0:
+            break
     logger.info("所有爬取任务已完成")
-
-    # 等待结果队列完成
-    result_queue.join()
     logger.info("所有解析任务已完成")
+    crawl_done.set()
+    if controller is not None:
+        controller.stop()
+    if retry_scheduler is not None:
+        retry_scheduler.stop()
+
+    # 写入剩余数据
+    post_writer.stop()
+    elapsed = time.monotonic() - start_time
+    logger.info(f"所有写入任务已完成，耗时 {elapsed:.1f} 秒")
+
+    # 等待详情页队列抓取完并回填（最多等待[DETAIL] DRAIN_TIMEOUT秒）
+    if detail_crawler is not None:
+        detail_crawler.stop(drain=True)
+        logger.info("详情页线程已停止")
 
     # 等待线程退出
-    for t in crawl_threads:
-        t.join(timeout=5)
-    for t in parse_threads:
-        t.join(timeout=5)
+    if crawl_pool is not None:
+        crawl_pool.stop()
+    if http_session is not None:
+        http_session.close()
+        http_session = None
+    if async_thread is not None:
+        async_thread.join(timeout=5)
+    parse_pool.stop()
+    shutdown_parse_executor()
+    return elapsed
+
+def replay_archive():
+    """
+    离线回放：按归档顺序把原始HTML送入结果队列，复用解析与批量写入流程重新入库，不发起任何网络请求
+    按归档记录的抓取时间推断发表时间年份（与抓取时解析结果一致，跨年回放不会错年）
+    结果队列有界，解析跟不上时读取归档会等待，不会把整个归档读入内存
+    """
+    global parse_pool
+    post_writer.start()
+    parse_pool = start_parse_threads()
+
+    replayed = 0
+    start_time = time.monotonic()
+    for record in html_archive.iter_records():
+        result_queue.put(record)
+        replayed += 1
+        if replayed % 10000 == 0:
+            logger.info(f"已回放 {replayed} 个页面")
+
+    result_queue.join()
+    post_writer.stop()
+    elapsed = time.monotonic() - start_time
+    logger.info(f"回放完成，共 {replayed} 个页面，耗时 {elapsed:.1f} 秒，"
+                f"{replayed / elapsed if elapsed else 0:.1f} 页/秒")
+
+    parse_pool.stop()
+    shutdown_parse_executor()
+
+def migrate_schema():
+    """迁移guba_stock_post到整数计数/DATETIME发表时间结构（只连接数据库，不启动爬取）"""
+    global config, logger, mysql_client
+    config = getconfig(CONFIG_PATH)
+    init_logging(config)
+    logger = getLogger(os.path.join(config.get("BASE", "LOG_DIR"), "crawl_main.log"))
+    mysql_client = init_mysql(config)
+    upgrade_post_table(mysql_client)
+    if not migrate_post_table(
+        mysql_client,
+        chunk_size=config.getint("MIGRATE", "CHUNK_SIZE", fallback=5000),
+        pause=config.getfloat("MIGRATE", "CHUNK_PAUSE", fallback=0.1)
+    ):
+        raise RuntimeError("表结构迁移失败，详见post_migrate.log")
+
+def export_posts(full=False):
+    """
+    把guba_stock_post流式导出为按股票代码与发表日期分区的Parquet/CSV文件（只连接数据库，不启动爬取）
+    :param full: 忽略上次导出位置，全量导出
+    """
+    global config, logger, mysql_client
+    config = getconfig(CONFIG_PATH)
+    init_logging(config)
+    logger = getLogger(os.path.join(config.get("BASE", "LOG_DIR"), "crawl_main.log"))
+    mysql_client = init_mysql(config)
+    if not mysql_client:
+        raise RuntimeError("MySQL初始化失败，无法导出")
+    ensure_export_index(mysql_client)
+    stats = init_post_exporter(config, mysql_client).export(full=full)
+    logger.info(f"导出完成，共 {stats['rows']} 行，{stats['files']} 个文件，截止crawl_time：{stats['until']}")
+
+def backfill_rollup():
+    """由guba_stock_post重建按股票按小时/按天的汇总表（逐只股票替换，可在爬虫运行时执行；只连接数据库，不启动爬取）"""
+    global config, logger, mysql_client
+    config = getconfig(CONFIG_PATH)
+    init_logging(config)
+    logger = getLogger(os.path.join(config.get("BASE", "LOG_DIR"), "crawl_main.log"))
+    mysql_client = init_mysql(config)
+    if not mysql_client:
+        raise RuntimeError("MySQL初始化失败，无法重建汇总")
+    rollup = init_post_rollup(config, mysql_client)
+    if rollup is None:
+        raise RuntimeError("汇总未启用（[ROLLUP] ENABLE）或建表失败，详见post_rollup.log")
+    stocks = rollup.backfill(pause=config.getfloat("ROLLUP", "BACKFILL_PAUSE", fallback=0.05))
+    logger.info(f"汇总重建完成，共 {stocks} 只股票")
+
+def parse_args():
+    """命令行参数"""
+    parser = argparse.ArgumentParser(description="东方财富股吧帖子爬虫")
+    parser.add_argument("--replay", action="store_true",
+                        help="离线回放模式：从HTML归档（[ARCHIVE] ARCHIVE_DIR）重新解析入库，不发起网络请求")
+    parser.add_argument("--migrate-schema", action="store_true",
+                        help="把guba_stock_post在线迁移为整数计数/DATETIME发表时间结构（分块复制后替换表），完成后退出")
+    parser.add_argument("--export", action="store_true",
+                        help="把guba_stock_post增量导出为按股票代码与发表日期分区的Parquet/CSV文件（[EXPORT]配置），完成后退出")
+    parser.add_argument("--export-full", action="store_true",
+                        help="与--export一起使用：忽略上次导出位置，全量导出（应导出到空目录）")
+    parser.add_argument("--rollup-backfill", action="store_true",
+                        help="由guba_stock_post重建按股票按小时/按天的汇总表（[ROLLUP]配置），完成后退出")
+    parser.add_argument("--daemon", action="store_true",
+                        help="常驻模式：持续按发帖速度调度各股票的刷新间隔与翻页深度（增量爬取），收到SIGINT/SIGTERM后退出")
+    parser.add_argument("--seed-tasks", action="store_true",
+                        help="共享任务队列模式：把任务表中的任务重置为待爬，开始新一轮爬取（默认只补充新任务，续爬上一轮）")
+    return parser.parse_args()
+
+def release_env():
+    """释放爬虫资源（停止后台线程，落盘断点与缓存，关闭数据库连接）"""
+    # 停止指标导出（写最后一次快照）
+    get_metrics().stop()
+    # 停止代理预取
+    if proxy_manager:
+        proxy_manager.stop()
+    # 写入剩余数据并落盘断点记录、页面缓存
+    if post_writer:
+        post_writer.stop()
+    if detail_crawler:
+        detail_crawler.stop(drain=False)
+    # 保存常驻模式的调度状态
+    if stock_scheduler:
+        stock_scheduler.close()
+    # 写回任务完成状态，归还未完成的租约
+    if shared_tasks:
+        shared_tasks.stop()
+    if page_cache:
+        page_cache.close()
+    if html_archive:
+        html_archive.close()
+    if task_manager:
+        task_manager.close()
+    # 关闭数据库连接
+    if mysql_client:
+        mysql_client.close()
+    logger.info("爬虫资源已释放")
+    # 写完异步日志队列中剩余的日志
+    stop_logging()
 
 def main():
     """爬虫主函数"""
+    args = parse_args()
     try:
+        if args.migrate_schema:
+            # 迁移表结构
+            migrate_schema()
+            return
+        if args.export:
+            # 导出帖子数据
+            export_posts(full=args.export_full)
+            return
+        if args.rollup_backfill:
+            # 重建汇总表
+            backfill_rollup()
+            return
+
         # 初始化环境
-        init_env()
+        init_env(replay=args.replay, daemon=args.daemon and not args.replay)
+
+        if args.replay:
+            # 离线回放归档页面
+            replay_archive()
+        else:
+            if stock_scheduler is not None:
+                install_stop_handler()
 
-        # 初始化爬取队列
-        init_crawl_queue()
+            # 初始化爬取队列
+            init_crawl_queue(seed_tasks=args.seed_tasks)
 
-        # 启动线程
-        start_threads()
+            # 启动线程
+            start_threads()
 
         logger.info("爬虫任务全部完成")
     except Exception as e:
@@ -290,10 +807,7 @@ def main():
         else:
             print(f"爬虫主流程异常：{e}")
     finally:
-        # 关闭数据库连接
-        if mysql_client:
-            mysql_client.close()
-        logger.info("爬虫资源已释放")
+        release_env()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -2,54 +2,234 @@
 # -*- coding: utf-8 -*-
 import pymysql
 import os
+import time
+import queue
+import threading
+from contextlib import contextmanager
 from common.Logger import getLogger
 
 # 初始化日志
 logger = getLogger(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "mysql_db.log"))
 
+class MysqlPool:
+    """有界MySQL连接池：按线程签出连接，签出时做存活检测与重连，并统计等待与使用情况"""
+    def __init__(self, connect_kwargs, size=8, timeout=30, ping_interval=30):
+        """
+        :param connect_kwargs: pymysql.connect参数
+        :param size: 连接池最大连接数
+        :param timeout: 连接池耗尽时等待空闲连接的最长时间（秒）
+        :param ping_interval: 连接空闲超过该时间后，签出前先ping检测（秒）
+        """
+        self.connect_kwargs = connect_kwargs
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "max_wait_time": 0.0,
+            "created": 0,
+            "reconnects": 0,
+            "discarded": 0,
+            "in_use": 0,
+            "peak_in_use": 0,
+        }
+
+    def _new_connection(self):
+        conn = pymysql.connect(**self.connect_kwargs)
+        with self._lock:
+            self._stats["created"] += 1
+        return conn
+
+    def acquire(self):
+        """签出一个可用连接（池满时阻塞等待，超时抛出pymysql.err.OperationalError）"""
+        if self._closed:
+            raise pymysql.err.InterfaceError("连接池已关闭")
+
+        conn, idle_since = None, None
+        try:
+            conn, idle_since = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    conn = self._new_connection()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                wait_start = time.monotonic()
+                try:
+                    conn, idle_since = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise pymysql.err.OperationalError(f"等待MySQL连接超时（{self.timeout}s），连接池大小：{self.size}")
+                finally:
+                    wait_time = time.monotonic() - wait_start
+                    with self._lock:
+                        self._stats["waits"] += 1
+                        self._stats["wait_time"] += wait_time
+                        self._stats["max_wait_time"] = max(self._stats["max_wait_time"], wait_time)
+
+        # 空闲较久的连接先ping，断开则自动重连
+        if idle_since is not None and time.monotonic() - idle_since >= self.ping_interval:
+            try:
+                conn.ping(reconnect=True)
+            except pymysql.MySQLError as e:
+                logger.warning(f"MySQL连接存活检测失败，重新建立连接：{e}")
+                self._discard(conn)
+                with self._lock:
+                    self._created += 1
+                    self._stats["reconnects"] += 1
+                try:
+                    conn = self._new_connection()
+                except Exception:
+                    # 重连失败时归还名额，否则MySQL恢复后连接池仍无法再建连接
+                    with self._lock:
+                        self._created -= 1
+                    raise
+
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+            self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self._stats["in_use"])
+        return conn
+
+    def release(self, conn, broken=False):
+        """归还连接；broken为True时直接丢弃（连接已损坏）"""
+        with self._lock:
+            self._stats["in_use"] -= 1
+        if broken or self._closed:
+            self._discard(conn)
+        else:
+            self._idle.put((conn, time.monotonic()))
+
+    def _discard(self, conn):
+        with self._lock:
+            self._created -= 1
+            self._stats["discarded"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """以上下文方式签出连接，异常为连接类错误时丢弃该连接"""
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken)
+
+    def stats(self):
+        """连接池计数器快照"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = self.size
+            stats["open"] = self._created
+        stats["idle"] = self._idle.qsize()
+        return stats
+
+    def close(self):
+        """关闭所有空闲连接，已签出的连接在归还时关闭"""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
 class MysqlDB:
     """MySQL数据库操作类，适配原代码的数据库调用逻辑"""
-    _conn = None
-    _cursor = None
-
-    def __init__(self, host, port, user, password, db, charset='utf8mb4'):
+    def __init__(self, host, port, user, password, db, charset='utf8mb4', pool_size=8, pool_timeout=30,
+                 local_infile=False):
         self.host = host
         self.port = int(port)
         self.user = user
         self.password = password
         self.db = db
         self.charset = charset
+        self.pool_size = int(pool_size)
+        self.pool_timeout = float(pool_timeout)
+        self.local_infile = local_infile
+        self._pool = None
 
     def connect(self):
-        """建立数据库连接"""
+        """创建连接池并验证数据库可连接"""
         try:
-            self._conn = pymysql.connect(
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                database=self.db,
-                charset=self.charset,
-                cursorclass=pymysql.cursors.DictCursor
-            )
-            self._cursor = self._conn.cursor()
-            logger.info("MySQL数据库连接成功")
+            if self._pool is None:
+                self._pool = MysqlPool(
+                    connect_kwargs={
+                        "host": self.host,
+                        "port": self.port,
+                        "user": self.user,
+                        "password": self.password,
+                        "database": self.db,
+                        "charset": self.charset,
+                        "local_infile": self.local_infile,
+                        "cursorclass": pymysql.cursors.DictCursor
+                    },
+                    size=self.pool_size,
+                    timeout=self.pool_timeout
+                )
+            with self._pool.connection():
+                pass
+            logger.info(f"MySQL数据库连接成功，连接池大小：{self.pool_size}")
             return True
         except pymysql.MySQLError as e:
             logger.error(f"MySQL连接失败：{e}")
             return False
 
     def close(self):
-        """关闭数据库连接"""
+        """关闭数据库连接池"""
         try:
-            if self._cursor:
-                self._cursor.close()
-            if self._conn:
-                self._conn.close()
+            if self._pool:
+                logger.info(f"MySQL连接池统计：{self._pool.stats()}")
+                self._pool.close()
             logger.info("MySQL数据库连接已关闭")
         except pymysql.MySQLError as e:
             logger.error(f"关闭MySQL连接失败：{e}")
 
+    def pool_stats(self):
+        """获取连接池计数器（签出次数、等待次数/耗时、在用连接数等）"""
+        return self._pool.stats() if self._pool else {}
+
+    @contextmanager
+    def transaction(self):
+        """
+        在同一连接上执行多条语句的事务，正常退出提交，异常回滚
+        用法：with mysql_client.transaction() as cursor: cursor.execute(...)
+        """
+        if self._pool is None and not self.connect():
+            raise pymysql.err.OperationalError("MySQL未连接")
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                yield cursor
+                conn.commit()
+            except Exception:
+                try:
+                    conn.rollback()
+                except pymysql.MySQLError:
+                    pass
+                raise
+            finally:
+                cursor.close()
+
     def execute_sql(self, sql, params=None):
         """
         执行单条SQL语句（增/删/改/查）
@@ -58,19 +238,52 @@ class MysqlDB:
         :return: 成功返回True/查询结果，失败返回False
         """
         try:
-            if not self._conn:
-                if not self.connect():
-                    return False
-
-            self._cursor.execute(sql, params or ())
-            self._conn.commit()
+            with self.transaction() as cursor:
+                cursor.execute(sql, params or ())
+                result = cursor.fetchall() if sql.strip().upper().startswith("SELECT") else True
             logger.debug(f"SQL执行成功：{sql}，参数：{params}")
-            return self._cursor.fetchall() if sql.strip().upper().startswith("SELECT") else True
+            return result
         except pymysql.MySQLError as e:
-            self._conn.rollback()
             logger.error(f"SQL执行失败：{sql}，参数：{params}，错误：{e}")
             return False
 
+    def stream_sql(self, sql, params=None, batch_size=5000, net_write_timeout=600):
+        """
+        流式查询：使用服务端游标（SSDictCursor）逐批读取结果，内存占用只与batch_size有关，与结果集大小无关
+        读取期间独占一个连接，整个查询在同一个一致性快照中完成
+        用法：for rows in mysql_client.stream_sql(sql, params): ...
+        :param sql: SELECT语句
+        :param params: SQL参数（元组/列表）
+        :param batch_size: 每批返回的行数
+        :param net_write_timeout: 服务端等待客户端读取的超时时间（秒），调用方逐批处理较慢时需调大，0表示不修改
+        :return: 生成器，每次产出一批行（字典列表）；查询失败时抛出pymysql.MySQLError
+        """
+        if self._pool is None and not self.connect():
+            raise pymysql.err.OperationalError("MySQL未连接")
+        conn = self._pool.acquire()
+        cursor = None
+        finished = False
+        try:
+            cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+            if net_write_timeout:
+                cursor.execute("SET SESSION net_write_timeout = %s", (int(net_write_timeout),))
+            cursor.execute(sql, params or ())
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+            finished = True
+        except pymysql.MySQLError as e:
+            logger.error(f"流式查询失败：{sql}，参数：{params}，错误：{e}")
+            raise
+        finally:
+            # 未读完就结束时，关闭游标会读完并丢弃剩余结果，直接丢弃连接更快
+            if finished:
+                cursor.close()
+                conn.rollback()
+            self._pool.release(conn, broken=not finished)
+
     def batch_execute_sql(self, sql, params_list):
         """
         批量执行SQL语句（适用于批量插入）
@@ -79,19 +292,37 @@ class MysqlDB:
         :return: 成功返回True，失败返回False
         """
         try:
-            if not self._conn:
-                if not self.connect():
-                    return False
-
-            self._cursor.executemany(sql, params_list)
-            self._conn.commit()
+            with self.transaction() as cursor:
+                cursor.executemany(sql, params_list)
             logger.info(f"批量SQL执行成功，共执行 {len(params_list)} 条记录")
             return True
         except pymysql.MySQLError as e:
-            self._conn.rollback()
             logger.error(f"批量SQL执行失败：{sql}，错误：{e}")
             return False
 
+# 股吧帖子表结构（计数为整数、发表时间为DATETIME；表名为参数，结构迁移时用于创建新表）
+CREATE_POST_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id INT AUTO_INCREMENT PRIMARY KEY COMMENT '自增ID',
+    stock_code VARCHAR(20) NOT NULL COMMENT '股票代码',
+    post_id VARCHAR(64) NOT NULL DEFAULT '' COMMENT '帖子ID（唯一键）',
+    post_title VARCHAR(500) NOT NULL COMMENT '帖子标题',
+    author_name VARCHAR(100) DEFAULT '' COMMENT '作者名称',
+    author_id VARCHAR(100) DEFAULT '' COMMENT '作者ID',
+    author_url VARCHAR(500) DEFAULT '' COMMENT '作者主页链接',
+    publish_time DATETIME DEFAULT NULL COMMENT '发表时间（NULL表示无法识别）',
+    read_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '阅读数',
+    comment_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '评论数',
+    like_count INT UNSIGNED DEFAULT NULL COMMENT '点赞数（NULL表示待爬详情页）',
+    post_url VARCHAR(500) DEFAULT '' COMMENT '帖子链接',
+    crawl_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '爬取时间',
+    UNIQUE KEY uk_post_id (post_id),
+    INDEX idx_stock_publish_time (stock_code, publish_time),
+    INDEX idx_publish_time (publish_time),
+    INDEX idx_crawl_time (crawl_time)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='东方财富股吧帖子数据表';
+"""
+
 # 全局数据库实例（从配置文件读取参数后初始化）
 mysql_client = None
 
@@ -108,30 +339,15 @@ def init_mysql(config):
             port=config.get("MYSQL", "PORT"),
             user=config.get("MYSQL", "USER"),
             password=config.get("MYSQL", "PASSWORD"),
-            db=config.get("MYSQL", "DB_NAME")
+            db=config.get("MYSQL", "DB_NAME"),
+            pool_size=config.getint("MYSQL", "POOL_SIZE", fallback=8),
+            pool_timeout=config.getfloat("MYSQL", "POOL_TIMEOUT", fallback=30),
+            local_infile=config.getboolean("MYSQL", "LOCAL_INFILE", fallback=False)
         )
         # 尝试连接
         mysql_client.connect()
         # 创建股吧数据表格（若不存在）
-        create_table_sql = """
-        CREATE TABLE IF NOT EXISTS guba_stock_post (
-            id INT AUTO_INCREMENT PRIMARY KEY COMMENT '自增ID',
-            stock_code VARCHAR(20) NOT NULL COMMENT '股票代码',
-            post_title VARCHAR(500) NOT NULL COMMENT '帖子标题',
-            author_name VARCHAR(100) DEFAULT '' COMMENT '作者名称',
-            author_id VARCHAR(100) DEFAULT '' COMMENT '作者ID',
-            author_url VARCHAR(500) DEFAULT '' COMMENT '作者主页链接',
-            publish_time VARCHAR(50) DEFAULT '' COMMENT '发表时间',
-            read_count VARCHAR(20) DEFAULT '0' COMMENT '阅读数',
-            comment_count VARCHAR(20) DEFAULT '0' COMMENT '评论数',
-            like_count VARCHAR(20) DEFAULT '0' COMMENT '点赞数',
-            post_url VARCHAR(500) DEFAULT '' COMMENT '帖子链接',
-            crawl_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '爬取时间',
-            INDEX idx_stock_code (stock_code),
-            INDEX idx_publish_time (publish_time)
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='东方财富股吧帖子数据表';
-        """
-        mysql_client.execute_sql(create_table_sql)
+        mysql_client.execute_sql(CREATE_POST_TABLE_SQL.format(table="guba_stock_post"))
         return mysql_client
     except Exception as e:
         logger.error(f"初始化MySQL实例失败：{e}")
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import time
+import queue
+import asyncio
+from common.Logger import getLogger
+from common.Metrics import get_metrics
+from stockpost.rateControl import retry_after_seconds
+from stockpost.pageCache import UNCONDITIONAL_HEADERS, UncachedNotModified
+
+# 初始化日志
+logger = getLogger(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "async_crawl.log"))
+
+class AsyncCrawler:
+    """asyncio抓取引擎：单线程内维持大量在途请求，吞吐随并发上限而非线程数增长"""
+    def __init__(self, headers, timeout, request_delay, concurrency,
+                 proxy_manager=None, task_manager=None, idle_timeout=10, page_cache=None, on_unchanged=None,
+                 html_archive=None, stop_event=None, rate_controller=None, retry_scheduler=None):
+        """
+        :param headers: 请求头（与多线程引擎一致，取自[REQUEST]配置）
+        :param timeout: 单次请求超时时间（秒）
+        :param request_delay: 每个并发槽位在请求完成后的延时（秒），提供rate_controller时不使用
+        :param concurrency: 最大在途请求数
+        :param proxy_manager: 代理管理实例（可为None）
+        :param task_manager: 任务管理实例，用于跳过已爬取任务（可为None）
+        :param idle_timeout: 爬取队列持续为空多久后退出（秒）
+        :param page_cache: 列表页缓存（可为None），用于条件请求与未变化页面短路
+        :param on_unchanged: 页面未变化时的回调 on_unchanged(stock_code, page, url, cache_hit)
+        :param html_archive: 原始HTML归档（可为None），抓取到的新页面追加写入
+        :param stop_event: 停止信号（可为None）；提供时队列为空不再按idle_timeout退出，而是等到信号置位
+        :param rate_controller: 自适应速率控制（可为None），按主机与代理限制请求速率与在途请求数
+        :param retry_scheduler: 失败页面重试调度（可为None），失败页面按退避延迟放回爬取队列
+        """
+        self.headers = headers
+        self.timeout = timeout
+        self.request_delay = request_delay
+        self.concurrency = max(1, int(concurrency))
+        self.proxy_manager = proxy_manager
+        self.task_manager = task_manager
+        self.idle_timeout = idle_timeout
+        self.page_cache = page_cache
+        self.on_unchanged = on_unchanged
+        self.html_archive = html_archive
+        self.stop_event = stop_event
+        self.rate_controller = rate_controller
+        self.retry_scheduler = retry_scheduler
+
+    async def _next_task(self, crawl_queue):
+        """从线程安全队列中取任务，不阻塞事件循环；收到停止信号（或队列空闲超时）时返回None"""
+        idle_start = time.monotonic()
+        while True:
+            try:
+                return crawl_queue.get_nowait()
+            except queue.Empty:
+                if self.stop_event is not None:
+                    if self.stop_event.is_set():
+                        return None
+                elif time.monotonic() - idle_start >= self.idle_timeout:
+                    return None
+                await asyncio.sleep(0.1)
+
+    async def _put_result(self, result_queue, item):
+        """提交结果：结果队列满时让出事件循环等待（背压），不阻塞其它在途请求"""
+        while True:
+            try:
+                result_queue.put_nowait(item)
+                return
+            except queue.Full:
+                await asyncio.sleep(0.05)
+
+    async def _get_proxy(self):
+        """获取代理：本地池有代理时直接无锁获取；冷启动需同步请求代理池时放到线程池执行"""
+        if not self.proxy_manager:
+            return None
+        if self.proxy_manager.has_cached_proxy():
+            return self.proxy_manager.get_proxy()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.proxy_manager.get_proxy)
+
+    def _report_proxy(self, proxy, ok, latency):
+        if self.proxy_manager and proxy:
+            self.proxy_manager.report_result(proxy, ok, latency)
+
+    async def _fetch(self, session, url, headers, proxy):
+        """请求列表页，返回(状态码, 响应头, 正文)，304时正文为空"""
+        # aiohttp只接受单个代理地址，http/https目标统一走http代理
+        async with session.get(url, headers=headers, proxy=proxy.get("http") if proxy else None) as response:
+            response.raise_for_status()
+            html = "" if response.status == 304 else await response.text(encoding="utf-8", errors="replace")
+            return response.status, response.headers, html
+
+    async def _worker(self, session, crawl_queue, result_queue, build_url):
+        """协程工作单元：循环取任务、请求页面并提交结果"""
+        import aiohttp
+
+        while True:
+            task = await self._next_task(crawl_queue)
+            if task is None:
+                break
+
+            stock_code, page = task
+            task_key = f"{stock_code}_{page}"
+            ticket = None
+            try:
+                # 跳过已爬取的任务
+                if self.task_manager and self.task_manager.is_crawled(stock_code, page):
+                    logger.info(f"跳过已爬取任务：{task_key}")
+                    continue
+
+                url = build_url(stock_code, page)
+                logger.info(f"开始爬取：{task_key}，URL：{url}")
+                proxy = await self._get_proxy()
+                ticket = await self.rate_controller.acquire_async(url, proxy) if self.rate_controller else None
+                request_start = time.monotonic()
+                try:
+                    headers = self.page_cache.conditional_headers(url) if self.page_cache else None
+                    status, response_headers, html = await self._fetch(session, url, headers, proxy)
+                    if status == 304 and not (self.page_cache and self.page_cache.has_entry(url)):
+                        # 没有缓存记录却返回304（中间缓存按自身记录应答），不能当作空页面，不带条件请求头重新请求
+                        logger.warning(f"没有缓存记录的页面返回304，重新请求：{task_key}")
+                        status, response_headers, html = await self._fetch(session, url, UNCONDITIONAL_HEADERS, proxy)
+                        if status == 304:
+                            raise UncachedNotModified(url, response_headers)
+                    fetch_elapsed = time.monotonic() - request_start
+                    get_metrics().observe("fetch_seconds", fetch_elapsed, status=status)
+                    self._report_proxy(proxy, True, fetch_elapsed)
+                    if ticket is not None:
+                        self.rate_controller.release(ticket, status, fetch_elapsed)
+                        ticket = None
+                    if self.retry_scheduler is not None:
+                        self.retry_scheduler.succeeded((stock_code, page))
+
+                    # 页面未变化时跳过解析与写库，否则提交结果到队列
+                    cache_hit = self.page_cache.check(url, status, response_headers, html) if self.page_cache else None
+                    if cache_hit and self.on_unchanged:
+                        self.on_unchanged(stock_code, page, url, cache_hit)
+                    else:
+                        if self.html_archive is not None:
+                            self.html_archive.append(stock_code, page, url, html)
+                        await self._put_result(result_queue, (stock_code, page, url, html, None))
+                        logger.info(f"爬取成功：{task_key}，缓存：未命中")
+                except (aiohttp.ClientError, asyncio.TimeoutError, UncachedNotModified) as e:
+                    logger.error(f"爬取失败：{task_key}，URL：{url}，错误：{e!r}")
+                    fetch_elapsed = time.monotonic() - request_start
+                    status = getattr(e, "status", None) or "error"
+                    retry_after = retry_after_seconds(getattr(e, "headers", None))
+                    get_metrics().observe("fetch_seconds", fetch_elapsed, status=status)
+                    self._report_proxy(proxy, False, fetch_elapsed)
+                    if ticket is not None:
+                        self.rate_controller.release(ticket, status, fetch_elapsed, retry_after)
+                        ticket = None
+                    # 按指数退避稍后重试，重试次数用尽后按无效页面处理
+                    if self.retry_scheduler is None or not self.retry_scheduler.schedule((stock_code, page), retry_after):
+                        await self._put_result(result_queue, (stock_code, page, url, "", None))
+
+                if self.rate_controller is None and self.request_delay > 0:
+                    await asyncio.sleep(self.request_delay)
+            except Exception as e:
+                logger.error(f"异步爬取任务异常：{task_key}，错误：{e}")
+            finally:
+                # 未上报结果的请求名额（非网络异常）按错误归还
+                if ticket is not None:
+                    self.rate_controller.release(ticket, "error", 0.0)
+                crawl_queue.task_done()
+
+    async def _run(self, crawl_queue, result_queue, build_url):
+        """创建共享会话并启动concurrency个协程"""
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(headers=self.headers, timeout=timeout,
+                                         connector=connector) as session:
+            workers = [
+                asyncio.create_task(self._worker(session, crawl_queue, result_queue, build_url))
+                for _ in range(self.concurrency)
+            ]
+            await asyncio.gather(*workers)
+
+    def run(self, crawl_queue, result_queue, build_url):
+        """
+        运行抓取引擎直到爬取队列耗尽（阻塞当前线程）
+        :param crawl_queue: 爬取任务队列，元素为(stock_code, page)
+        :param result_queue: 结果队列，元素为(stock_code, page, url, html)
+        :param build_url: URL构造函数 build_url(stock_code, page)
+        """
+        logger.info(f"异步抓取引擎启动，最大并发：{self.concurrency}")
+        asyncio.run(self._run(crawl_queue, result_queue, build_url))
+        logger.info("爬取队列已空，异步抓取引擎退出")
\ No newline at end of file
@@ -2,71 +2,415 @@
 # -*- coding: utf-8 -*-
 import os
 import json
+import time
+import sqlite3
+import threading
 from common.Logger import getLogger
+from common.Metrics import get_metrics
 
 # 初始化日志
 logger = getLogger(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "crawl_task.log"))
 
+def _read_log_lines(path):
+    """
+    读取追加写日志的完整行：最后一行若无换行符，说明写入时进程中断，
+    把文件截断到最后一个换行符（否则之后追加的记录会接在半行后面一起损坏），并丢弃该半行
+    """
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            logger.warning(f"{os.path.basename(path)}末尾有 {len(data) - end} 字节不完整记录，已截断")
+            f.truncate(end)
+    return data[:end].decode("utf-8").split("\n")[:-1]
+
+class LogCheckpoint:
+    """
+    追加写日志断点存储：每行一个已爬取key，删除记为"-key"，死记录过多时压缩重写
+    高水位另存一个日志，每行一条JSON更新记录 [股票代码, 发表时间, 帖子ID]，后写的覆盖先写的
+    """
+    def __init__(self, cache_dir, flush_every=500, flush_interval=1.0):
+        self.log_file = os.path.join(cache_dir, "crawl_task_checkpoint.log")
+        self.mark_file = os.path.join(cache_dir, "stock_high_water_mark.log")
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._records = 0
+        self._mark_records = 0
+        self._fp = None
+        self._mark_fp = None
+
+    def load(self):
+        """读取日志并重放，返回已爬取key集合"""
+        crawled = set()
+        if not os.path.exists(self.log_file):
+            return crawled
+
+        lines = _read_log_lines(self.log_file)
+        for line in lines:
+            if not line:
+                continue
+            if line[0] == "-":
+                crawled.discard(line[1:])
+            else:
+                crawled.add(line)
+        self._records = len(lines)
+        return crawled
+
+    def load_marks(self):
+        """读取高水位日志并重放，返回 {股票代码: {"publish_time": ..., "post_id": ...}}"""
+        marks = {}
+        if not os.path.exists(self.mark_file):
+            return marks
+        lines = _read_log_lines(self.mark_file)
+        for line in lines:
+            if not line:
+                continue
+            stock_code, publish_time, post_id = json.loads(line)
+            marks[stock_code] = {"publish_time": publish_time, "post_id": post_id}
+        self._mark_records = len(lines)
+        return marks
+
+    def _open(self):
+        if self._fp is None:
+            self._fp = open(self.log_file, "a", encoding="utf-8")
+        return self._fp
+
+    def add(self, keys):
+        """追加已爬取key"""
+        fp = self._open()
+        fp.write("".join(f"{key}\n" for key in keys))
+        self._records += len(keys)
+        self._pending += len(keys)
+        self._maybe_flush()
+
+    def remove(self, keys):
+        """追加删除记录"""
+        fp = self._open()
+        fp.write("".join(f"-{key}\n" for key in keys))
+        self._records += len(keys)
+        self._pending += len(keys)
+        self._maybe_flush()
+
+    def add_marks(self, marks):
+        """追加高水位更新记录：[(股票代码, 发表时间, 帖子ID)]"""
+        if self._mark_fp is None:
+            self._mark_fp = open(self.mark_file, "a", encoding="utf-8")
+        self._mark_fp.write("".join(json.dumps(list(mark), ensure_ascii=False) + "\n" for mark in marks))
+        self._mark_records += len(marks)
+        self._pending += len(marks)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if self._pending >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """批量落盘（flush + fsync）"""
+        if not self._pending:
+            return
+        start = time.monotonic()
+        for fp in (self._fp, self._mark_fp):
+            if fp is not None:
+                fp.flush()
+                os.fsync(fp.fileno())
+        get_metrics().observe("checkpoint_flush_seconds", time.monotonic() - start, backend="log")
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def need_compact(self, live_count):
+        """死记录（重复/已删除）超过存活记录数时需要压缩"""
+        return self._records > 1024 and self._records > 2 * live_count
+
+    def compact(self, crawled):
+        """用当前存活key重写日志（先写临时文件再原子替换）"""
+        self.close()
+        tmp_file = self.log_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write("".join(f"{key}\n" for key in crawled))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.log_file)
+        self._records = len(crawled)
+
+    def need_compact_marks(self, live_count):
+        """高水位日志中被覆盖的记录超过存活记录数时需要压缩"""
+        return self._mark_records > 1024 and self._mark_records > 2 * live_count
+
+    def compact_marks(self, marks):
+        """用当前高水位重写日志（先写临时文件再原子替换）"""
+        self.flush()
+        if self._mark_fp is not None:
+            self._mark_fp.close()
+            self._mark_fp = None
+        tmp_file = self.mark_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps([stock_code, mark["publish_time"], mark["post_id"]], ensure_ascii=False) + "\n"
+                            for stock_code, mark in marks.items()))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.mark_file)
+        self._mark_records = len(marks)
+
+    def close(self):
+        """落盘并关闭文件"""
+        self.flush()
+        for fp in (self._fp, self._mark_fp):
+            if fp is not None:
+                fp.close()
+        self._fp = self._mark_fp = None
+
+class SqliteCheckpoint:
+    """SQLite（WAL模式）断点存储，批量提交事务"""
+    def __init__(self, cache_dir, flush_every=500, flush_interval=1.0):
+        self.db_file = os.path.join(cache_dir, "crawl_task_checkpoint.db")
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._conn = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS crawled_task (task_key TEXT PRIMARY KEY) WITHOUT ROWID")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS high_water_mark "
+            "(stock_code TEXT PRIMARY KEY, publish_time TEXT NOT NULL, post_id TEXT NOT NULL DEFAULT '') WITHOUT ROWID"
+        )
+        self._in_tx = False
+
+    def load(self):
+        """读取全部已爬取key"""
+        return {row[0] for row in self._conn.execute("SELECT task_key FROM crawled_task")}
+
+    def load_marks(self):
+        """读取全部高水位"""
+        return {row[0]: {"publish_time": row[1], "post_id": row[2]}
+                for row in self._conn.execute("SELECT stock_code, publish_time, post_id FROM high_water_mark")}
+
+    def _begin(self):
+        if not self._in_tx:
+            self._conn.execute("BEGIN")
+            self._in_tx = True
+
+    def add(self, keys):
+        self._begin()
+        self._conn.executemany("INSERT OR IGNORE INTO crawled_task (task_key) VALUES (?)", ((k,) for k in keys))
+        self._pending += len(keys)
+        self._maybe_flush()
+
+    def remove(self, keys):
+        self._begin()
+        self._conn.executemany("DELETE FROM crawled_task WHERE task_key = ?", ((k,) for k in keys))
+        self._pending += len(keys)
+        self._maybe_flush()
+
+    def add_marks(self, marks):
+        """写入高水位：[(股票代码, 发表时间, 帖子ID)]"""
+        self._begin()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO high_water_mark (stock_code, publish_time, post_id) VALUES (?, ?, ?)", marks
+        )
+        self._pending += len(marks)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if self._pending >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """提交当前批次事务"""
+        if self._in_tx:
+            start = time.monotonic()
+            self._conn.execute("COMMIT")
+            self._in_tx = False
+            get_metrics().observe("checkpoint_flush_seconds", time.monotonic() - start, backend="sqlite")
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def need_compact(self, live_count):
+        return False
+
+    def compact(self, crawled):
+        pass
+
+    def need_compact_marks(self, live_count):
+        return False
+
+    def compact_marks(self, marks):
+        pass
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+CHECKPOINT_BACKENDS = {
+    "log": LogCheckpoint,
+    "sqlite": SqliteCheckpoint,
+}
+
 class CrawlTaskManage:
     """爬取任务管理类，实现断点续爬与缓存管理"""
-    def __init__(self, cache_dir):
+    def __init__(self, cache_dir, backend="log", flush_every=500, flush_interval=1.0):
         self.cache_dir = cache_dir
         os.makedirs(self.cache_dir, exist_ok=True)
+        # 旧版JSON缓存文件，启动时导入到新的断点存储
         self.task_cache_file = os.path.join(self.cache_dir, "crawl_task_cache.json")
+        if backend not in CHECKPOINT_BACKENDS:
+            raise ValueError(f"不支持的断点存储类型：{backend}")
+        self.lock = threading.Lock()
+        self.backend = CHECKPOINT_BACKENDS[backend](self.cache_dir, flush_every, flush_interval)
         # 加载已爬取任务缓存
         self.crawled_task = self._load_cache()
+        # 增量模式下每只股票已入库的最新帖子（高水位），旧版JSON文件启动时导入到断点存储
+        self.high_water_file = os.path.join(self.cache_dir, "stock_high_water_mark.json")
+        self.high_water_mark = self._load_high_water_mark()
 
     def _load_cache(self):
         """加载已爬取任务缓存"""
-        if os.path.exists(self.task_cache_file):
-            try:
-                with open(self.task_cache_file, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"加载任务缓存失败：{e}")
-                return {}
-        return {}
+        start = time.monotonic()
+        try:
+            crawled_task = self.backend.load()
+        except Exception as e:
+            logger.error(f"加载任务缓存失败：{e}")
+            crawled_task = set()
+        self._import_json_cache(crawled_task)
+        logger.info(f"加载任务缓存完成，共 {len(crawled_task)} 条，耗时 {time.monotonic() - start:.3f}s")
+        return crawled_task
 
-    def _save_cache(self):
-        """保存任务缓存到文件"""
+    def _import_json_cache(self, crawled_task):
+        """导入旧版JSON缓存，导入完成后重命名原文件避免重复导入"""
+        if not os.path.exists(self.task_cache_file):
+            return
         try:
-            with open(self.task_cache_file, "w", encoding="utf-8") as f:
-                json.dump(self.crawled_task, f, ensure_ascii=False, indent=2)
-            logger.debug("任务缓存已保存")
+            with open(self.task_cache_file, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+            new_keys = [key for key, crawled in legacy.items() if crawled and key not in crawled_task]
+            if new_keys:
+                self.backend.add(new_keys)
+                crawled_task.update(new_keys)
+            self.backend.flush()
+            os.replace(self.task_cache_file, self.task_cache_file + ".imported")
+            logger.info(f"已导入旧版JSON任务缓存：{len(new_keys)} 条")
         except Exception as e:
-            logger.error(f"保存任务缓存失败：{e}")
+            logger.error(f"导入旧版JSON任务缓存失败：{e}")
 
     def is_crawled(self, stock_code, page):
         """判断该股票的该页码是否已爬取"""
         key = f"{stock_code}_{page}"
-        return self.crawled_task.get(key, False)
+        return key in self.crawled_task
 
     def mark_crawled(self, stock_code, page):
         """标记该股票的该页码为已爬取"""
         key = f"{stock_code}_{page}"
-        self.crawled_task[key] = True
-        self._save_cache()
+        with self.lock:
+            if key in self.crawled_task:
+                return
+            self.crawled_task.add(key)
+            try:
+                self.backend.add([key])
+            except Exception as e:
+                logger.error(f"保存任务缓存失败：{e}")
         logger.debug(f"标记已爬取：{key}")
 
     def clear_cache(self, stock_code=None):
         """清除缓存（可选清除指定股票）"""
-        if stock_code:
-            for key in list(self.crawled_task.keys()):
-                if key.startswith(f"{stock_code}_"):
-                    del self.crawled_task[key]
-            logger.info(f"清除股票 {stock_code} 的爬取缓存")
-        else:
-            self.crawled_task.clear()
-            logger.info("清除所有爬取缓存")
-        self._save_cache()
+        with self.lock:
+            if stock_code:
+                removed = [key for key in self.crawled_task if key.startswith(f"{stock_code}_")]
+                self.crawled_task.difference_update(removed)
+                if removed:
+                    self.backend.remove(removed)
+                logger.info(f"清除股票 {stock_code} 的爬取缓存")
+            else:
+                removed = list(self.crawled_task)
+                self.crawled_task.clear()
+                if removed:
+                    self.backend.remove(removed)
+                logger.info("清除所有爬取缓存")
+            self.backend.flush()
+            if self.backend.need_compact(len(self.crawled_task)):
+                self.backend.compact(self.crawled_task)
+                logger.info("断点日志已压缩")
+
+    def _load_high_water_mark(self):
+        """加载每只股票的高水位记录"""
+        try:
+            marks = self.backend.load_marks()
+        except Exception as e:
+            logger.error(f"加载高水位记录失败：{e}")
+            marks = {}
+        self._import_json_high_water_mark(marks)
+        if self.backend.need_compact_marks(len(marks)):
+            self.backend.compact_marks(marks)
+        return marks
+
+    def _import_json_high_water_mark(self, marks):
+        """导入旧版JSON高水位文件，导入完成后重命名原文件避免重复导入"""
+        if not os.path.exists(self.high_water_file):
+            return
+        try:
+            with open(self.high_water_file, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+            updates = []
+            for stock_code, mark in legacy.items():
+                current = marks.get(stock_code)
+                if current is None or current["publish_time"] < mark["publish_time"]:
+                    marks[stock_code] = {"publish_time": mark["publish_time"], "post_id": mark.get("post_id", "")}
+                    updates.append((stock_code, mark["publish_time"], mark.get("post_id", "")))
+            if updates:
+                self.backend.add_marks(updates)
+            self.backend.flush()
+            os.replace(self.high_water_file, self.high_water_file + ".imported")
+            logger.info(f"已导入旧版JSON高水位记录：{len(updates)} 条")
+        except Exception as e:
+            logger.error(f"导入旧版JSON高水位记录失败：{e}")
+
+    def get_high_water_mark(self, stock_code):
+        """
+        获取股票的高水位
+        :return: {"publish_time": ..., "post_id": ...}，从未爬取过返回None
+        """
+        return self.high_water_mark.get(stock_code)
+
+    def set_high_water_mark(self, stock_code, publish_time, post_id=""):
+        """更新股票的高水位（只前进不后退），只追加一条更新记录，与断点记录一起批量落盘"""
+        with self.lock:
+            current = self.high_water_mark.get(stock_code)
+            if current and current.get("publish_time", "") >= publish_time:
+                return
+            self.high_water_mark[stock_code] = {"publish_time": publish_time, "post_id": post_id}
+            try:
+                self.backend.add_marks([(stock_code, publish_time, post_id)])
+                if self.backend.need_compact_marks(len(self.high_water_mark)):
+                    self.backend.compact_marks(self.high_water_mark)
+            except Exception as e:
+                logger.error(f"保存高水位记录失败：{e}")
+        logger.debug(f"更新高水位：{stock_code} -> {publish_time}")
+
+    def flush(self):
+        """立即落盘未提交的断点记录"""
+        with self.lock:
+            self.backend.flush()
+
+    def close(self):
+        """落盘并关闭断点存储"""
+        with self.lock:
+            self.backend.close()
 
 # 全局任务管理实例
 task_manager = None
 
-def init_task_manager(cache_dir):
-    """初始化任务管理实例"""
+def init_task_manager(cache_dir, backend="log", flush_every=500, flush_interval=1.0):
+    """
+    初始化任务管理实例
+    :param cache_dir: 缓存目录
+    :param backend: 断点存储类型（log：追加写日志；sqlite：SQLite WAL）
+    :param flush_every: 累计多少条记录落盘一次
+    :param flush_interval: 距上次落盘超过多少秒时落盘
+    """
     global task_manager
-    task_manager = CrawlTaskManage(cache_dir)
+    task_manager = CrawlTaskManage(cache_dir, backend, flush_every, flush_interval)
     return task_manager
 
 def get_task_manager():
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import re
+import time
+import queue
+import datetime
+import itertools
+import threading
+from collections import OrderedDict
+from common.Logger import getLogger
+from stockpost.postWriter import POST_COLUMNS
+from stockpost.postParser import parse_count
+from stockpost.httpClient import create_session
+
+# 初始化日志
+logger = getLogger(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "detail_crawl.log"))
+
+# 详情页内嵌的帖子数据（var post_article = {...}）中的点赞数与评论数
+_LIKE_PATTERN = re.compile(r'"post_like_count"\s*:\s*"?(\d+)')
+_COMMENT_PATTERN = re.compile(r'"post_comment_count"\s*:\s*"?(\d+)')
+
+# 按post_id回填点赞数与真实评论数（详情页未解析到评论数时保留列表页的值）
+UPDATE_DETAIL_SQL = (
+    "UPDATE guba_stock_post SET like_count = %s, comment_count = IFNULL(%s, comment_count) "
+    "WHERE post_id = %s"
+)
+
+def parse_detail_page(html):
+    """
+    解析帖子详情页
+    :return: (点赞数, 评论数)，页面中找不到帖子数据时返回None
+    """
+    like_match = _LIKE_PATTERN.search(html)
+    if not like_match:
+        return None
+    comment_match = _COMMENT_PATTERN.search(html)
+    return int(like_match.group(1)), int(comment_match.group(1)) if comment_match else None
+
+class DetailCrawler:
+    """
+    详情页爬取阶段：列表页数据提交后把帖子加入独立的有界优先队列，由少量专用线程抓取详情页并批量回填点赞数
+    队列满时直接丢弃（不阻塞写入线程），未回填的帖子下次运行通过load_pending从数据库补回（常驻模式定期补回）
+    帖子回填或抓取失败后即不再占用去重集合；最近回填成功的帖子另记一个有界集合，避免列表页重复加入
+    """
+    def __init__(self, mysql_client, headers, timeout, thread_num=2, queue_size=10000, request_delay=1.0,
+                 batch_rows=200, flush_interval=5.0, recent_hours=24, proxy_manager=None, rollup=None,
+                 reload_interval=0, drain_timeout=60.0):
+        """
+        :param mysql_client: MysqlDB实例
+        :param headers: 请求头
+        :param timeout: 请求超时时间（秒）
+        :param thread_num: 详情页线程数（独立于列表页线程，控制详情页占用的请求量）
+        :param queue_size: 详情页队列上限
+        :param request_delay: 每个详情页线程的请求延时（秒）
+        :param batch_rows: 累计多少条结果后批量回填
+        :param flush_interval: 距上次回填超过该时间（秒）时回填
+        :param recent_hours: 发表时间在该小时数内的帖子优先抓取
+        :param proxy_manager: 代理管理实例（可为None）
+        :param rollup: 帖子汇总（PostRollup），回填评论数时在同一事务内累加变化量；为None时不维护汇总
+        :param reload_interval: 定期从数据库补回未回填帖子的间隔（秒），0表示只在启动时补回
+        :param drain_timeout: 停止时等待队列抓取完的最长时间（秒），超时未抓取的帖子下次运行从数据库补回
+        """
+        self.mysql_client = mysql_client
+        self.headers = headers
+        self.timeout = timeout
+        self.thread_num = max(1, int(thread_num))
+        self.request_delay = request_delay
+        self.batch_rows = max(1, int(batch_rows))
+        self.flush_interval = flush_interval
+        self.recent_seconds = recent_hours * 3600
+        self.proxy_manager = proxy_manager
+        self.rollup = rollup
+        self.queue = queue.PriorityQueue(maxsize=max(1, int(queue_size)))
+        self._seq = itertools.count()
+        self.reload_interval = reload_interval
+        self.drain_timeout = drain_timeout
+        # 已入队或待回填的帖子（回填或失败后移除）；最近回填成功的帖子（最多queue_size个）
+        self._offered = set()
+        self._done = OrderedDict()
+        self._offered_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._last_reload = time.monotonic()
+        self._results = []
+        self._results_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._stop_event = threading.Event()
+        self._threads = []
+        self.stats = {"offered": 0, "dropped": 0, "fetched": 0, "failed": 0, "updated": 0}
+
+    def _priority(self, publish_time, read_count):
+        """优先级：近期帖子优先，其次阅读数高的优先，最后按发表时间从新到旧"""
+        try:
+            ts = datetime.datetime.strptime(str(publish_time), "%Y-%m-%d %H:%M:%S").timestamp()
+        except ValueError:
+            ts = 0.0
+        recent = 0 if time.time() - ts <= self.recent_seconds else 1
+        return recent, -parse_count(read_count), -ts
+
+    def _put(self, post_id, post_url, publish_time, read_count):
+        if not post_id or not post_url:
+            return False
+        with self._offered_lock:
+            if post_id in self._offered or post_id in self._done:
+                return False
+            self._offered.add(post_id)
+        try:
+            self.queue.put_nowait((self._priority(publish_time, read_count), next(self._seq), post_id, post_url))
+            self.stats["offered"] += 1
+            return True
+        except queue.Full:
+            with self._offered_lock:
+                self._offered.discard(post_id)
+            self.stats["dropped"] += 1
+            return False
+
+    def _forget(self, post_ids, done=False):
+        """
+        帖子处理结束后移出去重集合（抓取或回填失败的帖子可再次加入）
+        :param done: 是否已回填成功（是则记入最近回填集合，超出上限时淘汰最早的）
+        """
+        with self._offered_lock:
+            for post_id in post_ids:
+                self._offered.discard(post_id)
+                if done:
+                    self._done[post_id] = None
+                    self._done.move_to_end(post_id)
+            while len(self._done) > self.queue.maxsize:
+                self._done.popitem(last=False)
+
+    def offer(self, rows):
+        """
+        加入列表页解析出的帖子（非阻塞，队列满时丢弃）；列表页内嵌数据已带点赞数的帖子无需再爬详情页
+        :param rows: 帖子数据元组列表（按POST_COLUMNS顺序）
+        """
+        idx_post_id = POST_COLUMNS.index("post_id")
+        idx_url = POST_COLUMNS.index("post_url")
+        idx_time = POST_COLUMNS.index("publish_time")
+        idx_read = POST_COLUMNS.index("read_count")
+        idx_like = POST_COLUMNS.index("like_count")
+        for row in rows:
+            if row[idx_like] is not None:
+                continue
+            self._put(row[idx_post_id], row[idx_url], row[idx_time], row[idx_read])
+
+    def load_pending(self, limit=None):
+        """从数据库加载尚未回填点赞数（like_count为NULL）的帖子（最近入库的优先，最多填满队列）"""
+        if not self.mysql_client:
+            return 0
+        limit = limit or self.queue.maxsize
+        result = self.mysql_client.execute_sql(
+            "SELECT post_id, post_url, publish_time, read_count FROM guba_stock_post "
+            "WHERE like_count IS NULL AND post_id <> '' ORDER BY id DESC LIMIT %s",
+            (limit,)
+        )
+        loaded = 0
+        for row in result or []:
+            if self._put(row["post_id"], row["post_url"], row["publish_time"], row["read_count"]):
+                loaded += 1
+        logger.info(f"从数据库加载待回填详情页：{loaded} 条")
+        return loaded
+
+    def _maybe_reload(self):
+        """到达补回间隔时从数据库补回未回填的帖子（队列满时丢弃的、抓取或回填失败的）"""
+        if not self.reload_interval or time.monotonic() - self._last_reload < self.reload_interval:
+            return
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_reload = time.monotonic()
+            self.load_pending()
+        except Exception as e:
+            logger.error(f"补回待回填详情页失败：{e}")
+        finally:
+            self._reload_lock.release()
+
+    def start(self):
+        """启动详情页线程"""
+        if self._threads:
+            return
+        for i in range(self.thread_num):
+            t = threading.Thread(target=self._worker, name=f"DetailThread-{i+1}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info(f"详情页线程启动，线程数：{self.thread_num}，队列上限：{self.queue.maxsize}")
+
+    def _worker(self):
+        session = create_session(self.headers, pool_maxsize=1)
+        while not self._stop_event.is_set():
+            try:
+                _, _, post_id, post_url = self.queue.get(timeout=1)
+            except queue.Empty:
+                self._maybe_flush()
+                self._maybe_reload()
+                continue
+            try:
+                self._fetch(session, post_id, post_url)
+            finally:
+                self.queue.task_done()
+            self._maybe_flush()
+            self._maybe_reload()
+            time.sleep(self.request_delay)
+        session.close()
+
+    def _fetch(self, session, post_id, post_url):
+        proxy = self.proxy_manager.get_proxy() if self.proxy_manager else None
+        request_start = time.monotonic()
+        try:
+            response = session.get(post_url, proxies=proxy, timeout=self.timeout)
+            response.raise_for_status()
+            response.encoding = "utf-8"
+            if self.proxy_manager:
+                self.proxy_manager.report_result(proxy, True, time.monotonic() - request_start)
+        except Exception as e:
+            logger.error(f"详情页爬取失败：{post_id}，URL：{post_url}，错误：{e}")
+            if self.proxy_manager:
+                self.proxy_manager.report_result(proxy, False, time.monotonic() - request_start)
+            self.stats["failed"] += 1
+            self._forget([post_id])
+            return
+
+        counts = parse_detail_page(response.text)
+        if counts is None:
+            logger.warning(f"详情页未找到点赞数：{post_id}，URL：{post_url}")
+            self.stats["failed"] += 1
+            self._forget([post_id])
+            return
+        like_count, comment_count = counts
+        self.stats["fetched"] += 1
+        with self._results_lock:
+            self._results.append((like_count, comment_count, post_id))
+
+    def _maybe_flush(self, force=False):
+        """结果达到批量行数或超过回填间隔时批量更新"""
+        with self._results_lock:
+            if not self._results:
+                return
+            if not force and len(self._results) < self.batch_rows and \
+                    time.monotonic() - self._last_flush < self.flush_interval:
+                return
+            results, self._results = self._results, []
+            self._last_flush = time.monotonic()
+
+        ok = bool(self.mysql_client) and self._write_results(results)
+        self._forget([post_id for _, _, post_id in results], done=ok)
+        if ok:
+            self.stats["updated"] += len(results)
+        else:
+            logger.error(f"详情页回填失败，丢弃 {len(results)} 条结果（从数据库补回后重新抓取）")
+
+    def _write_results(self, results):
+        """批量回填点赞数与评论数；维护汇总时先锁定帖子读取旧评论数，回填与汇总在同一事务内提交"""
+        if self.rollup is None:
+            return self.mysql_client.batch_execute_sql(UPDATE_DETAIL_SQL, results)
+        try:
+            with self.mysql_client.transaction() as cursor:
+                existing = self.rollup.lock_existing(cursor, [post_id for _, _, post_id in results])
+                cursor.executemany(UPDATE_DETAIL_SQL, results)
+                self.rollup.apply_comment_updates(cursor, results, existing)
+            return True
+        except Exception as e:
+            logger.error(f"详情页回填事务失败：{e}")
+            return False
+
+    def stop(self, drain=True):
+        """
+        停止详情页线程
+        :param drain: 是否等待队列中的详情页抓取完（最多等待drain_timeout秒）
+        """
+        if not self._threads:
+            return
+        # 停止阶段不再从数据库补回
+        self.reload_interval = 0
+        if drain:
+            deadline = time.monotonic() + self.drain_timeout
+            while self.queue.unfinished_tasks and time.monotonic() < deadline:
+                time.sleep(0.2)
+            if self.queue.unfinished_tasks:
+                logger.info(f"详情页队列等待超时，剩余 {self.queue.qsize()} 条下次运行从数据库补回")
+        self._stop_event.set()
+        for t in self._threads:
+            t.join(timeout=self.timeout + self.request_delay + 5)
+        self._threads = []
+        self._maybe_flush(force=True)
+        logger.info(f"详情页线程退出，统计：{self.stats}")
+
+# 全局详情页爬取实例
+detail_crawler = None
+
+def init_detail_crawler(config, mysql_client, headers, proxy_manager=None, rollup=None, daemon=False):
+    """初始化详情页爬取实例（[DETAIL] ENABLE关闭时返回None；常驻模式下按RELOAD_INTERVAL定期从数据库补回）"""
+    global detail_crawler
+    if not config.getboolean("DETAIL", "ENABLE", fallback=False):
+        detail_crawler = None
+        return detail_crawler
+    detail_crawler = DetailCrawler(
+        mysql_client,
+        headers,
+        timeout=config.getint("REQUEST", "TIMEOUT", fallback=10),
+        thread_num=config.getint("DETAIL", "THREAD_NUM", fallback=2),
+        queue_size=config.getint("DETAIL", "QUEUE_SIZE", fallback=10000),
+        request_delay=config.getfloat("DETAIL", "REQUEST_DELAY", fallback=1.0),
+        batch_rows=config.getint("DETAIL", "BATCH_ROWS", fallback=200),
+        flush_interval=config.getfloat("DETAIL", "FLUSH_INTERVAL", fallback=5.0),
+        recent_hours=config.getfloat("DETAIL", "RECENT_HOURS", fallback=24),
+        proxy_manager=proxy_manager,
+        rollup=rollup,
+        reload_interval=config.getfloat("DETAIL", "RELOAD_INTERVAL", fallback=600) if daemon else 0,
+        drain_timeout=config.getfloat("DETAIL", "DRAIN_TIMEOUT", fallback=60)
+    )
+    return detail_crawler
+
+def get_detail_crawler():
+    """获取全局详情页爬取实例"""
+    return detail_crawler
\ No newline at end of file
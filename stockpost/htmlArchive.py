@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+import datetime
+import threading
+from common.Logger import getLogger
+
+# 初始化日志
+logger = getLogger(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "html_archive.log"))
+
+# 记录头：魔数(4B) + 压缩后长度(4B) + CRC32(4B)
+_RECORD_HEADER = struct.Struct("<4sII")
+_RECORD_MAGIC = b"GBA1"
+
+class HtmlArchive:
+    """
+    原始HTML归档：按顺序追加写入zlib压缩的分段文件，配合偏移索引支持mmap随机读取单页
+    段文件：segment-000001.dat，记录为 记录头 + zlib(元数据JSON + "\\n" + HTML)
+    索引文件：index.tsv，每行 段号\\t偏移\\t长度\\t股票代码\\t页码\\t抓取时间\\tURL
+    """
+    def __init__(self, archive_dir, segment_size=256 * 1024 * 1024, compress_level=6):
+        """
+        :param archive_dir: 归档目录
+        :param segment_size: 单个段文件的最大字节数，超过后切换新段
+        :param compress_level: zlib压缩级别（1最快，9压缩率最高）
+        """
+        self.archive_dir = archive_dir
+        os.makedirs(self.archive_dir, exist_ok=True)
+        self.segment_size = segment_size
+        self.compress_level = compress_level
+        self.index_file = os.path.join(self.archive_dir, "index.tsv")
+        self._lock = threading.Lock()
+        self._index = {}
+        self._segment_no = 0
+        self._segment_fp = None
+        self._index_fp = None
+        self._mmaps = {}
+        self.records = 0
+        self._load_index()
+
+    def _segment_path(self, segment_no):
+        return os.path.join(self.archive_dir, f"segment-{segment_no:06d}.dat")
+
+    def _load_index(self):
+        """加载索引：同一页面多次归档时保留最新一条"""
+        if not os.path.exists(self.index_file):
+            return
+        with open(self.index_file, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) < 7:
+                    continue
+                segment_no, offset, length, stock_code, page = parts[:5]
+                self._index[f"{stock_code}_{page}"] = (int(segment_no), int(offset), int(length))
+                self._segment_no = max(self._segment_no, int(segment_no))
+                self.records += 1
+
+    def _open_segment(self):
+        """打开当前段文件（超过段大小时切换下一段）"""
+        if self._segment_fp is not None and self._segment_fp.tell() < self.segment_size:
+            return self._segment_fp
+        if self._segment_fp is not None:
+            self._segment_fp.close()
+            self._segment_no += 1
+        elif self._segment_no == 0 or (os.path.exists(self._segment_path(self._segment_no)) and
+                                       os.path.getsize(self._segment_path(self._segment_no)) >= self.segment_size):
+            self._segment_no += 1
+        self._segment_fp = open(self._segment_path(self._segment_no), "ab")
+        if self._index_fp is None:
+            self._index_fp = open(self.index_file, "a", encoding="utf-8")
+        return self._segment_fp
+
+    def append(self, stock_code, page, url, html):
+        """追加一个页面"""
+        meta = json.dumps({"stock_code": stock_code, "page": page, "url": url,
+                           "fetched_at": int(time.time())}, ensure_ascii=False)
+        payload = zlib.compress(f"{meta}\n{html}".encode("utf-8"), self.compress_level)
+        header = _RECORD_HEADER.pack(_RECORD_MAGIC, len(payload), zlib.crc32(payload))
+        with self._lock:
+            fp = self._open_segment()
+            offset = fp.tell()
+            fp.write(header)
+            fp.write(payload)
+            length = _RECORD_HEADER.size + len(payload)
+            self._index_fp.write(f"{self._segment_no}\t{offset}\t{length}\t{stock_code}\t{page}\t"
+                                 f"{int(time.time())}\t{url}\n")
+            self._index[f"{stock_code}_{page}"] = (self._segment_no, offset, length)
+            self.records += 1
+
+    def flush(self):
+        """刷新缓冲区（进程退出前保证可读）"""
+        with self._lock:
+            if self._segment_fp is not None:
+                self._segment_fp.flush()
+                self._index_fp.flush()
+
+    def _decode(self, data):
+        magic, length, crc = _RECORD_HEADER.unpack_from(data, 0)
+        payload = data[_RECORD_HEADER.size:_RECORD_HEADER.size + length]
+        if magic != _RECORD_MAGIC or len(payload) != length or zlib.crc32(payload) != crc:
+            raise ValueError("归档记录损坏")
+        meta, html = zlib.decompress(payload).decode("utf-8").split("\n", 1)
+        meta = json.loads(meta)
+        fetched_at = meta.get("fetched_at")
+        fetched_at = datetime.datetime.fromtimestamp(fetched_at) if fetched_at else None
+        return meta["stock_code"], meta["page"], meta["url"], html, fetched_at
+
+    def _get_mmap(self, segment_no, end):
+        """获取段文件的只读mmap（当前写入段增长后重新映射）"""
+        mm = self._mmaps.get(segment_no)
+        if mm is None or len(mm) < end:
+            if mm is not None:
+                mm.close()
+            with open(self._segment_path(segment_no), "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mmaps[segment_no] = mm
+        return mm
+
+    def read(self, stock_code, page):
+        """
+        随机读取单个页面
+        :return: (stock_code, page, url, html, fetched_at)，fetched_at为抓取时间（datetime），不存在返回None
+        """
+        location = self._index.get(f"{stock_code}_{page}")
+        if location is None:
+            return None
+        segment_no, offset, length = location
+        if segment_no == self._segment_no:
+            self.flush()
+        mm = self._get_mmap(segment_no, offset + length)
+        return self._decode(mm[offset:offset + length])
+
+    @staticmethod
+    def _record_length(mm, offset):
+        """offset处记录头有效（魔数正确、记录完整且CRC一致）时返回记录总长度，否则返回0"""
+        if offset + _RECORD_HEADER.size > len(mm):
+            return 0
+        magic, payload_len, crc = _RECORD_HEADER.unpack_from(mm, offset)
+        end = offset + _RECORD_HEADER.size + payload_len
+        if magic != _RECORD_MAGIC or end > len(mm) or zlib.crc32(mm[offset + _RECORD_HEADER.size:end]) != crc:
+            return 0
+        return end - offset
+
+    def _resync(self, mm, offset):
+        """从offset之后查找下一条有效记录的起始偏移，找不到返回段末尾"""
+        pos = mm.find(_RECORD_MAGIC, offset + 1)
+        while pos >= 0 and not self._record_length(mm, pos):
+            pos = mm.find(_RECORD_MAGIC, pos + 1)
+        return len(mm) if pos < 0 else pos
+
+    def iter_records(self, latest_only=True):
+        """
+        按段顺序流式读取归档（逐段mmap顺序扫描，不加载整段）
+        遇到残缺或损坏的记录（写入中途进程退出后又继续追加）时，按魔数重新对齐到下一条有效记录，不丢弃后续记录
+        :param latest_only: 同一页面多次归档时只返回最新一条
+        :return: 生成器，元素为(stock_code, page, url, html, fetched_at)
+        """
+        self.flush()
+        latest = set(self._index.values()) if latest_only else None
+        segment_no = 1
+        while os.path.exists(self._segment_path(segment_no)):
+            segment_bytes = os.path.getsize(self._segment_path(segment_no))
+            if segment_bytes > 0:
+                mm = self._get_mmap(segment_no, segment_bytes)
+                offset = 0
+                while offset + _RECORD_HEADER.size <= len(mm):
+                    length = self._record_length(mm, offset)
+                    if not length:
+                        next_offset = self._resync(mm, offset)
+                        logger.error(f"跳过损坏的归档数据：段{segment_no} 偏移{offset}，"
+                                     f"共 {next_offset - offset} 字节，从偏移{next_offset}继续读取")
+                        offset = next_offset
+                        continue
+                    if latest is None or (segment_no, offset, length) in latest:
+                        try:
+                            yield self._decode(mm[offset:offset + length])
+                        except (ValueError, zlib.error) as e:
+                            logger.error(f"跳过损坏的归档记录：段{segment_no} 偏移{offset}，错误：{e}")
+                    offset += length
+            segment_no += 1
+
+    def close(self):
+        """落盘并关闭文件"""
+        with self._lock:
+            if self._segment_fp is not None:
+                self._segment_fp.flush()
+                os.fsync(self._segment_fp.fileno())
+                self._segment_fp.close()
+                self._segment_fp = None
+            if self._index_fp is not None:
+                self._index_fp.flush()
+                os.fsync(self._index_fp.fileno())
+                self._index_fp.close()
+                self._index_fp = None
+            for mm in self._mmaps.values():
+                mm.close()
+            self._mmaps.clear()
+        logger.info(f"HTML归档已关闭，共 {self.records} 条记录")
+
+# 全局归档实例
+html_archive = None
+
+def init_html_archive(config, force=False):
+    """
+    初始化HTML归档（[ARCHIVE] ENABLE关闭且未强制开启时返回None）
+    :param force: 回放模式下强制打开归档
+    """
+    global html_archive
+    if not force and not config.getboolean("ARCHIVE", "ENABLE", fallback=False):
+        html_archive = None
+        return html_archive
+    html_archive = HtmlArchive(
+        config.get("ARCHIVE", "ARCHIVE_DIR", fallback="./archive"),
+        segment_size=config.getint("ARCHIVE", "SEGMENT_MB", fallback=256) * 1024 * 1024,
+        compress_level=config.getint("ARCHIVE", "COMPRESS_LEVEL", fallback=6)
+    )
+    return html_archive
+
+def get_html_archive():
+    """获取全局归档实例"""
+    return html_archive
\ No newline at end of file
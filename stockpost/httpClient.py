@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import requests
+from requests.adapters import HTTPAdapter
+
+def create_session(headers=None, pool_connections=4, pool_maxsize=10):
+    """
+    创建带连接池的HTTP会话（keep-alive，连接在线程间复用）
+    :param headers: 会话默认请求头
+    :param pool_connections: 缓存连接池的主机（含代理）数量
+    :param pool_maxsize: 每个主机保持的空闲连接数，应不小于并发请求的线程数，否则多余连接用完即关闭
+    :return: requests.Session
+    """
+    session = requests.Session()
+    if headers:
+        session.headers.update(headers)
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def init_http_session(config, headers, thread_num):
+    """
+    按[REQUEST]配置创建列表页抓取会话
+    :param thread_num: 共用该会话的最大线程数（每个主机的连接数不小于该值）
+    """
+    return create_session(
+        headers,
+        pool_connections=config.getint("REQUEST", "POOL_CONNECTIONS", fallback=4),
+        pool_maxsize=max(config.getint("REQUEST", "POOL_MAXSIZE", fallback=0), int(thread_num))
+    )
\ No newline at end of file
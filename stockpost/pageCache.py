@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from common.Logger import getLogger
+
+# 初始化日志
+logger = getLogger(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "page_cache.log"))
+
+# 帖子列表区域的起始标记与行结束标记（新版div.articleh / 旧版tr.listitem）
+_LIST_MARKERS = (
+    ('class="articleh normal_post"', "</div>"),
+    ('class="listitem"', "</tr>"),
+)
+_WHITESPACE = re.compile(r"\s+")
+
+# 没有缓存记录却收到304时，重新请求使用的请求头：不带条件请求头，并要求中间缓存回源
+UNCONDITIONAL_HEADERS = {"Cache-Control": "no-cache", "Pragma": "no-cache"}
+
+class UncachedNotModified(Exception):
+    """没有缓存记录的URL重新请求后仍返回304（按请求失败重试）"""
+    def __init__(self, url, headers=None):
+        super().__init__(f"没有缓存记录的页面返回304：{url}")
+        self.status = 304
+        self.headers = headers
+
+def post_list_digest(html):
+    """
+    计算帖子列表区域的内容哈希（不构建DOM）：截取首个帖子行到最后一个帖子行结束，去除空白后哈希
+    页面其它区域（广告、推荐、脚本等）的变化不影响结果
+    """
+    region = html
+    for marker, row_end in _LIST_MARKERS:
+        start = html.find(marker)
+        if start < 0:
+            continue
+        last = html.rfind(marker)
+        end = html.find(row_end, last)
+        region = html[start:end if end >= 0 else len(html)]
+        break
+    return hashlib.blake2b(_WHITESPACE.sub("", region).encode("utf-8"), digest_size=16).hexdigest()
+
+class PageCache:
+    """列表页缓存：按URL记录ETag/Last-Modified与帖子列表哈希，用于条件请求与未变化页面短路"""
+    def __init__(self, cache_dir, save_interval=60):
+        """
+        :param cache_dir: 缓存目录
+        :param save_interval: 缓存文件落盘间隔（秒）
+        """
+        self.cache_file = os.path.join(cache_dir, "page_cache.json")
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._entries = self._load()
+        # 已抓取但数据尚未提交的页面，提交成功后才生效，避免写库失败后被误判为未变化
+        self._pending = {}
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self.stats = {"hit_304": 0, "hit_hash": 0, "miss": 0, "bytes_saved": 0}
+
+    def _load(self):
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.error(f"加载页面缓存失败：{e}")
+        return {}
+
+    def has_entry(self, url):
+        """URL是否有已生效的缓存记录（304只对有记录的URL有效）"""
+        return url in self._entries
+
+    def conditional_headers(self, url):
+        """生成条件请求头（If-None-Match / If-Modified-Since）"""
+        entry = self._entries.get(url)
+        if not entry:
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def check(self, url, status, headers, html):
+        """
+        判断响应是否命中缓存
+        :param status: HTTP状态码
+        :param headers: 响应头（支持get的映射）
+        :param html: 响应正文（304时为空）
+        :return: 命中原因（"304"/"hash"），未命中返回None
+        """
+        entry = self._entries.get(url)
+        if status == 304 and entry:
+            with self._lock:
+                self.stats["hit_304"] += 1
+                self.stats["bytes_saved"] += entry.get("length", 0)
+            return "304"
+
+        digest = post_list_digest(html)
+        new_entry = {
+            "etag": headers.get("ETag", ""),
+            "last_modified": headers.get("Last-Modified", ""),
+            "hash": digest,
+            "length": len(html),
+        }
+        with self._lock:
+            if entry and entry.get("hash") == digest:
+                self.stats["hit_hash"] += 1
+                # 内容未变，直接刷新校验头
+                entry.update(new_entry)
+                self._dirty = True
+                return "hash"
+            self.stats["miss"] += 1
+            self._pending[url] = new_entry
+        return None
+
+    def commit(self, url):
+        """页面数据提交成功后，使本次抓取的缓存记录生效"""
+        with self._lock:
+            entry = self._pending.pop(url, None)
+            if entry is None:
+                return
+            self._entries[url] = entry
+            self._dirty = True
+            need_save = time.monotonic() - self._last_save >= self.save_interval
+        if need_save:
+            self.save()
+
+    def save(self):
+        """缓存落盘（写临时文件后原子替换）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._entries, ensure_ascii=False)
+            self._dirty = False
+            self._last_save = time.monotonic()
+        try:
+            tmp_file = self.cache_file + ".tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            logger.error(f"保存页面缓存失败：{e}")
+
+    def close(self):
+        """落盘并输出命中统计"""
+        self.save()
+        total = self.stats["hit_304"] + self.stats["hit_hash"] + self.stats["miss"]
+        hit_rate = (self.stats["hit_304"] + self.stats["hit_hash"]) / total if total else 0.0
+        logger.info(f"页面缓存统计：{self.stats}，命中率：{hit_rate:.1%}")
+
+# 全局页面缓存实例
+page_cache = None
+
+def init_page_cache(config):
+    """初始化页面缓存（[REQUEST] PAGE_CACHE关闭时返回None）"""
+    global page_cache
+    if not config.getboolean("REQUEST", "PAGE_CACHE", fallback=True):
+        page_cache = None
+        return page_cache
+    page_cache = PageCache(config.get("BASE", "CACHE_DIR"))
+    return page_cache
+
+def get_page_cache():
+    """获取全局页面缓存实例"""
+    return page_cache
\ No newline at end of file
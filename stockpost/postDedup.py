@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import re
+import time
+import zlib
+import hashlib
+import threading
+from array import array
+from common.Logger import getLogger
+from stockpost.postWriter import POST_COLUMNS
+
+# 初始化日志
+logger = getLogger(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "post_dedup.log"))
+
+# 股吧帖子链接：/news,600036,1234567890.html；财富号文章：/news/20231201123456789
+POST_ID_PATTERN = re.compile(r"(?:/news,[^,/]+,|/news/)(\d+)")
+
+_IDX_POST_ID = POST_COLUMNS.index("post_id")
+_IDX_READ = POST_COLUMNS.index("read_count")
+_IDX_COMMENT = POST_COLUMNS.index("comment_count")
+
+# 过滤器槽位：8字节帖子键 + 4字节计数签名；键为0表示空槽位
+_SLOT_BYTES = 12
+_EMPTY = 0
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+
+def extract_post_id(post_url, stock_code="", post_title="", publish_time=""):
+    """
+    从帖子链接中提取帖子ID，作为guba_stock_post的唯一键
+    链接无法识别时退化为链接的哈希；没有链接时用股票代码+标题+时间的哈希
+    """
+    if post_url:
+        match = POST_ID_PATTERN.search(post_url)
+        if match:
+            return match.group(1)
+        return "u" + hashlib.md5(post_url.encode("utf-8")).hexdigest()[:20]
+    raw = f"{stock_code}|{post_title}|{publish_time}"
+    return "h" + hashlib.md5(raw.encode("utf-8")).hexdigest()[:20]
+
+def _count_signature(read_count, comment_count):
+    """阅读数+评论数的紧凑签名，用于判断帖子是否有变化"""
+    return zlib.crc32(f"{read_count}|{comment_count}".encode("utf-8"))
+
+def _post_key(post_id):
+    """post_id转为64位整数键（数字ID直接使用，其它ID取哈希），0保留为空槽位"""
+    post_id = str(post_id)
+    if post_id.isdigit() and len(post_id) <= 19:
+        key = int(post_id)
+    else:
+        key = int.from_bytes(hashlib.blake2b(post_id.encode("utf-8"), digest_size=8).digest(), "little")
+    return key or 1
+
+class SeenPostFilter:
+    """
+    已入库帖子过滤器：阅读数/评论数未变化的帖子在写库前丢弃
+    定长两路组相联表（array存储，每个槽位12字节：64位帖子键 + 32位计数签名），内存固定为 capacity * 12 字节，
+    不随表增长；组满时淘汰较早写入的帖子，被淘汰的帖子只会多写一次库，不会被误判为未变化
+    """
+    def __init__(self, capacity=4000000):
+        """
+        :param capacity: 槽位数（最多记录的帖子数）
+        """
+        self.sets = max(1, int(capacity) // 2)
+        self.capacity = self.sets * 2
+        self._keys = array("Q", bytes(8 * self.capacity))
+        self._signatures = array("I", bytes(4 * self.capacity))
+        self._lock = threading.Lock()
+        self._count = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return self._count
+
+    def _slot(self, key):
+        """帖子键所在组的第一个槽位（乘法哈希后取高位映射到组，连续的帖子ID也能均匀分散）"""
+        return ((key * _HASH_MULTIPLIER & _MASK64) * self.sets >> 64) * 2
+
+    def _put(self, key, signature):
+        """写入帖子计数签名：组内最近写入的帖子放在第一个槽位，新帖子挤出组内较早的帖子"""
+        base = self._slot(key)
+        keys, signatures = self._keys, self._signatures
+        if keys[base] == key:
+            signatures[base] = signature
+            return
+        if keys[base + 1] != key:
+            if keys[base] == _EMPTY:
+                keys[base], signatures[base] = key, signature
+                self._count += 1
+                return
+            if keys[base + 1] == _EMPTY:
+                self._count += 1
+            else:
+                self.evicted += 1
+        keys[base + 1], signatures[base + 1] = keys[base], signatures[base]
+        keys[base], signatures[base] = key, signature
+
+    def _put_if_free(self, key, signature):
+        """预热时按从新到旧写入：只占用组内空槽位，不挤出已加载的较新帖子"""
+        base = self._slot(key)
+        keys, signatures = self._keys, self._signatures
+        for i in (base, base + 1):
+            if keys[i] == key:
+                return
+            if keys[i] == _EMPTY:
+                keys[i], signatures[i] = key, signature
+                self._count += 1
+                return
+
+    def warm_up(self, mysql_client, chunk_size=50000):
+        """
+        按主键从新到旧分段预热最近入库的帖子（最多capacity条，更早的帖子不加载），避免一次性加载整表结果集
+        按行数而不是主键区间截取，主键不连续（删除、自增步长）时也能加载满capacity条
+        """
+        if not mysql_client:
+            return
+        start = time.monotonic()
+        loaded, last_id = 0, None
+        while loaded < self.capacity:
+            limit = min(chunk_size, self.capacity - loaded)
+            if last_id is None:
+                rows = mysql_client.execute_sql(
+                    "SELECT id, post_id, read_count, comment_count FROM guba_stock_post "
+                    "ORDER BY id DESC LIMIT %s",
+                    (limit,)
+                )
+            else:
+                rows = mysql_client.execute_sql(
+                    "SELECT id, post_id, read_count, comment_count FROM guba_stock_post "
+                    "WHERE id < %s ORDER BY id DESC LIMIT %s",
+                    (last_id, limit)
+                )
+            if not rows:
+                break
+            with self._lock:
+                for row in rows:
+                    self._put_if_free(_post_key(row["post_id"]),
+                                      _count_signature(row["read_count"], row["comment_count"]))
+            loaded += len(rows)
+            last_id = rows[-1]["id"]
+        logger.info(f"已入库帖子过滤器预热完成，共 {self._count} 条（容量 {self.capacity}，"
+                    f"{self.capacity * _SLOT_BYTES / 1024 / 1024:.0f}MB），耗时 {time.monotonic() - start:.3f}s")
+
+    def is_unchanged(self, row):
+        """帖子已入库且阅读数、评论数均未变化时返回True"""
+        key = _post_key(row[_IDX_POST_ID])
+        base = self._slot(key)
+        signature = _count_signature(row[_IDX_READ], row[_IDX_COMMENT])
+        with self._lock:
+            for i in (base, base + 1):
+                if self._keys[i] == key:
+                    return self._signatures[i] == signature
+        return False
+
+    def update(self, rows):
+        """数据提交成功后记录帖子的最新计数"""
+        items = [(_post_key(row[_IDX_POST_ID]), _count_signature(row[_IDX_READ], row[_IDX_COMMENT])) for row in rows]
+        with self._lock:
+            for key, signature in items:
+                self._put(key, signature)
+
+def upgrade_post_table(mysql_client, chunk_size=5000):
+    """
+    为旧版guba_stock_post补充post_id列与唯一键：回填post_id -> 删除重复帖子（保留最新一条）-> 加唯一键
+    :param mysql_client: MysqlDB实例
+    :param chunk_size: 回填post_id时每批处理的行数
+    """
+    if not mysql_client:
+        return
+    columns = mysql_client.execute_sql(
+        "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'guba_stock_post' AND COLUMN_NAME = 'post_id'"
+    )
+    if columns is False:
+        return
+    if not columns:
+        logger.info("guba_stock_post缺少post_id列，开始升级表结构")
+        mysql_client.execute_sql(
+            "ALTER TABLE guba_stock_post ADD COLUMN post_id VARCHAR(64) NOT NULL DEFAULT '' "
+            "COMMENT '帖子ID（唯一键）' AFTER stock_code"
+        )
+
+    # 回填缺失的post_id
+    filled = 0
+    while True:
+        rows = mysql_client.execute_sql(
+            "SELECT id, stock_code, post_title, publish_time, post_url FROM guba_stock_post "
+            "WHERE post_id = '' LIMIT %s",
+            (chunk_size,)
+        )
+        if not rows:
+            break
+        ok = mysql_client.batch_execute_sql(
+            "UPDATE guba_stock_post SET post_id = %s WHERE id = %s",
+            [(extract_post_id(r["post_url"], r["stock_code"], r["post_title"], r["publish_time"]), r["id"])
+             for r in rows]
+        )
+        if not ok:
+            logger.error("post_id回填失败，跳过唯一键升级")
+            return
+        filled += len(rows)
+    if filled:
+        logger.info(f"post_id回填完成，共 {filled} 条")
+
+    indexes = mysql_client.execute_sql(
+        "SELECT INDEX_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'guba_stock_post' AND INDEX_NAME = 'uk_post_id'"
+    )
+    if indexes is False or indexes:
+        return
+    mysql_client.execute_sql(
+        "DELETE t1 FROM guba_stock_post t1 JOIN guba_stock_post t2 "
+        "ON t1.post_id = t2.post_id AND t1.id < t2.id"
+    )
+    mysql_client.execute_sql("ALTER TABLE guba_stock_post ADD UNIQUE KEY uk_post_id (post_id)")
+    logger.info("guba_stock_post已删除重复帖子并添加唯一键uk_post_id")
+
+# 全局过滤器实例
+seen_filter = None
+
+def init_seen_filter(config, mysql_client):
+    """初始化已入库帖子过滤器（[WRITER] SEEN_FILTER关闭时返回None）"""
+    global seen_filter
+    if not config.getboolean("WRITER", "SEEN_FILTER", fallback=True):
+        seen_filter = None
+        return seen_filter
+    seen_filter = SeenPostFilter(config.getint("WRITER", "SEEN_FILTER_CAPACITY", fallback=4000000))
+    seen_filter.warm_up(mysql_client)
+    return seen_filter
+
+def get_seen_filter():
+    """获取全局过滤器实例"""
+    return seen_filter
\ No newline at end of file
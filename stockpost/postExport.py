@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import csv
+import json
+import time
+import datetime
+from common.Logger import getLogger
+
+# 初始化日志
+logger = getLogger(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "post_export.log"))
+
+POST_TABLE = "guba_stock_post"
+
+# 导出列（不含自增id）
+EXPORT_COLUMNS = (
+    "stock_code", "post_id", "post_title", "author_name", "author_id", "author_url",
+    "publish_time", "read_count", "comment_count", "like_count", "post_url", "crawl_time"
+)
+# 文件中的列：stock_code已体现在分区目录名中（Hive分区格式），不重复写入文件
+FILE_COLUMNS = EXPORT_COLUMNS[1:]
+DATETIME_COLUMNS = ("publish_time", "crawl_time")
+INT_COLUMNS = ("read_count", "comment_count", "like_count")
+
+# 导出状态文件（保存在导出目录下）：上次导出截止的crawl_time与未完成的导出批次
+STATE_FILE = "_export_state.json"
+
+def _to_datetime(value):
+    """DATETIME列的值统一为datetime（MySQL返回datetime，SQLite等返回字符串）"""
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    try:
+        return datetime.datetime.strptime(str(value)[:19], "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+
+def partition_date(publish_time):
+    """分区日期（发表日期），发表时间未知时为unknown"""
+    publish_time = _to_datetime(publish_time)
+    return publish_time.strftime("%Y-%m-%d") if publish_time else "unknown"
+
+class CsvPartitionWriter:
+    """单个分区的CSV文件（带表头，UTF-8），写临时文件，关闭时原子替换为正式文件"""
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path + ".tmp", "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(FILE_COLUMNS)
+        self.rows = 0
+
+    def write(self, row):
+        self._writer.writerow(["" if row[c] is None else row[c] for c in FILE_COLUMNS])
+        self.rows += 1
+
+    def close(self):
+        self._file.close()
+        os.replace(self.path + ".tmp", self.path)
+
+class ParquetPartitionWriter:
+    """单个分区的Parquet文件：缓冲row_group_rows行写一个行组，内存占用不超过一个行组"""
+    def __init__(self, path, row_group_rows=50000, compression="snappy"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self.path = path
+        self.row_group_rows = row_group_rows
+        self.schema = pa.schema([
+            (c, pa.timestamp("s") if c in DATETIME_COLUMNS else pa.int64() if c in INT_COLUMNS else pa.string())
+            for c in FILE_COLUMNS
+        ])
+        self._writer = pq.ParquetWriter(path + ".tmp", self.schema, compression=compression)
+        self._buffer = []
+        self.rows = 0
+
+    def write(self, row):
+        self._buffer.append(row)
+        self.rows += 1
+        if len(self._buffer) >= self.row_group_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        columns = {}
+        for c in FILE_COLUMNS:
+            values = [row[c] for row in self._buffer]
+            columns[c] = [_to_datetime(v) for v in values] if c in DATETIME_COLUMNS else values
+        self._writer.write_table(self._pa.Table.from_pydict(columns, schema=self.schema))
+        self._buffer = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+        os.replace(self.path + ".tmp", self.path)
+
+class PostExporter:
+    """
+    帖子表流式导出：服务端游标逐批读取，按 stock_code=<代码>/date=<发表日期> 分区写Parquet或CSV
+    查询按(stock_code, publish_time)排序，每个分区的行连续到达，同一时刻只打开一个分区文件，
+    内存占用只与批量大小和行组大小有关，与表大小无关
+    增量导出以crawl_time为键：每次导出 (上次截止时间, 本次截止时间] 内入库的帖子，每个分区新增一个part文件；
+    crawl_time只在帖子首次入库时写入，已入库帖子的计数刷新不会被增量导出
+    """
+    def __init__(self, mysql_client, output_dir, fmt="parquet", batch_size=5000, row_group_rows=50000,
+                 lag_seconds=60, compression="snappy"):
+        """
+        :param mysql_client: MysqlDB实例（需支持stream_sql）
+        :param output_dir: 导出目录
+        :param fmt: parquet / csv
+        :param batch_size: 服务端游标每批读取的行数
+        :param row_group_rows: Parquet每个行组的行数
+        :param lag_seconds: 截止时间取数据库当前时间减去该秒数，避免漏掉导出开始时尚未提交的写入
+        :param compression: Parquet压缩算法（snappy / zstd / gzip / none）
+        """
+        if fmt not in ("parquet", "csv"):
+            raise ValueError(f"不支持的导出格式：{fmt}")
+        self.mysql_client = mysql_client
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.row_group_rows = row_group_rows
+        self.lag_seconds = lag_seconds
+        self.compression = compression
+        self.state_file = os.path.join(output_dir, STATE_FILE)
+
+    def _load_state(self):
+        if os.path.exists(self.state_file):
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+    def _save_state(self, state):
+        tmp_file = self.state_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.state_file)
+
+    def _cutoff(self):
+        """本次导出的截止crawl_time（数据库时间，字符串）"""
+        result = self.mysql_client.execute_sql(
+            "SELECT DATE_FORMAT(NOW() - INTERVAL %s SECOND, '%%Y-%%m-%%d %%H:%%i:%%s') AS cutoff",
+            (int(self.lag_seconds),)
+        )
+        if not result:
+            raise RuntimeError("无法读取数据库当前时间")
+        return result[0]["cutoff"]
+
+    def _open_writer(self, stock_code, date, tag):
+        directory = os.path.join(self.output_dir, f"stock_code={stock_code}", f"date={date}")
+        os.makedirs(directory, exist_ok=True)
+        if self.fmt == "csv":
+            return CsvPartitionWriter(os.path.join(directory, f"part-{tag}.csv"))
+        compression = None if self.compression == "none" else self.compression
+        return ParquetPartitionWriter(os.path.join(directory, f"part-{tag}.parquet"), self.row_group_rows, compression)
+
+    def export(self, full=False):
+        """
+        执行一次导出
+        中断后重新运行会沿用未完成批次的截止时间与文件名，覆盖已写出的part文件，不产生重复数据
+        :param full: 忽略上次导出位置，导出截止时间之前的全部帖子（应导出到空目录）
+        :return: 导出统计
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        state = {} if full else self._load_state()
+        since = state.get("last_crawl_time")
+        pending = state.get("pending")
+        if pending and pending.get("since") == since:
+            until = pending["until"]
+            logger.info(f"继续未完成的导出批次：({since or '最早'}, {until}]")
+        else:
+            until = self._cutoff()
+        state["pending"] = {"since": since, "until": until}
+        self._save_state(state)
+
+        sql = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM {POST_TABLE} WHERE crawl_time <= %s"
+        params = [until]
+        if since:
+            sql += " AND crawl_time > %s"
+            params.append(since)
+        sql += " ORDER BY stock_code, publish_time"
+
+        tag = until.replace("-", "").replace(":", "").replace(" ", "T")
+        start = time.monotonic()
+        stats = {"rows": 0, "files": 0}
+        writer, current = None, None
+        try:
+            for batch_no, rows in enumerate(self.mysql_client.stream_sql(sql, params, batch_size=self.batch_size), 1):
+                for row in rows:
+                    key = (row["stock_code"], partition_date(row["publish_time"]))
+                    if key != current:
+                        if writer is not None:
+                            writer.close()
+                        writer, current = self._open_writer(key[0], key[1], tag), key
+                        stats["files"] += 1
+                    writer.write(row)
+                stats["rows"] += len(rows)
+                if batch_no % 100 == 0:
+                    logger.info(f"已导出 {stats['rows']} 行，{stats['rows'] / (time.monotonic() - start):.0f} 行/秒")
+            if writer is not None:
+                writer.close()
+        except Exception:
+            logger.error(f"导出中断（已导出 {stats['rows']} 行），重新运行将从本批次开始重新导出", exc_info=True)
+            raise
+
+        stats.update(since=since, until=until, format=self.fmt, seconds=round(time.monotonic() - start, 1))
+        self._save_state({"last_crawl_time": until, "last_run": stats})
+        logger.info(f"导出完成：{stats}")
+        return stats
+
+def ensure_export_index(mysql_client):
+    """增量导出按crawl_time过滤：旧表缺少crawl_time索引时在线添加"""
+    result = mysql_client.execute_sql(
+        "SELECT INDEX_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = 'crawl_time'",
+        (POST_TABLE,)
+    )
+    if result is False or result:
+        return
+    logger.info(f"{POST_TABLE}缺少crawl_time索引，开始在线添加")
+    mysql_client.execute_sql(f"ALTER TABLE {POST_TABLE} ADD INDEX idx_crawl_time (crawl_time), ALGORITHM=INPLACE, LOCK=NONE")
+
+def init_post_exporter(config, mysql_client):
+    """按[EXPORT]配置创建帖子导出器"""
+    return PostExporter(
+        mysql_client,
+        output_dir=config.get("EXPORT", "OUTPUT_DIR", fallback="./export"),
+        fmt=config.get("EXPORT", "FORMAT", fallback="parquet").strip().lower(),
+        batch_size=config.getint("EXPORT", "BATCH_SIZE", fallback=5000),
+        row_group_rows=config.getint("EXPORT", "ROW_GROUP_ROWS", fallback=50000),
+        lag_seconds=config.getint("EXPORT", "LAG_SECONDS", fallback=60),
+        compression=config.get("EXPORT", "COMPRESSION", fallback="snappy").strip().lower()
+    )
\ No newline at end of file
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import time
+import datetime
+from common.Logger import getLogger
+from mysql.mysql_db import CREATE_POST_TABLE_SQL
+from stockpost.postParser import parse_count, infer_publish_time
+
+# 初始化日志
+logger = getLogger(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "post_migrate.log"))
+
+POST_TABLE = "guba_stock_post"
+NEW_TABLE = "guba_stock_post_new"
+OLD_TABLE = "guba_stock_post_old"
+
+# 迁移时逐列复制（id保留，旧表与新表主键一致，中断后可按最大id续迁）
+MIGRATE_COLUMNS = (
+    "id", "stock_code", "post_id", "post_title", "author_name", "author_id", "author_url",
+    "publish_time", "read_count", "comment_count", "like_count", "post_url", "crawl_time"
+)
+
+# 旧版列表页点赞数占位文本
+LEGACY_LIKE_PLACEHOLDER = "需爬详情页"
+
+def _upsert_sql(table, columns):
+    updates = ", ".join(f"{c} = VALUES({c})" for c in ("publish_time", "read_count", "comment_count", "like_count"))
+    return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON DUPLICATE KEY UPDATE {updates}")
+
+def post_table_is_typed(mysql_client, table=POST_TABLE):
+    """
+    帖子表是否已是整数计数/DATETIME发表时间的结构
+    :return: True/False，无法查询（表不存在或非MySQL）时返回None
+    """
+    columns = mysql_client.execute_sql(
+        "SELECT DATA_TYPE FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = 'read_count'",
+        (table,)
+    )
+    if not columns:
+        return None
+    return columns[0]["DATA_TYPE"].lower() in ("int", "bigint", "mediumint", "smallint", "tinyint")
+
+def _table_exists(mysql_client, table):
+    result = mysql_client.execute_sql(
+        "SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,)
+    )
+    return bool(result)
+
+def convert_legacy_publish_time(publish_time, crawl_time):
+    """
+    旧版发表时间文本 -> "YYYY-MM-DD HH:MM:SS"
+    旧版按爬取当年补全年份，跨年爬取的帖子会晚于爬取时间，按爬取时间重新推断年份
+    """
+    crawl_time = crawl_time or datetime.datetime.now()
+    normalized = infer_publish_time(str(publish_time or ""), crawl_time)
+    if normalized is None:
+        return None
+    parsed = datetime.datetime.strptime(normalized, "%Y-%m-%d %H:%M:%S")
+    if parsed > crawl_time + datetime.timedelta(days=1):
+        return infer_publish_time(parsed.strftime("%m-%d %H:%M"), crawl_time)
+    return normalized
+
+def convert_legacy_row(row):
+    """旧版行（字典）-> 新表写入参数（按MIGRATE_COLUMNS顺序）"""
+    like_count = row["like_count"]
+    if like_count is None or str(like_count).strip() in ("", LEGACY_LIKE_PLACEHOLDER):
+        like_count = None
+    else:
+        like_count = parse_count(like_count)
+    return (
+        row["id"], row["stock_code"], row["post_id"], row["post_title"], row["author_name"], row["author_id"],
+        row["author_url"], convert_legacy_publish_time(row["publish_time"], row["crawl_time"]),
+        parse_count(row["read_count"]), parse_count(row["comment_count"]), like_count,
+        row["post_url"], row["crawl_time"]
+    )
+
+def _copy_rows(mysql_client, source, target, last_id, chunk_size, keep_id=True):
+    """
+    从source复制一批id大于last_id的行到target
+    :return: (复制行数, 本批最大id)
+    """
+    rows = mysql_client.execute_sql(
+        f"SELECT {', '.join(MIGRATE_COLUMNS)} FROM {source} WHERE id > %s ORDER BY id LIMIT %s",
+        (last_id, chunk_size)
+    )
+    if rows is False:
+        raise RuntimeError(f"读取{source}失败")
+    if not rows:
+        return 0, last_id
+    params = [convert_legacy_row(row) for row in rows]
+    columns = MIGRATE_COLUMNS
+    if not keep_id:
+        columns, params = columns[1:], [p[1:] for p in params]
+    with mysql_client.transaction() as cursor:
+        cursor.executemany(_upsert_sql(target, columns), params)
+    return len(rows), rows[-1]["id"]
+
+def migrate_post_table(mysql_client, chunk_size=5000, pause=0.1):
+    """
+    在线迁移guba_stock_post到整数计数/DATETIME发表时间结构：
+    1. 按新结构建guba_stock_post_new，按主键分块转换复制（每块一个短事务，块间暂停，爬虫可继续写旧表）
+    2. 追平复制期间新增的行后，RENAME原子替换表（旧表保留为guba_stock_post_old，核对后手动删除）
+    3. 补复制追平与替换之间写入旧表的行
+    复制期间已复制行的计数刷新与点赞数回填会丢失，由后续爬取（计数变化即写入）与详情页补回（like_count为NULL）自愈
+    :param mysql_client: MysqlDB实例
+    :param chunk_size: 每块复制的行数
+    :param pause: 块间暂停（秒），降低对线上写入的影响
+    :return: 迁移完成（或无需迁移）返回True，失败返回False
+    """
+    if not mysql_client:
+        return False
+    typed = post_table_is_typed(mysql_client)
+    if typed is None:
+        logger.error(f"无法读取{POST_TABLE}表结构，跳过迁移")
+        return False
+    if typed:
+        logger.info(f"{POST_TABLE}已是新表结构，无需迁移")
+        return True
+    if _table_exists(mysql_client, OLD_TABLE):
+        logger.error(f"{OLD_TABLE}已存在（上次迁移的旧表），请核对后删除再迁移")
+        return False
+
+    mysql_client.execute_sql(CREATE_POST_TABLE_SQL.format(table=NEW_TABLE))
+    result = mysql_client.execute_sql(f"SELECT IFNULL(MAX(id), 0) AS max_id FROM {NEW_TABLE}")
+    if not result:
+        logger.error(f"无法读取{NEW_TABLE}，迁移终止")
+        return False
+    last_id = result[0]["max_id"]
+    if last_id:
+        logger.info(f"从上次中断处继续迁移，已迁移至id {last_id}")
+
+    start = time.monotonic()
+    copied = 0
+    try:
+        # 复制并追平：某一批不足chunk_size说明已追上旧表的写入
+        while True:
+            count, last_id = _copy_rows(mysql_client, POST_TABLE, NEW_TABLE, last_id, chunk_size)
+            copied += count
+            if count < chunk_size:
+                break
+            if copied % (chunk_size * 20) == 0:
+                logger.info(f"已迁移 {copied} 条，当前id {last_id}，{copied / (time.monotonic() - start):.0f} 条/秒")
+            time.sleep(pause)
+
+        if mysql_client.execute_sql(
+                f"RENAME TABLE {POST_TABLE} TO {OLD_TABLE}, {NEW_TABLE} TO {POST_TABLE}") is False:
+            logger.error("替换表失败，新表保留为guba_stock_post_new，可重新运行迁移")
+            return False
+
+        # 追平与替换之间写入旧表的行（不保留id，避免与新表自增id冲突，按post_id幂等写入）
+        while True:
+            count, last_id = _copy_rows(mysql_client, OLD_TABLE, POST_TABLE, last_id, chunk_size, keep_id=False)
+            copied += count
+            if count < chunk_size:
+                break
+    except Exception as e:
+        logger.error(f"迁移失败（已迁移 {copied} 条，可重新运行从id {last_id} 继续）：{e}")
+        return False
+
+    logger.info(f"{POST_TABLE}迁移完成，共 {copied} 条，耗时 {time.monotonic() - start:.1f}s，"
+                f"旧表保留为{OLD_TABLE}")
+    return True
\ No newline at end of file
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import json
+import datetime
+from decimal import Decimal, InvalidOperation
+from collections import namedtuple
+from lxml import etree
+import lxml.html
+from common.Logger import getLogger
+from stockpost.postWriter import POST_COLUMNS
+from stockpost.postDedup import extract_post_id
+
+# 初始化日志
+logger = getLogger(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "post_parser.log"))
+
+# 解析结果（字段顺序与POST_COLUMNS一致，可直接作为写库参数）
+Post = namedtuple("Post", POST_COLUMNS)
+
+GUBA_HOST = "https://guba.eastmoney.com"
+# 点赞数（列表页无，写入NULL表示需爬详情页）
+LIKE_COUNT_PLACEHOLDER = None
+# 推断年份时允许的时钟误差：补全后晚于参考时间超过该值视为上一年的帖子
+_FUTURE_TOLERANCE = datetime.timedelta(days=1)
+
+def parse_count(text):
+    """解析计数文本（"1234"、"1.2万"、"3亿"），无法解析时返回0；按十进制换算，避免浮点误差（1.13万 = 11300）"""
+    text = str(text).strip()
+    multiplier = 1
+    if text.endswith("万"):
+        text, multiplier = text[:-1], 10000
+    elif text.endswith("亿"):
+        text, multiplier = text[:-1], 100000000
+    try:
+        return int(Decimal(text) * multiplier)
+    except (InvalidOperation, ValueError, OverflowError):
+        return 0
+
+def _has_class(name):
+    """XPath：class属性包含指定类名"""
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+# 预编译选择器：帖子行（新版div.articleh normal_post / 旧版tr.listitem）
+_XP_ARTICLEH = etree.XPath('//div[normalize-space(@class)="articleh normal_post"]')
+_XP_LISTITEM = etree.XPath(f'//tr[{_has_class("listitem")}]')
+
+# 预编译选择器：行内字段（新版span.lN aN优先，旧版div.xxx兜底）
+_XP_FIELDS = {
+    field: (
+        etree.XPath(f'(.//span[normalize-space(@class)="{span_class}"])[1]'),
+        etree.XPath(f'(.//div[{_has_class(div_class)}])[1]'),
+    )
+    for field, span_class, div_class in (
+        ("read", "l1 a1", "read"),
+        ("reply", "l2 a2", "reply"),
+        ("title", "l3 a3", "title"),
+        ("author", "l4 a4", "author"),
+        ("update", "l5 a5", "update"),
+    )
+}
+_XP_FIRST_A = etree.XPath("(.//a)[1]")
+
+# 列表页内嵌的帖子数据：<script>var article_list={"re":[{...}, ...], ...};</script>
+_EMBEDDED_MARKER = "var article_list"
+_JSON_DECODER = json.JSONDecoder()
+
+def _absolute_url(url):
+    if url and url.startswith("//"):
+        # 协议相对链接（如作者主页 //i.eastmoney.com/...）
+        return "https:" + url
+    if url and not url.startswith("http"):
+        return GUBA_HOST + url
+    return url
+
+def infer_publish_time(publish_time_str, now):
+    """
+    补全列表页发表时间为"YYYY-MM-DD HH:MM:SS"，无法识别时返回None
+    列表页时间为"MM-DD HH:MM"（不含年份）：先按参考时间的年份补全，晚于参考时间说明是上一年的帖子（跨年爬取）
+    :param publish_time_str: 列表页时间文本（"MM-DD HH:MM"，或已含年份的"YYYY-MM-DD HH:MM[:SS]"）
+    :param now: 参考时间（页面抓取时间）
+    """
+    text = publish_time_str.strip() if publish_time_str else ""
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
+        try:
+            return datetime.datetime.strptime(text, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            pass
+    try:
+        # 以闰年解析，02-29才能通过校验（strptime缺省年份1900不是闰年）
+        month_day = datetime.datetime.strptime(f"2000-{text}", "%Y-%m-%d %H:%M")
+    except ValueError:
+        return None
+    for year in (now.year, now.year - 1):
+        try:
+            candidate = month_day.replace(year=year)
+        except ValueError:
+            # 02-29只存在于闰年
+            continue
+        if candidate <= now + _FUTURE_TOLERANCE:
+            return candidate.strftime("%Y-%m-%d %H:%M:%S")
+    return None
+
+def _build_post(stock_code, read_count, comment_count, title_a_attrs, title_a_text,
+                author_a_attrs, author_a_text, publish_time_str, now):
+    """按原parse_worker规则由各字段原始值组装Post（两种解析实现共用）"""
+    if title_a_attrs is not None:
+        post_title = title_a_attrs.get("title", "").strip()
+        if not post_title:
+            post_title = title_a_text.strip()
+        post_url = _absolute_url(title_a_attrs.get("href", ""))
+    else:
+        post_title = "无标题"
+        post_url = ""
+
+    if author_a_attrs is not None:
+        author_id = author_a_attrs.get("data-popper", "")
+        author_name = author_a_text.strip()
+        author_url = _absolute_url(author_a_attrs.get("href", ""))
+    else:
+        author_id, author_name, author_url = "", "匿名", ""
+
+    publish_time = infer_publish_time(publish_time_str, now)
+    return Post(
+        stock_code,
+        post_title,
+        author_name,
+        author_id,
+        author_url,
+        publish_time,
+        parse_count(read_count),
+        parse_count(comment_count),
+        LIKE_COUNT_PLACEHOLDER,
+        post_url,
+        extract_post_id(post_url, stock_code, post_title, publish_time or "")
+    )
+
+def _find_field(item, field):
+    span_xpath, div_xpath = _XP_FIELDS[field]
+    found = span_xpath(item) or div_xpath(item)
+    return found[0] if found else None
+
+def parse_list_page(html, stock_code, now=None):
+    """
+    解析股吧列表页（lxml + 预编译XPath实现）
+    :param html: 列表页HTML文本
+    :param stock_code: 股票代码
+    :param now: 推断发表时间年份用的参考时间，默认当前时间
+    :return: Post列表
+    """
+    if now is None:
+        now = datetime.datetime.now()
+    try:
+        root = lxml.html.fromstring(html)
+    except (etree.ParserError, ValueError) as e:
+        logger.error(f"HTML解析失败：{stock_code}，错误：{e}")
+        return []
+
+    post_items = _XP_ARTICLEH(root) or _XP_LISTITEM(root)
+    post_list = []
+    for item in post_items:
+        try:
+            read_elem = _find_field(item, "read")
+            comment_elem = _find_field(item, "reply")
+            title_elem = _find_field(item, "title")
+            author_elem = _find_field(item, "author")
+            time_elem = _find_field(item, "update")
+
+            title_a = _XP_FIRST_A(title_elem) if title_elem is not None else None
+            title_a = title_a[0] if title_a else None
+            author_a = _XP_FIRST_A(author_elem) if author_elem is not None else None
+            author_a = author_a[0] if author_a else None
+
+            post_list.append(_build_post(
+                stock_code,
+                read_elem.text_content().strip() if read_elem is not None else "0",
+                comment_elem.text_content().strip() if comment_elem is not None else "0",
+                title_a.attrib if title_a is not None else None,
+                title_a.text_content() if title_a is not None else "",
+                author_a.attrib if author_a is not None else None,
+                author_a.text_content() if author_a is not None else "",
+                time_elem.text_content().strip() if time_elem is not None else "",
+                now
+            ))
+        except Exception as e:
+            logger.error(f"解析单条帖子失败：{e}")
+            continue
+    return post_list
+
+def parse_list_page_bs4(html, stock_code, now=None):
+    """
+    解析股吧列表页（BeautifulSoup参考实现，与parse_list_page输出一致，用于比对与回退）
+    :param html: 列表页HTML文本
+    :param stock_code: 股票代码
+    :param now: 推断发表时间年份用的参考时间，默认当前时间
+    :return: Post列表
+    """
+    from bs4 import BeautifulSoup
+
+    if now is None:
+        now = datetime.datetime.now()
+    soup = BeautifulSoup(html, "lxml")
+
+    # 定位帖子列表
+    post_items = soup.find_all("div", class_="articleh normal_post")
+    if not post_items:
+        post_items = soup.find_all("tr", class_="listitem")
+
+    post_list = []
+    for item in post_items:
+        try:
+            read_elem = item.find("span", class_="l1 a1") or item.find("div", class_="read")
+            comment_elem = item.find("span", class_="l2 a2") or item.find("div", class_="reply")
+            title_elem = item.find("span", class_="l3 a3") or item.find("div", class_="title")
+            author_elem = item.find("span", class_="l4 a4") or item.find("div", class_="author")
+            time_elem = item.find("span", class_="l5 a5") or item.find("div", class_="update")
+
+            title_a = title_elem.find("a") if title_elem else None
+            author_a = author_elem.find("a") if author_elem else None
+
+            post_list.append(_build_post(
+                stock_code,
+                read_elem.get_text().strip() if read_elem else "0",
+                comment_elem.get_text().strip() if comment_elem else "0",
+                title_a.attrs if title_a else None,
+                title_a.get_text() if title_a else "",
+                author_a.attrs if author_a else None,
+                author_a.get_text() if author_a else "",
+                time_elem.get_text().strip() if time_elem else "",
+                now
+            ))
+        except Exception as e:
+            logger.error(f"解析单条帖子失败：{e}")
+            continue
+    return post_list
+
+def find_embedded_posts(html):
+    """
+    定位并解码列表页内嵌的帖子数据（字符串查找+JSON raw_decode，不构建DOM）
+    :param html: 列表页HTML文本
+    :return: 帖子字典列表；页面没有内嵌数据或无法解码时返回None
+    """
+    pos = html.find(_EMBEDDED_MARKER)
+    if pos < 0:
+        return None
+    pos += len(_EMBEDDED_MARKER)
+    start = html.find("{", pos)
+    # 只接受 "var article_list = {" 形式，避免误匹配其它脚本中的同名片段
+    if start < 0 or html[pos:start].strip() != "=":
+        return None
+    try:
+        data, _ = _JSON_DECODER.raw_decode(html, start)
+    except ValueError:
+        return None
+    posts = data.get("re") if isinstance(data, dict) else None
+    return posts if isinstance(posts, list) else None
+
+def _json_count(value):
+    """内嵌数据中的计数（通常为整数，个别字段为字符串）"""
+    if isinstance(value, int):
+        return value
+    return parse_count(value) if value not in (None, "") else 0
+
+def _json_publish_time(value, now):
+    """内嵌数据的发表时间（"YYYY-MM-DD HH:MM:SS"，fromisoformat比strptime快得多），其它格式按列表页规则补全"""
+    text = str(value or "").strip()
+    try:
+        return datetime.datetime.fromisoformat(text).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return infer_publish_time(text, now)
+
+def _build_post_from_json(stock_code, item, now):
+    """由内嵌数据的单条帖子组装Post（计数为精确值，发表时间含年份与秒）"""
+    post_id = str(item.get("post_id") or "").strip()
+    if not post_id:
+        raise ValueError("缺少post_id")
+    post_url = _absolute_url(f"/news,{item.get('stockbar_code') or stock_code},{post_id}.html")
+    post_title = str(item.get("post_title") or "").strip() or "无标题"
+
+    author_id = str(item.get("user_id") or "").strip()
+    if author_id:
+        author_name = str(item.get("user_nickname") or "").strip()
+        author_url = _absolute_url(f"//i.eastmoney.com/{author_id}")
+    else:
+        author_name, author_url = "匿名", ""
+
+    like_count = item.get("post_like_count")
+    return Post(
+        stock_code,
+        post_title,
+        author_name,
+        author_id,
+        author_url,
+        _json_publish_time(item.get("post_publish_time"), now),
+        _json_count(item.get("post_click_count")),
+        _json_count(item.get("post_comment_count")),
+        LIKE_COUNT_PLACEHOLDER if like_count in (None, "") else _json_count(like_count),
+        post_url,
+        post_id
+    )
+
+def parse_embedded_json(html, stock_code, now=None):
+    """
+    解析列表页内嵌的帖子数据
+    :param html: 列表页HTML文本
+    :param stock_code: 股票代码
+    :param now: 推断发表时间年份用的参考时间（内嵌数据已含年份时不使用），默认当前时间
+    :return: Post列表；页面没有内嵌数据、或数据格式已变化（全部帖子都无法解析）时返回None
+    """
+    items = find_embedded_posts(html)
+    if items is None:
+        return None
+    if now is None:
+        now = datetime.datetime.now()
+    post_list = []
+    for item in items:
+        try:
+            post_list.append(_build_post_from_json(stock_code, item, now))
+        except Exception as e:
+            logger.error(f"解析单条内嵌帖子失败：{e}")
+            continue
+    if items and not post_list:
+        logger.warning(f"内嵌帖子数据无法解析，回退到HTML解析：{stock_code}")
+        return None
+    return post_list
+
+PARSERS = {
+    "lxml": parse_list_page,
+    "bs4": parse_list_page_bs4,
+}
+
+def get_parser(name="lxml"):
+    """按名称获取列表页解析函数"""
+    if name not in PARSERS:
+        raise ValueError(f"不支持的解析器：{name}")
+    return PARSERS[name]
+
+def parse_list_page_with_path(html, stock_code, now=None, parser_name="lxml", embedded=True):
+    """
+    解析列表页：优先解码内嵌的帖子数据，页面没有内嵌数据时回退到HTML选择器
+    :param parser_name: 回退时使用的HTML解析器
+    :param embedded: 是否尝试内嵌数据
+    :return: (Post列表, 解析路径 json / html)
+    """
+    if embedded:
+        post_list = parse_embedded_json(html, stock_code, now)
+        if post_list is not None:
+            return post_list, "json"
+    return get_parser(parser_name)(html, stock_code, now), "html"
+
+def parse_rows(parser_name, html, stock_code, now=None, embedded=True):
+    """
+    进程池解析入口（模块级函数，可被pickle）
+    :return: (普通元组列表, 解析路径)；元组跨进程传输比namedtuple更紧凑，字段顺序同POST_COLUMNS
+    """
+    post_list, path = parse_list_page_with_path(html, stock_code, now, parser_name, embedded)
+    return [tuple(post) for post in post_list], path
\ No newline at end of file
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import time
+import datetime
+from common.Logger import getLogger
+from stockpost.postWriter import POST_COLUMNS
+from stockpost.postParser import parse_count
+from stockpost.postMigrate import post_table_is_typed
+from stockpost.stockSource import TableStockSource
+
+# 初始化日志
+logger = getLogger(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "post_rollup.log"))
+
+POST_TABLE = "guba_stock_post"
+HOURLY_TABLE = "guba_stock_post_hourly"
+DAILY_TABLE = "guba_stock_post_daily"
+
+# 汇总表结构（表名与时间粒度为参数）：按(股票代码, 时间段)主键范围查询，跨股票排行按时间段索引
+CREATE_ROLLUP_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    stock_code VARCHAR(20) NOT NULL COMMENT '股票代码',
+    bucket {bucket_type} NOT NULL COMMENT '{bucket_comment}',
+    post_count INT NOT NULL DEFAULT 0 COMMENT '帖子数',
+    read_sum BIGINT NOT NULL DEFAULT 0 COMMENT '阅读数之和',
+    comment_sum BIGINT NOT NULL DEFAULT 0 COMMENT '评论数之和',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (stock_code, bucket),
+    INDEX idx_bucket (bucket)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='{table_comment}';
+"""
+
+# 增量累加：新帖子计入帖子数，已入库帖子只累加阅读数/评论数的变化量
+UPSERT_ROLLUP_SQL = (
+    "INSERT INTO {table} (stock_code, bucket, post_count, read_sum, comment_sum) VALUES (%s, %s, %s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE post_count = post_count + VALUES(post_count), "
+    "read_sum = read_sum + VALUES(read_sum), comment_sum = comment_sum + VALUES(comment_sum)"
+)
+
+_IDX_STOCK_CODE = POST_COLUMNS.index("stock_code")
+_IDX_PUBLISH_TIME = POST_COLUMNS.index("publish_time")
+_IDX_READ = POST_COLUMNS.index("read_count")
+_IDX_COMMENT = POST_COLUMNS.index("comment_count")
+_IDX_POST_ID = POST_COLUMNS.index("post_id")
+
+def _hour_bucket(publish_time):
+    """发表时间取整到小时（"YYYY-MM-DD HH:00:00"）；发表时间未知时返回None"""
+    if not publish_time:
+        return None
+    if isinstance(publish_time, datetime.datetime):
+        return publish_time.strftime("%Y-%m-%d %H:00:00")
+    return str(publish_time)[:13] + ":00:00"
+
+class PostRollup:
+    """
+    帖子按股票按小时/按天汇总（帖子数、阅读数之和、评论数之和），在写入原始数据的同一事务内增量更新：
+    写入前锁定批次内已入库的帖子并读取旧计数，写入后把 新帖子+1 与 计数变化量 累加到对应时间段
+    汇总按发表时间分段，发表时间未知（NULL）的帖子不计入
+    """
+    def __init__(self, mysql_client, lock_chunk=1000):
+        """
+        :param mysql_client: MysqlDB实例
+        :param lock_chunk: 锁定已入库帖子时每条语句的post_id数
+        """
+        self.mysql_client = mysql_client
+        self.lock_chunk = max(1, int(lock_chunk))
+        self.stats = {"upserts": 0, "backfilled_stocks": 0}
+
+    def ensure_tables(self):
+        """创建汇总表，成功返回True"""
+        for table, bucket_type, bucket_comment, table_comment in (
+            (HOURLY_TABLE, "DATETIME", "小时（发表时间取整到小时）", "股吧帖子按股票按小时汇总"),
+            (DAILY_TABLE, "DATE", "日期（发表日期）", "股吧帖子按股票按天汇总"),
+        ):
+            sql = CREATE_ROLLUP_TABLE_SQL.format(table=table, bucket_type=bucket_type,
+                                                 bucket_comment=bucket_comment, table_comment=table_comment)
+            if self.mysql_client.execute_sql(sql) is False:
+                return False
+        return True
+
+    def lock_existing(self, cursor, post_ids):
+        """
+        在当前事务内锁定已入库的帖子（SELECT ... FOR UPDATE），返回其股票代码、发表时间与当前计数
+        :return: {post_id: (stock_code, publish_time, read_count, comment_count)}
+        """
+        existing = {}
+        post_ids = sorted(set(post_ids))
+        for i in range(0, len(post_ids), self.lock_chunk):
+            chunk = post_ids[i:i + self.lock_chunk]
+            cursor.execute(
+                f"SELECT post_id, stock_code, publish_time, read_count, comment_count FROM {POST_TABLE} "
+                f"WHERE post_id IN ({', '.join(['%s'] * len(chunk))}) FOR UPDATE",
+                chunk
+            )
+            for row in cursor.fetchall():
+                # 计数按整数比较（表结构无法确认时，旧表的字符串计数也能正确换算）
+                existing[row["post_id"]] = (row["stock_code"], row["publish_time"],
+                                            parse_count(row["read_count"]), parse_count(row["comment_count"]))
+        return existing
+
+    def apply_posts(self, cursor, rows, existing, refresh=True):
+        """
+        按写入的帖子累加汇总（与原始数据在同一事务内调用）
+        :param rows: 帖子数据元组列表（按POST_COLUMNS顺序，批次内可有重复帖子，按顺序处理）
+        :param existing: lock_existing的返回值（处理过程中会更新为写入后的计数）
+        :param refresh: 已入库帖子的计数是否被刷新（INSERT ... ON DUPLICATE KEY UPDATE为True；LOAD DATA IGNORE为False）
+        """
+        deltas = {}
+        for row in rows:
+            post_id = row[_IDX_POST_ID]
+            read_count, comment_count = row[_IDX_READ] or 0, row[_IDX_COMMENT] or 0
+            old = existing.get(post_id)
+            if old is None:
+                existing[post_id] = (row[_IDX_STOCK_CODE], row[_IDX_PUBLISH_TIME], read_count, comment_count)
+                self._add(deltas, row[_IDX_STOCK_CODE], row[_IDX_PUBLISH_TIME], 1, read_count, comment_count)
+            elif refresh:
+                stock_code, publish_time, old_read, old_comment = old
+                # 评论数与INSERT_POST_SQL一致取较大值
+                comment_count = max(old_comment, comment_count)
+                existing[post_id] = (stock_code, publish_time, read_count, comment_count)
+                self._add(deltas, stock_code, publish_time, 0, read_count - old_read, comment_count - old_comment)
+        self._upsert(cursor, deltas)
+
+    def apply_comment_updates(self, cursor, updates, existing):
+        """
+        按详情页回填的评论数累加汇总（与回填语句在同一事务内调用）
+        :param updates: [(点赞数, 评论数或None, post_id)]，评论数为None时保留原值
+        :param existing: lock_existing的返回值
+        """
+        deltas = {}
+        for _, comment_count, post_id in updates:
+            old = existing.get(post_id)
+            if old is None or comment_count is None:
+                continue
+            stock_code, publish_time, read_count, old_comment = old
+            existing[post_id] = (stock_code, publish_time, read_count, comment_count)
+            self._add(deltas, stock_code, publish_time, 0, 0, comment_count - old_comment)
+        self._upsert(cursor, deltas)
+
+    @staticmethod
+    def _add(deltas, stock_code, publish_time, posts, reads, comments):
+        hour = _hour_bucket(publish_time)
+        if hour is None:
+            return
+        for key in ((HOURLY_TABLE, stock_code, hour), (DAILY_TABLE, stock_code, hour[:10])):
+            delta = deltas.setdefault(key, [0, 0, 0])
+            delta[0] += posts
+            delta[1] += reads
+            delta[2] += comments
+
+    def _upsert(self, cursor, deltas):
+        # 按主键顺序累加，并发写入时加锁顺序一致
+        for table in (HOURLY_TABLE, DAILY_TABLE):
+            params = [(stock_code, bucket, *delta) for (t, stock_code, bucket), delta in sorted(deltas.items())
+                      if t == table and any(delta)]
+            if params:
+                cursor.executemany(UPSERT_ROLLUP_SQL.format(table=table), params)
+                self.stats["upserts"] += len(params)
+
+    def backfill(self, pause=0.05):
+        """
+        由原始数据重建汇总（用于已有数据或修复）：每只股票一个事务，
+        先以共享锁读取该股票按小时的聚合（与写入线程相同的加锁顺序：先原始表后汇总表），再替换该股票的汇总行
+        可在爬虫运行时执行，重建期间该股票的写入会等待事务结束
+        :param pause: 每只股票之间的停顿（秒），降低对线上写入的影响
+        :return: 重建的股票数
+        """
+        start = time.monotonic()
+        stocks = 0
+        for stock_code in TableStockSource(self.mysql_client, POST_TABLE, "stock_code"):
+            with self.mysql_client.transaction() as cursor:
+                cursor.execute(
+                    "SELECT DATE_FORMAT(publish_time, '%%Y-%%m-%%d %%H:00:00') AS bucket, COUNT(*) AS post_count, "
+                    "SUM(read_count) AS read_sum, SUM(comment_count) AS comment_sum "
+                    f"FROM {POST_TABLE} WHERE stock_code = %s AND publish_time IS NOT NULL "
+                    "GROUP BY bucket LOCK IN SHARE MODE",
+                    (stock_code,)
+                )
+                hourly = [(stock_code, row["bucket"], int(row["post_count"]), int(row["read_sum"] or 0),
+                           int(row["comment_sum"] or 0)) for row in cursor.fetchall()]
+                daily = {}
+                for _, bucket, post_count, read_sum, comment_sum in hourly:
+                    total = daily.setdefault(str(bucket)[:10], [0, 0, 0])
+                    total[0] += post_count
+                    total[1] += read_sum
+                    total[2] += comment_sum
+                for table, params in ((HOURLY_TABLE, hourly),
+                                      (DAILY_TABLE, [(stock_code, day, *total) for day, total in sorted(daily.items())])):
+                    cursor.execute(f"DELETE FROM {table} WHERE stock_code = %s", (stock_code,))
+                    if params:
+                        cursor.executemany(UPSERT_ROLLUP_SQL.format(table=table), params)
+            stocks += 1
+            self.stats["backfilled_stocks"] = stocks
+            if stocks % 100 == 0:
+                logger.info(f"汇总重建进度：{stocks} 只股票，{time.monotonic() - start:.1f} 秒")
+            if pause:
+                time.sleep(pause)
+        logger.info(f"汇总重建完成：{stocks} 只股票，耗时 {time.monotonic() - start:.1f} 秒")
+        return stocks
+
+    def query(self, start, end, stock_code=None, granularity="hour"):
+        """
+        读取汇总（看板查询，按主键/时间段索引范围扫描）
+        :param start: 起始时间段（含）
+        :param end: 结束时间段（不含）
+        :param stock_code: 股票代码（None表示全部股票）
+        :param granularity: hour / day
+        :return: [{stock_code, bucket, post_count, read_sum, comment_sum}]
+        """
+        if granularity not in ("hour", "day"):
+            raise ValueError(f"不支持的汇总粒度：{granularity}")
+        sql = (f"SELECT stock_code, bucket, post_count, read_sum, comment_sum "
+               f"FROM {HOURLY_TABLE if granularity == 'hour' else DAILY_TABLE} WHERE bucket >= %s AND bucket < %s")
+        params = [start, end]
+        if stock_code:
+            sql += " AND stock_code = %s"
+            params.append(stock_code)
+        return self.mysql_client.execute_sql(sql + " ORDER BY stock_code, bucket", params) or []
+
+# 全局汇总实例
+post_rollup = None
+
+def init_post_rollup(config, mysql_client):
+    """
+    初始化帖子汇总（[ROLLUP] ENABLE关闭、数据库未连接、帖子表仍为旧结构或建表失败时返回None，写入不维护汇总）
+    旧表的计数与发表时间为字符串，无法按时间段累加，需先运行 --migrate-schema
+    """
+    global post_rollup
+    post_rollup = None
+    if not mysql_client or not config.getboolean("ROLLUP", "ENABLE", fallback=True):
+        return post_rollup
+    if post_table_is_typed(mysql_client) is False:
+        logger.warning("guba_stock_post仍为旧表结构（计数与发表时间为字符串），本次运行不维护汇总，请先运行 --migrate-schema")
+        return post_rollup
+    rollup = PostRollup(mysql_client, lock_chunk=config.getint("ROLLUP", "LOCK_CHUNK", fallback=1000))
+    if not rollup.ensure_tables():
+        logger.error("创建汇总表失败，本次运行不维护汇总")
+        return post_rollup
+    post_rollup = rollup
+    return post_rollup
+
+def get_post_rollup():
+    """获取全局汇总实例"""
+    return post_rollup
\ No newline at end of file
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import time
+import queue
+import tempfile
+import threading
+from common.Logger import getLogger
+from common.Metrics import get_metrics
+
+# 初始化日志
+logger = getLogger(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "post_writer.log"))
+
+# guba_stock_post写入列（解析结果元组按此顺序组织）
+POST_COLUMNS = (
+    "stock_code", "post_title", "author_name", "author_id", "author_url",
+    "publish_time", "read_count", "comment_count", "like_count", "post_url", "post_id"
+)
+
+# 按唯一键uk_post_id幂等写入：重复帖子只刷新阅读数和评论数
+# 评论数取较大值，列表页重爬不会覆盖详情页回填的（更准确的）评论数；+0按数值比较，兼容未迁移的字符串计数列
+INSERT_POST_SQL = (
+    f"INSERT INTO guba_stock_post ({', '.join(POST_COLUMNS)}) "
+    f"VALUES ({', '.join(['%s'] * len(POST_COLUMNS))}) "
+    "ON DUPLICATE KEY UPDATE read_count = VALUES(read_count), "
+    "comment_count = GREATEST(comment_count + 0, VALUES(comment_count) + 0)"
+)
+
+_STOP = object()
+
+def _tsv_escape(value):
+    """按LOAD DATA默认转义规则转义单个字段"""
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+class PostWriter:
+    """批量写入线程：汇总所有解析线程的数据，按行数/时间阈值合并为大事务写入"""
+    def __init__(self, mysql_client, task_manager=None, batch_rows=2000, flush_interval=2.0, write_mode="insert",
+                 seen_filter=None, queue_size=0, rollup=None):
+        """
+        :param mysql_client: MysqlDB实例（为None时有数据的页面按写入失败处理，不标记断点）
+        :param task_manager: 任务管理实例，页面数据提交成功后才标记为已爬取
+        :param batch_rows: 累计行数达到该值时写入
+        :param flush_interval: 距批次首条数据超过该时间（秒）时写入
+        :param write_mode: insert：多行INSERT；load_data：LOAD DATA LOCAL INFILE（适合回补大批量数据）
+        :param seen_filter: 已入库帖子过滤器，数据提交成功后更新
+        :param queue_size: 待写入页面队列上限（0表示不限）；写库跟不上时提交方阻塞（背压）
+        :param rollup: 帖子汇总（PostRollup），与原始数据在同一事务内增量更新；为None时不维护汇总
+        """
+        if write_mode not in ("insert", "load_data"):
+            raise ValueError(f"不支持的写入模式：{write_mode}")
+        self.mysql_client = mysql_client
+        self.task_manager = task_manager
+        self.batch_rows = max(1, int(batch_rows))
+        self.flush_interval = flush_interval
+        self.write_mode = write_mode
+        self.seen_filter = seen_filter
+        self.rollup = rollup
+        self.queue = queue.Queue(queue_size)
+        self._thread = None
+        self.total_rows = 0
+        self.total_pages = 0
+        self.total_flushes = 0
+
+    def start(self):
+        """启动写入线程"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="PostWriterThread", daemon=True)
+            self._thread.start()
+            logger.info(f"批量写入线程启动，写入模式：{self.write_mode}，批量行数：{self.batch_rows}，刷新间隔：{self.flush_interval}s")
+
+    def submit(self, stock_code, page, rows, on_commit=None, on_failure=None):
+        """
+        提交一个页面的解析结果
+        :param stock_code: 股票代码
+        :param page: 页码
+        :param rows: 帖子数据元组列表（按POST_COLUMNS顺序），可为空列表
+        :param on_commit: 该页数据提交成功后调用的无参回调（可为None）
+        :param on_failure: 该页所在批次写入失败（数据丢弃）时调用的无参回调（可为None）
+        """
+        self.queue.put((stock_code, page, rows, on_commit, on_failure))
+
+    def stop(self):
+        """写入剩余数据并停止写入线程"""
+        if self._thread is not None:
+            self.queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+            logger.info(f"批量写入线程退出，共写入 {self.total_pages} 页、{self.total_rows} 条数据，{self.total_flushes} 次提交")
+
+    def _run(self):
+        pages, rows, callbacks, failures = [], [], [], []
+        batch_start = None
+        while True:
+            # 无待写数据时阻塞等待；有数据时最多等到批次超时
+            timeout = None if not pages else max(0.0, self.flush_interval - (time.monotonic() - batch_start))
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(pages, rows, callbacks, failures)
+                break
+            if item is not None:
+                stock_code, page, page_rows, on_commit, on_failure = item
+                if not pages:
+                    batch_start = time.monotonic()
+                pages.append((stock_code, page))
+                rows.extend(page_rows)
+                if on_commit is not None:
+                    callbacks.append(on_commit)
+                if on_failure is not None:
+                    failures.append(on_failure)
+
+            if pages and (len(rows) >= self.batch_rows or time.monotonic() - batch_start >= self.flush_interval):
+                self._flush(pages, rows, callbacks, failures)
+                pages, rows, callbacks, failures = [], [], [], []
+
+    def _flush(self, pages, rows, callbacks=(), failures=()):
+        """写入一个批次，成功后再标记批次内页面为已爬取；失败时调用批次内页面的失败回调"""
+        if not pages:
+            return
+        start = time.monotonic()
+        if rows:
+            # 写入失败（含数据库未连接）的页面不标记断点、不执行提交回调，下次运行会重新爬取
+            try:
+                if not self.mysql_client:
+                    raise RuntimeError("数据库未连接")
+                if self.write_mode == "load_data":
+                    self._load_data(rows)
+                else:
+                    self._insert(rows)
+            except Exception as e:
+                get_metrics().inc("db_flush_failures")
+                logger.error(f"批量写入失败，丢弃 {len(pages)} 页、{len(rows)} 条数据，错误：{e}")
+                for on_failure in failures:
+                    try:
+                        on_failure()
+                    except Exception as e:
+                        logger.error(f"写入失败回调执行失败：{e}")
+                return
+            if self.seen_filter is not None:
+                self.seen_filter.update(rows)
+
+        if self.task_manager:
+            for stock_code, page in pages:
+                self.task_manager.mark_crawled(stock_code, page)
+        for on_commit in callbacks:
+            try:
+                on_commit()
+            except Exception as e:
+                logger.error(f"写入提交回调执行失败：{e}")
+        self.total_pages += len(pages)
+        self.total_rows += len(rows)
+        self.total_flushes += 1
+        elapsed = time.monotonic() - start
+        get_metrics().observe("db_flush_seconds", elapsed)
+        get_metrics().observe_count("db_flush_rows", len(rows))
+        logger.info(f"批量写入完成：{len(pages)} 页、{len(rows)} 条数据，耗时 {elapsed:.3f}s")
+
+    def _lock_existing(self, cursor, rows):
+        """维护汇总时：写入前锁定批次内已入库的帖子并读取旧计数"""
+        if self.rollup is None:
+            return None
+        idx_post_id = POST_COLUMNS.index("post_id")
+        return self.rollup.lock_existing(cursor, [row[idx_post_id] for row in rows])
+
+    def _insert(self, rows):
+        """单事务多行INSERT（pymysql的executemany会把INSERT ... VALUES改写为多行语句），汇总在同一事务内更新"""
+        with self.mysql_client.transaction() as cursor:
+            existing = self._lock_existing(cursor, rows)
+            cursor.executemany(INSERT_POST_SQL, rows)
+            if self.rollup is not None:
+                self.rollup.apply_posts(cursor, rows, existing, refresh=True)
+
+    def _load_data(self, rows):
+        """写入临时TSV文件后用LOAD DATA LOCAL INFILE导入（需开启[MYSQL] LOCAL_INFILE），重复帖子忽略"""
+        fd, tmp_file = tempfile.mkstemp(prefix="guba_post_", suffix=".tsv")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="\n") as f:
+                for row in rows:
+                    f.write("\t".join(_tsv_escape(v) for v in row) + "\n")
+            load_sql = (
+                "LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE guba_stock_post CHARACTER SET utf8mb4 "
+                "FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+                f"({', '.join(POST_COLUMNS)})"
+            )
+            with self.mysql_client.transaction() as cursor:
+                existing = self._lock_existing(cursor, rows)
+                cursor.execute(load_sql, (tmp_file,))
+                if self.rollup is not None:
+                    # IGNORE：重复帖子不刷新计数，只有新帖子计入汇总
+                    self.rollup.apply_posts(cursor, rows, existing, refresh=False)
+        finally:
+            os.remove(tmp_file)
+
+# 全局写入实例
+post_writer = None
+
+def init_post_writer(config, mysql_client, task_manager, seen_filter=None, rollup=None):
+    """初始化批量写入实例"""
+    global post_writer
+    post_writer = PostWriter(
+        mysql_client,
+        task_manager,
+        batch_rows=config.getint("WRITER", "BATCH_ROWS", fallback=2000),
+        flush_interval=config.getfloat("WRITER", "FLUSH_INTERVAL", fallback=2.0),
+        write_mode=config.get("WRITER", "WRITE_MODE", fallback="insert"),
+        seen_filter=seen_filter,
+        queue_size=config.getint("WRITER", "QUEUE_SIZE", fallback=0),
+        rollup=rollup
+    )
+    return post_writer
+
+def get_post_writer():
+    """获取全局批量写入实例"""
+    return post_writer
\ No newline at end of file
@@ -1,38 +1,212 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import requests
 import os
+import time
+import itertools
+import threading
 from common.Logger import getLogger
+from stockpost.httpClient import create_session
 
 # 初始化日志
 logger = getLogger(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "proxy_manage.log"))
 
+class ProxyEntry:
+    """单个代理的健康统计（成功率与延迟的指数滑动平均）"""
+    def __init__(self, address, alpha=0.3):
+        self.address = address
+        self.proxy = {"http": f"http://{address}", "https": f"https://{address}"}
+        self.alpha = alpha
+        self.success_rate = 1.0
+        self.latency = 0.0
+        self.requests = 0
+        self.consecutive_fail = 0
+
+    def record(self, ok, latency):
+        self.requests += 1
+        self.success_rate += self.alpha * ((1.0 if ok else 0.0) - self.success_rate)
+        if ok:
+            self.consecutive_fail = 0
+            self.latency = latency if self.requests == 1 else self.latency + self.alpha * (latency - self.latency)
+        else:
+            self.consecutive_fail += 1
+
+    @property
+    def score(self):
+        """健康分：成功率为主，延迟越高得分越低"""
+        return self.success_rate / (1.0 + self.latency)
+
 class ProxyManage:
-    """代理管理类，支持获取代理与验证代理有效性"""
-    def __init__(self, proxy_enable, proxy_pool_url):
+    """代理管理类：后台预取代理到本地池，按成功率与延迟打分，淘汰失败代理"""
+    def __init__(self, proxy_enable, proxy_pool_url, pool_size=10, refresh_interval=5,
+                 max_consecutive_fail=3, min_success_rate=0.3, validate=False):
+        """
+        :param proxy_enable: 是否启用代理
+        :param proxy_pool_url: 代理池接口地址（每次请求返回一个ip:port）
+        :param pool_size: 本地池保持的代理数量
+        :param refresh_interval: 后台补充/淘汰代理的检查间隔（秒）
+        :param max_consecutive_fail: 连续失败多少次后淘汰
+        :param min_success_rate: 成功率低于该值（至少5次请求后）时淘汰
+        :param validate: 加入本地池前是否先验证代理可用
+        """
         self.proxy_enable = proxy_enable
         self.proxy_pool_url = proxy_pool_url
+        self.pool_size = max(1, int(pool_size))
+        self.refresh_interval = refresh_interval
+        self.max_consecutive_fail = max_consecutive_fail
+        self.min_success_rate = min_success_rate
+        self.validate = validate
         self.current_proxy = None
+        self._entries = {}
+        self._lock = threading.Lock()
+        # 对外发放的代理快照（不可变元组，整体替换），读取与轮转都不加锁
+        self._snapshot = ()
+        self._cursor = itertools.count()
+        self._stop_event = threading.Event()
+        self._refresh_event = threading.Event()
+        self._thread = None
+        # 代理池接口与代理验证共用的keep-alive会话
+        self._session = create_session(pool_connections=2, pool_maxsize=1)
+        self.evicted = 0
+        self.requests_ok = 0
+        self.requests_failed = 0
+        # 被淘汰的代理在冷却期内不再加入本地池
+        self._cooldown = {}
+        self.cooldown_seconds = max(60.0, refresh_interval * 10)
 
-    def get_proxy(self):
-        """从代理池获取一个可用代理"""
-        if not self.proxy_enable:
-            return None
+    def start(self):
+        """启动后台预取线程"""
+        if not self.proxy_enable or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._refresh_loop, name="ProxyRefreshThread", daemon=True)
+        self._thread.start()
+        logger.info(f"代理预取线程启动，本地池大小：{self.pool_size}")
 
+    def stop(self):
+        """停止后台预取线程"""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._refresh_event.set()
+            self._thread.join(timeout=5)
+            self._thread = None
+            self._session.close()
+            logger.info(f"代理池统计：{self.stats()}")
+
+    def _fetch_proxy(self):
+        """从代理池接口获取一个代理地址（ip:port）"""
         try:
-            response = requests.get(self.proxy_pool_url, timeout=5)
+            response = self._session.get(self.proxy_pool_url, timeout=5)
             response.raise_for_status()
             proxy = response.text.strip()
             if proxy:
-                self.current_proxy = {"http": f"http://{proxy}", "https": f"https://{proxy}"}
-                logger.info(f"获取到代理：{proxy}")
-                return self.current_proxy
-            else:
-                logger.warning("代理池返回空代理")
-                return None
+                return proxy
+            logger.warning("代理池返回空代理")
         except Exception as e:
             logger.error(f"获取代理失败：{e}")
+        return None
+
+    def _refresh_loop(self):
+        while not self._stop_event.is_set():
+            self._fill_pool()
+            self._refresh_event.wait(self.refresh_interval)
+            self._refresh_event.clear()
+
+    def _fill_pool(self):
+        """补充代理直到达到池大小（连续取到重复/无效代理时提前结束本轮）"""
+        misses = 0
+        while len(self._entries) < self.pool_size and misses < 3 and not self._stop_event.is_set():
+            address = self._fetch_proxy()
+            if not address or address in self._entries or self._cooldown.get(address, 0) > time.monotonic():
+                misses += 1
+                continue
+            entry = ProxyEntry(address)
+            if self.validate and not self.validate_proxy(entry.proxy):
+                misses += 1
+                continue
+            with self._lock:
+                self._entries[address] = entry
+                self._rebuild_snapshot()
+            logger.info(f"代理加入本地池：{address}")
+
+    def _rebuild_snapshot(self):
+        """按健康分生成发放快照：分数越高出现次数越多（调用方持有_lock）"""
+        snapshot = []
+        for entry in sorted(self._entries.values(), key=lambda e: e.score, reverse=True):
+            snapshot.extend([entry.proxy] * (1 + int(entry.score * 3)))
+        self._snapshot = tuple(snapshot)
+
+    def get_proxy(self):
+        """从本地池获取一个可用代理（无锁读取快照）；本地池为空时同步向代理池获取"""
+        if not self.proxy_enable:
+            return None
+
+        snapshot = self._snapshot
+        if snapshot:
+            self.current_proxy = snapshot[next(self._cursor) % len(snapshot)]
+            return self.current_proxy
+
+        # 冷启动：本地池尚未预取到代理
+        self._refresh_event.set()
+        address = self._fetch_proxy()
+        if not address:
             return None
+        logger.info(f"获取到代理：{address}")
+        self.current_proxy = {"http": f"http://{address}", "https": f"https://{address}"}
+        return self.current_proxy
+
+    def has_cached_proxy(self):
+        """本地池是否已有可发放的代理"""
+        return bool(self._snapshot)
+
+    def report_result(self, proxy, ok, latency=0.0):
+        """
+        上报一次使用代理的请求结果
+        :param proxy: get_proxy返回的代理字典
+        :param ok: 请求是否成功
+        :param latency: 请求耗时（秒）
+        """
+        if not proxy:
+            return
+        address = proxy.get("http", "").replace("http://", "", 1)
+        with self._lock:
+            if ok:
+                self.requests_ok += 1
+            else:
+                self.requests_failed += 1
+            entry = self._entries.get(address)
+            if entry is None:
+                return
+            entry.record(ok, latency)
+            if entry.consecutive_fail >= self.max_consecutive_fail or \
+                    (entry.requests >= 5 and entry.success_rate < self.min_success_rate):
+                del self._entries[address]
+                self._cooldown[address] = time.monotonic() + self.cooldown_seconds
+                self.evicted += 1
+                logger.warning(f"淘汰代理：{address}，成功率：{entry.success_rate:.2f}，连续失败：{entry.consecutive_fail}")
+                self._refresh_event.set()
+            if entry.requests % 20 == 0 or address not in self._entries:
+                self._rebuild_snapshot()
+
+    def stats(self):
+        """代理池统计（每个代理的成功率、延迟与健康分）"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "evicted": self.evicted,
+                "proxies": {
+                    e.address: {"success_rate": round(e.success_rate, 3), "latency": round(e.latency, 3),
+                                "requests": e.requests, "score": round(e.score, 3)}
+                    for e in self._entries.values()
+                },
+            }
+
+    def health(self):
+        """代理整体健康指标（本地池大小、累计成功率、淘汰数）"""
+        total = self.requests_ok + self.requests_failed
+        return {
+            "pool_size": len(self._entries),
+            "success_rate": round(self.requests_ok / total, 4) if total else 1.0,
+            "evicted": self.evicted,
+        }
 
     def validate_proxy(self, proxy):
         """验证代理是否有效"""
@@ -41,7 +215,7 @@ class ProxyManage:
 
         try:
             test_url = "https://www.baidu.com"
-            response = requests.get(test_url, proxies=proxy, timeout=5)
+            response = self._session.get(test_url, proxies=proxy, timeout=5)
             return response.status_code == 200
         except Exception as e:
             logger.error(f"代理验证失败：{proxy}，错误：{e}")
@@ -51,12 +225,18 @@ class ProxyManage:
 proxy_manager = None
 
 def init_proxy_manager(config):
-    """初始化代理管理实例"""
+    """初始化代理管理实例（开启代理时同时启动后台预取线程）"""
     global proxy_manager
     proxy_manager = ProxyManage(
         proxy_enable=config.getboolean("PROXY", "PROXY_ENABLE"),
-        proxy_pool_url=config.get("PROXY", "PROXY_POOL_URL")
+        proxy_pool_url=config.get("PROXY", "PROXY_POOL_URL"),
+        pool_size=config.getint("PROXY", "POOL_SIZE", fallback=10),
+        refresh_interval=config.getfloat("PROXY", "REFRESH_INTERVAL", fallback=5),
+        max_consecutive_fail=config.getint("PROXY", "MAX_CONSECUTIVE_FAIL", fallback=3),
+        min_success_rate=config.getfloat("PROXY", "MIN_SUCCESS_RATE", fallback=0.3),
+        validate=config.getboolean("PROXY", "VALIDATE", fallback=False)
     )
+    proxy_manager.start()
     return proxy_manager
 
 def get_proxy_manager():
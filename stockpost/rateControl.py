@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import time
+import heapq
+import random
+import itertools
+import threading
+from urllib.parse import urlsplit
+from common.Logger import getLogger
+
+# 初始化日志
+logger = getLogger(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "rate_control.log"))
+
+# 视为限流/封禁的响应状态码（速率与并发减半，并暂停该主机/代理）
+THROTTLE_STATUS = (403, 429, 503)
+
+def classify_status(status):
+    """
+    按响应状态码归类请求结果
+    :param status: HTTP状态码；连接错误、超时等无响应时为None或"error"
+    :return: "ok" / "throttle" / "error"
+    """
+    if not isinstance(status, int):
+        return "error"
+    if status in THROTTLE_STATUS:
+        return "throttle"
+    if status >= 500:
+        return "error"
+    return "ok"
+
+def retry_after_seconds(headers):
+    """解析Retry-After响应头（只支持秒数），无法解析时返回None"""
+    if not headers:
+        return None
+    value = headers.get("Retry-After")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+class AimdLimiter:
+    """
+    单个主机或代理的AIMD限速状态：请求间隔由速率决定，在途请求数不超过并发上限
+    - 成功且延迟正常：速率每秒增加increase（请求/秒），并发上限每轮增加1（只在限速生效、请求确实等待过时增加）；
+      首次减小之前为慢启动阶段，速率每秒增长约10%，尽快逼近站点可承受的速率
+    - 限流（403/429/503）：速率与并发上限乘以decrease，并暂停Retry-After（或cooldown）秒
+    - 错误率（超时/5xx，滑动平均）超过error_threshold，或延迟超过基线latency_factor倍：速率与并发上限乘以error_decrease，
+      偶发错误不降速
+    同一轮在途请求的连续失败只减小一次（两次减小至少间隔hold秒），避免速率被一次拥塞压到最低
+    """
+    def __init__(self, name, rate, min_rate, max_rate, concurrency, min_concurrency, max_concurrency,
+                 increase=0.2, decrease=0.5, error_decrease=0.8, error_threshold=0.1, latency_factor=2.0,
+                 cooldown=10.0):
+        self.name = name
+        self.min_rate = min_rate
+        self.max_rate = max(min_rate, max_rate)
+        self.rate = min(max(min_rate, rate), self.max_rate)
+        self.min_concurrency = max(1, int(min_concurrency))
+        self.max_concurrency = max(self.min_concurrency, int(max_concurrency))
+        self.limit = float(min(max(self.min_concurrency, concurrency), self.max_concurrency))
+        self.increase = increase
+        self.decrease = decrease
+        self.error_decrease = error_decrease
+        self.error_threshold = error_threshold
+        self.error_rate = 0.0
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.next_slot = 0.0
+        self.paused_until = 0.0
+        self.baseline_latency = None
+        self.last_decrease = 0.0
+        self.slow_start = True
+        self.counts = {"ok": 0, "throttle": 0, "error": 0, "slow": 0}
+
+    def available(self):
+        return self.in_flight < int(self.limit)
+
+    def earliest(self, now):
+        """下一个请求最早可发出的时间"""
+        return max(now, self.next_slot, self.paused_until)
+
+    def take(self, slot):
+        """占用slot时刻发出的请求名额"""
+        self.in_flight += 1
+        self.next_slot = slot + 1.0 / self.rate
+
+    def update(self, outcome, latency, now, waited, retry_after=None):
+        """请求完成后按结果调整速率与并发上限"""
+        self.in_flight = max(0, self.in_flight - 1)
+        if outcome == "throttle":
+            self.counts["throttle"] += 1
+            pause = retry_after if retry_after is not None else self.cooldown
+            self.paused_until = max(self.paused_until, now + pause)
+            self._decrease(self.decrease, now)
+            return
+        self.error_rate += 0.1 * ((1.0 if outcome == "error" else 0.0) - self.error_rate)
+        if outcome == "error":
+            self.counts["error"] += 1
+            if self.error_rate > self.error_threshold:
+                self._decrease(self.error_decrease, now)
+            return
+
+        self.counts["ok"] += 1
+        if self.baseline_latency is None:
+            self.baseline_latency = latency
+            return
+        slow = latency > self.latency_factor * self.baseline_latency
+        # 基线为慢速滑动平均，持续变慢时逐步接受新的延迟水平
+        self.baseline_latency += 0.05 * (latency - self.baseline_latency)
+        if slow:
+            self.counts["slow"] += 1
+            self._decrease(self.error_decrease, now)
+        elif waited:
+            # 每秒约有rate个成功请求：慢启动每个加0.1（每秒增长10%），之后每个加increase/rate（每秒增加increase）
+            step = 0.1 if self.slow_start else self.increase / self.rate
+            self.rate = min(self.max_rate, self.rate + step)
+            self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+
+    def _decrease(self, factor, now):
+        hold = max(1.0, 2 * (self.baseline_latency or 0.0))
+        if now - self.last_decrease < hold:
+            return
+        self.last_decrease = now
+        self.slow_start = False
+        self.rate = max(self.min_rate, self.rate * factor)
+        self.limit = max(float(self.min_concurrency), self.limit * factor)
+        logger.warning(f"降低请求速率：{self.name}，速率 {self.rate:.2f} 次/秒，并发上限 {int(self.limit)}")
+
+    def stats(self, now):
+        return {
+            "rate": round(self.rate, 3),
+            "concurrency": int(self.limit),
+            "in_flight": self.in_flight,
+            "paused": round(max(0.0, self.paused_until - now), 1),
+            "error_rate": round(self.error_rate, 3),
+            "baseline_latency": round(self.baseline_latency, 4) if self.baseline_latency is not None else None,
+            **self.counts,
+        }
+
+class RateTicket:
+    """一次已放行请求的凭证（请求完成后交回release）"""
+    __slots__ = ("keys", "waited")
+
+    def __init__(self, keys, waited):
+        self.keys = keys
+        self.waited = waited
+
+class RateController:
+    """
+    按主机与代理分别限速的自适应速率控制（AIMD）：请求需同时满足所访问主机与所用代理的速率和并发上限
+    主机限速防止整体请求过快被站点封禁，代理限速防止单个出口IP过快被封
+    """
+    def __init__(self, host_params, proxy_params):
+        """
+        :param host_params: 每个主机的AimdLimiter参数（字典）
+        :param proxy_params: 每个代理的AimdLimiter参数（字典）
+        """
+        self.host_params = host_params
+        self.proxy_params = proxy_params
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def _limiter(self, key):
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            params = self.proxy_params if key.startswith("proxy:") else self.host_params
+            limiter = self._limiters[key] = AimdLimiter(key, **params)
+        return limiter
+
+    @staticmethod
+    def request_keys(url, proxy=None):
+        keys = ["host:" + urlsplit(url).netloc]
+        if proxy:
+            keys.append("proxy:" + proxy.get("http", ""))
+        return tuple(keys)
+
+    def reserve(self, keys):
+        """
+        尝试占用请求名额（不阻塞）
+        :return: 需要等待的秒数；主机或代理的在途请求已达并发上限时返回None
+        """
+        with self._lock:
+            limiters = [self._limiter(key) for key in keys]
+            if not all(limiter.available() for limiter in limiters):
+                return None
+            now = time.monotonic()
+            slot = max(limiter.earliest(now) for limiter in limiters)
+            for limiter in limiters:
+                limiter.take(slot)
+            return slot - now
+
+    def acquire(self, url, proxy=None):
+        """等待直到可以向url（经proxy）发出请求（阻塞当前线程）"""
+        keys = self.request_keys(url, proxy)
+        waited = False
+        while True:
+            wait = self.reserve(keys)
+            if wait is not None:
+                break
+            waited = True
+            time.sleep(0.05)
+        if wait > 0:
+            waited = True
+            time.sleep(wait)
+        return RateTicket(keys, waited)
+
+    async def acquire_async(self, url, proxy=None):
+        """acquire的协程版本（等待时让出事件循环）"""
+        import asyncio
+
+        keys = self.request_keys(url, proxy)
+        waited = False
+        while True:
+            wait = self.reserve(keys)
+            if wait is not None:
+                break
+            waited = True
+            await asyncio.sleep(0.05)
+        if wait > 0:
+            waited = True
+            await asyncio.sleep(wait)
+        return RateTicket(keys, waited)
+
+    def release(self, ticket, status, latency, retry_after=None):
+        """
+        请求完成后上报结果
+        :param ticket: acquire返回的凭证
+        :param status: HTTP状态码（无响应时为None或"error"）
+        :param latency: 请求耗时（秒）
+        :param retry_after: 限流响应的Retry-After秒数
+        """
+        outcome = classify_status(status)
+        with self._lock:
+            now = time.monotonic()
+            for key in ticket.keys:
+                self._limiter(key).update(outcome, latency, now, ticket.waited, retry_after)
+
+    def stats(self):
+        """各主机与代理的当前速率、并发上限与结果计数"""
+        with self._lock:
+            now = time.monotonic()
+            return {key: limiter.stats(now) for key, limiter in self._limiters.items()}
+
+    def health(self):
+        """整体指标（各主机速率与并发上限之和、在途请求数、暂停中的主机/代理数、累计限流与错误次数）"""
+        with self._lock:
+            now = time.monotonic()
+            hosts = [l for key, l in self._limiters.items() if key.startswith("host:")]
+            return {
+                "host_rate": round(sum(l.rate for l in hosts), 3),
+                "host_concurrency": sum(int(l.limit) for l in hosts),
+                "in_flight": sum(l.in_flight for l in hosts),
+                "paused": sum(1 for l in self._limiters.values() if l.paused_until > now),
+                "throttled": sum(l.counts["throttle"] for l in hosts),
+                "errors": sum(l.counts["error"] for l in hosts),
+            }
+
+class RetryScheduler:
+    """
+    失败页面重试调度：按指数退避加随机抖动延迟后放回爬取队列（优先通道），超过最大重试次数后放弃
+    等待重试的任务计入爬取队列的未完成任务数，爬取队列join会等到重试结束
+    """
+    def __init__(self, crawl_queue, max_retries=3, base_delay=2.0, max_delay=60.0):
+        """
+        :param crawl_queue: CrawlTaskQueue
+        :param max_retries: 每个页面最多重试次数
+        :param base_delay: 第1次重试的退避上限（秒），之后每次翻倍
+        :param max_delay: 退避上限（秒）
+        """
+        self.crawl_queue = crawl_queue
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retried = 0
+        self.gave_up = 0
+        self._attempts = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="RetrySchedulerThread", daemon=True)
+        self._thread.start()
+        return self
+
+    def backoff(self, attempt):
+        """第attempt次重试的延迟：在[上限/2, 上限]内随机，上限为base_delay*2^(attempt-1)且不超过max_delay"""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(ceiling / 2, ceiling)
+
+    def schedule(self, task, retry_after=None):
+        """
+        安排任务重试
+        :param task: (stock_code, page)
+        :param retry_after: 站点要求的最短等待（秒）
+        :return: 已安排重试返回True，超过最大重试次数返回False
+        """
+        with self._cond:
+            attempt = self._attempts.get(task, 0) + 1
+            if attempt > self.max_retries:
+                self._attempts.pop(task, None)
+                self.gave_up += 1
+                logger.warning(f"重试次数用尽，放弃：{task[0]}_{task[1]}")
+                return False
+            self._attempts[task] = attempt
+            delay = self.backoff(attempt)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            self.crawl_queue.hold()
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), task))
+            self.retried += 1
+            self._cond.notify()
+        logger.info(f"{delay:.1f} 秒后第 {attempt} 次重试：{task[0]}_{task[1]}")
+        return True
+
+    def succeeded(self, task):
+        """任务成功后清除其重试计数"""
+        if self._attempts:
+            with self._cond:
+                self._attempts.pop(task, None)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    now = time.monotonic()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+                if self._stopped:
+                    return
+                _, _, task = heapq.heappop(self._heap)
+            self.crawl_queue.put_followup(task, held=True)
+
+    def stop(self):
+        """停止调度线程，未到期的重试任务直接放弃（并从爬取队列的未完成任务数中扣除）"""
+        with self._cond:
+            self._stopped = True
+            dropped, self._heap = self._heap, []
+            self._cond.notify_all()
+        for _ in dropped:
+            self.crawl_queue.task_done()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self):
+        return {"pending": len(self._heap), "retried": self.retried, "gave_up": self.gave_up}
+
+# 全局速率控制与重试调度实例
+rate_controller = None
+retry_scheduler = None
+
+def init_rate_controller(config):
+    """
+    按[RATE]配置初始化自适应速率控制，未启用时返回None（按固定REQUEST_DELAY限速）
+    初始速率默认取1/REQUEST_DELAY
+    """
+    global rate_controller
+    if not config.getboolean("RATE", "ENABLE", fallback=False):
+        rate_controller = None
+        return None
+    request_delay = config.getfloat("BASE", "REQUEST_DELAY", fallback=1.0)
+    common = {
+        "increase": config.getfloat("RATE", "INCREASE", fallback=0.2),
+        "decrease": config.getfloat("RATE", "DECREASE", fallback=0.5),
+        "error_decrease": config.getfloat("RATE", "ERROR_DECREASE", fallback=0.8),
+        "error_threshold": config.getfloat("RATE", "ERROR_THRESHOLD", fallback=0.1),
+        "latency_factor": config.getfloat("RATE", "LATENCY_FACTOR", fallback=2.0),
+        "cooldown": config.getfloat("RATE", "COOLDOWN", fallback=10.0),
+    }
+    min_rate = config.getfloat("RATE", "MIN_RATE", fallback=0.2)
+    host_params = dict(
+        common,
+        rate=config.getfloat("RATE", "INITIAL_RATE", fallback=1.0 / request_delay if request_delay > 0 else 1.0),
+        min_rate=min_rate,
+        max_rate=config.getfloat("RATE", "MAX_RATE", fallback=5.0),
+        concurrency=config.getint("RATE", "INITIAL_CONCURRENCY", fallback=2),
+        min_concurrency=1,
+        max_concurrency=config.getint("RATE", "MAX_CONCURRENCY", fallback=16),
+    )
+    proxy_params = dict(
+        common,
+        rate=config.getfloat("RATE", "PROXY_INITIAL_RATE", fallback=0.5),
+        min_rate=min_rate,
+        max_rate=config.getfloat("RATE", "PROXY_MAX_RATE", fallback=2.0),
+        concurrency=1,
+        min_concurrency=1,
+        max_concurrency=config.getint("RATE", "PROXY_MAX_CONCURRENCY", fallback=2),
+    )
+    rate_controller = RateController(host_params, proxy_params)
+    logger.info(f"启用自适应速率控制：初始 {host_params['rate']:.2f} 次/秒，上限 {host_params['max_rate']} 次/秒")
+    return rate_controller
+
+def init_retry_scheduler(config, crawl_queue):
+    """按[RETRY]配置初始化失败页面重试调度（MAX_RETRIES为0时返回None，失败页面不重试）"""
+    global retry_scheduler
+    max_retries = config.getint("RETRY", "MAX_RETRIES", fallback=0)
+    if max_retries <= 0:
+        retry_scheduler = None
+        return None
+    retry_scheduler = RetryScheduler(
+        crawl_queue,
+        max_retries=max_retries,
+        base_delay=config.getfloat("RETRY", "BASE_DELAY", fallback=2.0),
+        max_delay=config.getfloat("RETRY", "MAX_DELAY", fallback=60.0)
+    )
+    return retry_scheduler
+
+def get_rate_controller():
+    """获取全局速率控制实例"""
+    return rate_controller
+
+def get_retry_scheduler():
+    """获取全局重试调度实例"""
+    return retry_scheduler
\ No newline at end of file
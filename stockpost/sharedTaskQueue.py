@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import time
+import socket
+import sqlite3
+import threading
+from common.Logger import getLogger
+
+# 初始化日志
+logger = getLogger(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "shared_task.log"))
+
+def _task_key(stock_code, page):
+    return f"{stock_code}_{page}"
+
+class MysqlTaskStore:
+    """
+    MySQL共享任务表：多个爬虫进程/节点用 SELECT ... FOR UPDATE SKIP LOCKED 互不阻塞地租用任务（需MySQL 8.0+）
+    状态：pending（待爬）-> leased（已租用，lease_expire前由租用方独占）-> done（数据已提交）
+    """
+    CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS guba_crawl_task (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY COMMENT '自增ID（租用顺序）',
+        task_key VARCHAR(64) NOT NULL COMMENT '股票代码_页码',
+        stock_code VARCHAR(20) NOT NULL COMMENT '股票代码',
+        page INT NOT NULL COMMENT '页码',
+        status ENUM('pending', 'leased', 'done') NOT NULL DEFAULT 'pending' COMMENT '任务状态',
+        lease_owner VARCHAR(128) DEFAULT NULL COMMENT '租用节点',
+        lease_expire DATETIME DEFAULT NULL COMMENT '租约到期时间',
+        attempts INT NOT NULL DEFAULT 0 COMMENT '已租用次数',
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+        UNIQUE KEY uk_task_key (task_key),
+        INDEX idx_status_expire (status, lease_expire)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='股吧爬取共享任务表';
+    """
+
+    def __init__(self, mysql_client):
+        self.mysql_client = mysql_client
+        self.mysql_client.execute_sql(self.CREATE_TABLE_SQL)
+
+    def seed(self, tasks, reset=False):
+        """写入任务；reset为True时把已有任务重置为待爬（开始新一轮）"""
+        sql = "INSERT INTO guba_crawl_task (task_key, stock_code, page) VALUES (%s, %s, %s) "
+        if reset:
+            sql += ("ON DUPLICATE KEY UPDATE status = 'pending', lease_owner = NULL, "
+                    "lease_expire = NULL, attempts = 0")
+        else:
+            sql += "ON DUPLICATE KEY UPDATE task_key = task_key"
+        with self.mysql_client.transaction() as cursor:
+            cursor.executemany(sql, [(_task_key(s, p), s, p) for s, p in tasks])
+
+    def lease(self, owner, limit, lease_seconds, max_attempts):
+        """租用最多limit个任务（待爬任务，或租约已过期的任务），返回[(stock_code, page)]"""
+        with self.mysql_client.transaction() as cursor:
+            cursor.execute(
+                "SELECT id, stock_code, page FROM guba_crawl_task "
+                "WHERE (status = 'pending' OR (status = 'leased' AND lease_expire < NOW())) AND attempts < %s "
+                "ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED",
+                (max_attempts, limit)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                return []
+            ids = [row["id"] for row in rows]
+            cursor.execute(
+                "UPDATE guba_crawl_task SET status = 'leased', lease_owner = %s, "
+                "lease_expire = NOW() + INTERVAL %s SECOND, attempts = attempts + 1 "
+                f"WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                [owner, int(lease_seconds)] + ids
+            )
+        return [(row["stock_code"], row["page"]) for row in rows]
+
+    def heartbeat(self, owner, keys, lease_seconds):
+        """延长本节点持有的租约"""
+        with self.mysql_client.transaction() as cursor:
+            cursor.execute(
+                "UPDATE guba_crawl_task SET lease_expire = NOW() + INTERVAL %s SECOND "
+                f"WHERE status = 'leased' AND lease_owner = %s AND task_key IN ({', '.join(['%s'] * len(keys))})",
+                [int(lease_seconds), owner] + list(keys)
+            )
+
+    def complete(self, keys):
+        """标记任务完成（数据已提交，租约是否已过期都视为完成）"""
+        with self.mysql_client.transaction() as cursor:
+            cursor.execute(
+                "UPDATE guba_crawl_task SET status = 'done', lease_owner = NULL, lease_expire = NULL "
+                f"WHERE task_key IN ({', '.join(['%s'] * len(keys))})",
+                list(keys)
+            )
+
+    def release(self, owner, keys):
+        """归还本节点持有的租约（立即可被其它节点租用）"""
+        with self.mysql_client.transaction() as cursor:
+            cursor.execute(
+                "UPDATE guba_crawl_task SET status = 'pending', lease_owner = NULL, lease_expire = NULL "
+                f"WHERE status = 'leased' AND lease_owner = %s AND task_key IN ({', '.join(['%s'] * len(keys))})",
+                [owner] + list(keys)
+            )
+
+    def remaining(self, max_attempts):
+        """尚未完成的任务数（租用中的，或还能再租用的）"""
+        result = self.mysql_client.execute_sql(
+            "SELECT COUNT(*) AS n FROM guba_crawl_task WHERE "
+            "(status = 'pending' AND attempts < %s) OR "
+            "(status = 'leased' AND (lease_expire >= NOW() OR attempts < %s))",
+            (max_attempts, max_attempts)
+        )
+        return result[0]["n"] if result else 0
+
+    def close(self):
+        pass
+
+class SqliteTaskStore:
+    """SQLite共享任务表（单机多进程）：BEGIN IMMEDIATE 取得写锁后租用，语义与MysqlTaskStore一致"""
+    def __init__(self, db_path):
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS guba_crawl_task ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, task_key TEXT NOT NULL UNIQUE, stock_code TEXT NOT NULL, "
+            "page INTEGER NOT NULL, status TEXT NOT NULL DEFAULT 'pending', lease_owner TEXT, "
+            "lease_expire REAL, attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_status_expire ON guba_crawl_task (status, lease_expire)")
+
+    def _write(self, func):
+        """在写事务内执行（BEGIN IMMEDIATE：多进程间互斥）"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._conn)
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def seed(self, tasks, reset=False):
+        if reset:
+            sql = ("INSERT INTO guba_crawl_task (task_key, stock_code, page) VALUES (?, ?, ?) "
+                   "ON CONFLICT(task_key) DO UPDATE SET status = 'pending', lease_owner = NULL, "
+                   "lease_expire = NULL, attempts = 0")
+        else:
+            sql = "INSERT OR IGNORE INTO guba_crawl_task (task_key, stock_code, page) VALUES (?, ?, ?)"
+        rows = [(_task_key(s, p), s, p) for s, p in tasks]
+        self._write(lambda conn: conn.executemany(sql, rows))
+
+    def lease(self, owner, limit, lease_seconds, max_attempts):
+        def run(conn):
+            now = time.time()
+            rows = conn.execute(
+                "SELECT id, stock_code, page FROM guba_crawl_task "
+                "WHERE (status = 'pending' OR (status = 'leased' AND lease_expire < ?)) AND attempts < ? "
+                "ORDER BY id LIMIT ?",
+                (now, max_attempts, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE guba_crawl_task SET status = 'leased', lease_owner = ?, lease_expire = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                [(owner, now + lease_seconds, row[0]) for row in rows]
+            )
+            return [(row[1], row[2]) for row in rows]
+        return self._write(run)
+
+    def heartbeat(self, owner, keys, lease_seconds):
+        expire = time.time() + lease_seconds
+        self._write(lambda conn: conn.executemany(
+            "UPDATE guba_crawl_task SET lease_expire = ? WHERE status = 'leased' AND lease_owner = ? AND task_key = ?",
+            [(expire, owner, key) for key in keys]
+        ))
+
+    def complete(self, keys):
+        self._write(lambda conn: conn.executemany(
+            "UPDATE guba_crawl_task SET status = 'done', lease_owner = NULL, lease_expire = NULL WHERE task_key = ?",
+            [(key,) for key in keys]
+        ))
+
+    def release(self, owner, keys):
+        self._write(lambda conn: conn.executemany(
+            "UPDATE guba_crawl_task SET status = 'pending', lease_owner = NULL, lease_expire = NULL "
+            "WHERE status = 'leased' AND lease_owner = ? AND task_key = ?",
+            [(owner, key) for key in keys]
+        ))
+
+    def remaining(self, max_attempts):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM guba_crawl_task WHERE "
+                "(status = 'pending' AND attempts < ?) OR "
+                "(status = 'leased' AND (lease_expire >= ? OR attempts < ?))",
+                (max_attempts, time.time(), max_attempts)
+            ).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class SharedTaskQueue:
+    """
+    共享任务队列：从共享任务表批量租用任务放入本地爬取队列，后台线程为在途任务续租，
+    页面数据提交后标记完成；节点崩溃时其租约到期后自动回到队列，由其它节点重新租用
+    """
+    def __init__(self, store, owner=None, lease_seconds=120, lease_batch=50, max_attempts=3,
+                 heartbeat_interval=30, poll_interval=5):
+        """
+        :param store: 任务表（MysqlTaskStore / SqliteTaskStore）
+        :param owner: 本节点标识（默认 主机名-进程号）
+        :param lease_seconds: 租约时长（秒）
+        :param lease_batch: 每次租用的任务数
+        :param max_attempts: 单个任务最多租用次数（超过后不再租用，视为失败）
+        :param heartbeat_interval: 续租与批量提交完成状态的间隔（秒）
+        :param poll_interval: 暂无可租任务（其它节点仍在处理）时的轮询间隔（秒）
+        """
+        self.store = store
+        self.owner = owner or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.lease_batch = max(1, int(lease_batch))
+        self.max_attempts = max_attempts
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._leased = set()
+        self._completed = []
+        self._stop_event = threading.Event()
+        self._seeding = threading.Event()
+        self._seed_thread = None
+        self._thread = None
+        self.stats = {"leased": 0, "completed": 0, "released": 0}
+
+    def seed(self, tasks, reset=False, chunk_size=1000):
+        """
+        按块写入任务（任务可为生成器，不整体加载）
+        :param reset: 是否把已有任务重置为待爬（开始新一轮）
+        """
+        chunk, total = [], 0
+        for task in tasks:
+            chunk.append(task)
+            if len(chunk) >= chunk_size:
+                # 停止时不再写入剩余任务（下次启动时补充）
+                if self._stop_event.is_set():
+                    chunk = []
+                    break
+                self.store.seed(chunk, reset)
+                total += len(chunk)
+                chunk = []
+        if chunk:
+            self.store.seed(chunk, reset)
+            total += len(chunk)
+        logger.info(f"共享任务表写入 {total} 个任务（{'重置' if reset else '只新增'}）")
+
+    def seed_async(self, tasks, reset=False, chunk_size=1000):
+        """
+        在后台线程按块写入任务：写入第一块后feed即可开始租用，不必等全部任务写完
+        写入结束前feed不会因任务表暂无未完成任务而退出
+        """
+        self._seeding.set()
+
+        def run():
+            try:
+                self.seed(tasks, reset, chunk_size)
+            except Exception as e:
+                logger.error(f"写入共享任务失败：{e}", exc_info=True)
+            finally:
+                self._seeding.clear()
+
+        self._seed_thread = threading.Thread(target=run, name="TaskSeedThread", daemon=True)
+        self._seed_thread.start()
+
+    def start(self):
+        """启动续租线程"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._heartbeat_loop, name="TaskLeaseHeartbeatThread", daemon=True)
+            self._thread.start()
+            logger.info(f"共享任务队列启动，节点：{self.owner}，租约：{self.lease_seconds}s")
+
+    def feed(self, crawl_queue):
+        """
+        持续租用任务放入本地爬取队列（队列满时阻塞），直到共享任务表中的任务全部完成
+        :return: 本节点租用的任务数
+        """
+        leased = 0
+        while not self._stop_event.is_set():
+            # 爬取队列还有积压时不再租用，避免本节点囤积租约
+            if crawl_queue.qsize() >= self.lease_batch:
+                time.sleep(0.1)
+                continue
+            try:
+                tasks = self.store.lease(self.owner, self.lease_batch, self.lease_seconds, self.max_attempts)
+            except Exception as e:
+                logger.error(f"租用任务失败：{e}")
+                self._stop_event.wait(self.poll_interval)
+                continue
+            if not tasks:
+                self.flush()
+                # 先判断写入是否结束再统计剩余任务：写入结束后任务表中的任务已完整
+                seeding = self._seeding.is_set()
+                if not seeding and self.store.remaining(self.max_attempts) == 0:
+                    break
+                self._stop_event.wait(0.05 if seeding else self.poll_interval)
+                continue
+            with self._lock:
+                self._leased.update(_task_key(s, p) for s, p in tasks)
+                self.stats["leased"] += len(tasks)
+            for task in tasks:
+                crawl_queue.put(task)
+            leased += len(tasks)
+        logger.info(f"共享任务表已无待爬任务，本节点共租用 {leased} 个任务")
+        return leased
+
+    def complete(self, stock_code, page):
+        """页面数据提交后调用：记录完成，由续租线程批量写回"""
+        key = _task_key(stock_code, page)
+        with self._lock:
+            if key not in self._leased:
+                return
+            self._leased.discard(key)
+            self._completed.append(key)
+            need_flush = len(self._completed) >= self.lease_batch
+        if need_flush:
+            self.flush()
+
+    def release(self, stock_code, page):
+        """任务失败时调用：立即归还租约，不必等到租约过期"""
+        key = _task_key(stock_code, page)
+        with self._lock:
+            if key not in self._leased:
+                return
+            self._leased.discard(key)
+            self.stats["released"] += 1
+        try:
+            self.store.release(self.owner, [key])
+        except Exception as e:
+            logger.error(f"归还租约失败：{key}，错误：{e}")
+
+    def flush(self):
+        """批量写回已完成的任务"""
+        with self._lock:
+            completed, self._completed = self._completed, []
+        if not completed:
+            return
+        try:
+            self.store.complete(completed)
+            with self._lock:
+                self.stats["completed"] += len(completed)
+        except Exception as e:
+            logger.error(f"提交任务完成状态失败：{len(completed)} 个，错误：{e}")
+            with self._lock:
+                self._completed.extend(completed)
+
+    def _heartbeat_loop(self):
+        while not self._stop_event.wait(self.heartbeat_interval):
+            self.flush()
+            with self._lock:
+                leased = list(self._leased)
+            if leased:
+                try:
+                    self.store.heartbeat(self.owner, leased, self.lease_seconds)
+                except Exception as e:
+                    logger.error(f"续租失败：{e}")
+
+    def stop(self):
+        """停止续租，写回完成状态，并归还仍在租用中的任务"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._seed_thread is not None:
+            self._seed_thread.join(timeout=5)
+            self._seed_thread = None
+        self.flush()
+        with self._lock:
+            leased, self._leased = list(self._leased), set()
+        if leased:
+            try:
+                self.store.release(self.owner, leased)
+                self.stats["released"] += len(leased)
+            except Exception as e:
+                logger.error(f"归还租约失败：{e}")
+        self.store.close()
+        logger.info(f"共享任务队列退出，统计：{self.stats}")
+
+# 全局共享任务队列实例
+shared_task_queue = None
+
+TASK_STORE_BACKENDS = ("mysql", "sqlite")
+
+def init_shared_task_queue(config, mysql_client):
+    """初始化共享任务队列（[SHARED_QUEUE] ENABLE关闭时返回None）"""
+    global shared_task_queue
+    if not config.getboolean("SHARED_QUEUE", "ENABLE", fallback=False):
+        shared_task_queue = None
+        return shared_task_queue
+
+    backend = config.get("SHARED_QUEUE", "BACKEND", fallback="mysql").strip().lower()
+    if backend not in TASK_STORE_BACKENDS:
+        raise ValueError(f"不支持的共享任务表类型：{backend}")
+    if backend == "mysql":
+        if not mysql_client:
+            raise RuntimeError("共享任务表使用MySQL，但数据库未连接")
+        store = MysqlTaskStore(mysql_client)
+    else:
+        store = SqliteTaskStore(config.get("SHARED_QUEUE", "SQLITE_PATH", fallback="./cache/shared_task.db"))
+
+    shared_task_queue = SharedTaskQueue(
+        store,
+        owner=config.get("SHARED_QUEUE", "NODE_ID", fallback="") or None,
+        lease_seconds=config.getfloat("SHARED_QUEUE", "LEASE_SECONDS", fallback=120),
+        lease_batch=config.getint("SHARED_QUEUE", "LEASE_BATCH", fallback=50),
+        max_attempts=config.getint("SHARED_QUEUE", "MAX_ATTEMPTS", fallback=3),
+        heartbeat_interval=config.getfloat("SHARED_QUEUE", "HEARTBEAT_INTERVAL", fallback=30),
+        poll_interval=config.getfloat("SHARED_QUEUE", "POLL_INTERVAL", fallback=5)
+    )
+    return shared_task_queue
+
+def get_shared_task_queue():
+    """获取全局共享任务队列实例"""
+    return shared_task_queue
\ No newline at end of file
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import json
+import math
+import time
+import heapq
+import datetime
+import threading
+from common.Logger import getLogger
+
+# 初始化日志
+logger = getLogger(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "stock_scheduler.log"))
+
+def _to_timestamp(publish_time):
+    """"YYYY-MM-DD HH:MM:SS" -> 时间戳，无法解析时返回None"""
+    try:
+        return datetime.datetime.strptime(publish_time, "%Y-%m-%d %H:%M:%S").timestamp()
+    except (TypeError, ValueError):
+        return None
+
+class StockScheduler:
+    """
+    常驻模式的股票调度：按下次到期时间建堆，到期的股票从第1页增量爬取
+    每轮结束后按新帖数估算发帖速度（帖/小时，滑动平均），据此设置刷新间隔与翻页深度：
+    - 刷新间隔：预计累积target_pages页新帖所需的时间，限制在[min_interval, max_interval]
+    - 翻页深度：预计新帖页数+1，不超过max_page
+    热门股票几分钟刷新一次，冷门股票很久才刷新一次，相同请求量下覆盖更多股票
+    """
+    def __init__(self, cache_dir, max_page=5, posts_per_page=80, min_interval=180, max_interval=86400,
+                 initial_interval=1800, target_pages=1.0, smoothing=0.5, stuck_timeout=3600, save_interval=60):
+        """
+        :param cache_dir: 缓存目录（调度状态保存为stock_schedule.json，重启后沿用）
+        :param max_page: 翻页深度上限
+        :param posts_per_page: 每个列表页的帖子数
+        :param min_interval: 最短刷新间隔（秒）
+        :param max_interval: 最长刷新间隔（秒）
+        :param initial_interval: 尚无发帖速度估计时的刷新间隔（秒）
+        :param target_pages: 每次刷新期望抓到的新帖页数
+        :param smoothing: 发帖速度滑动平均系数（越大越偏向最近一轮）
+        :param stuck_timeout: 一轮爬取超过该时间（秒）仍未结束时视为丢失，重新调度
+        :param save_interval: 调度状态落盘间隔（秒）
+        """
+        self.state_file = os.path.join(cache_dir, "stock_schedule.json")
+        self.max_page = max(1, int(max_page))
+        self.posts_per_page = max(1, int(posts_per_page))
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.initial_interval = initial_interval
+        self.target_pages = target_pages
+        self.smoothing = smoothing
+        self.stuck_timeout = stuck_timeout
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._stocks = self._load()
+        self._heap = []
+        self._in_flight = {}
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self.stats = {"dispatched": 0, "completed": 0, "failed": 0, "stuck": 0}
+
+    def _load(self):
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.error(f"加载调度状态失败：{e}")
+        return {}
+
+    def set_stocks(self, stock_codes):
+        """
+        设置调度的股票集合：新股票立即到期，已有股票沿用保存的调度状态，不在集合中的股票停止调度
+        :return: 调度中的股票数
+        """
+        now = time.time()
+        stock_codes = dict.fromkeys(code.strip() for code in stock_codes if code and code.strip())
+        with self._lock:
+            for stock_code in list(self._stocks):
+                if stock_code not in stock_codes:
+                    del self._stocks[stock_code]
+            for stock_code in stock_codes:
+                entry = self._stocks.setdefault(stock_code, {
+                    "velocity": None, "interval": self.initial_interval, "max_page": self.max_page,
+                    "last_crawl": None, "next_due": now,
+                })
+                entry["max_page"] = min(entry["max_page"], self.max_page)
+            self._heap = [(entry["next_due"], stock_code) for stock_code, entry in self._stocks.items()
+                          if stock_code not in self._in_flight]
+            heapq.heapify(self._heap)
+            self._dirty = True
+            return len(self._stocks)
+
+    def pop_due(self, limit=None):
+        """
+        取出已到期的股票（按到期时间先后），标记为爬取中
+        超过stuck_timeout仍未结束的股票视为丢失，重新取出
+        :param limit: 最多取出的数量
+        :return: 股票代码列表
+        """
+        now = time.time()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and (limit is None or len(due) < limit):
+                next_due, stock_code = heapq.heappop(self._heap)
+                entry = self._stocks.get(stock_code)
+                # 堆中过期的记录（股票已移除或已重新调度）直接丢弃
+                if entry is None or entry["next_due"] != next_due:
+                    continue
+                if stock_code in self._in_flight:
+                    self.stats["stuck"] += 1
+                    logger.warning(f"股票本轮爬取超时未结束，重新调度：{stock_code}")
+                # 超时看门狗：本轮结束时会被新的到期时间替换
+                entry["next_due"] = now + self.stuck_timeout
+                heapq.heappush(self._heap, (entry["next_due"], stock_code))
+                self._in_flight[stock_code] = now
+                due.append(stock_code)
+            self.stats["dispatched"] += len(due)
+        return due
+
+    def seconds_until_next(self):
+        """距下一只股票到期的秒数（无股票时返回None）"""
+        with self._lock:
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - time.time())
+
+    def get_max_page(self, stock_code):
+        """股票本轮的翻页深度"""
+        entry = self._stocks.get(stock_code)
+        return entry["max_page"] if entry else self.max_page
+
+    def _interval(self, velocity):
+        if velocity is None:
+            return self.initial_interval
+        if velocity <= 0:
+            return self.max_interval
+        interval = self.target_pages * self.posts_per_page / velocity * 3600
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def _depth(self, velocity, interval):
+        if velocity is None:
+            return self.max_page
+        expected_pages = velocity * interval / 3600 / self.posts_per_page
+        return min(self.max_page, max(1, math.ceil(expected_pages) + 1))
+
+    def complete(self, stock_code, new_posts=0, truncated=False, oldest_new_time=None, ok=True):
+        """
+        一轮爬取结束，更新发帖速度并重新调度
+        :param new_posts: 本轮比高水位新的帖子数
+        :param truncated: 是否因达到翻页深度而停止（仍有更新的帖子未抓到，速度按下限估计）
+        :param oldest_new_time: 本轮最早的新帖发表时间（首次爬取时用于估算速度）
+        :param ok: 本轮是否成功（失败时不更新速度，按不超过initial_interval的间隔重试）
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._stocks.get(stock_code)
+            if entry is None or self._in_flight.pop(stock_code, None) is None:
+                return
+            velocity = entry["velocity"]
+            if ok:
+                self.stats["completed"] += 1
+                # 距上次爬取的时间；首次爬取时取最早新帖至今的时间
+                since = now - entry["last_crawl"] if entry["last_crawl"] else None
+                if since is None and new_posts:
+                    oldest = _to_timestamp(oldest_new_time)
+                    since = now - oldest if oldest else None
+                if since:
+                    measured = new_posts / max(since / 3600, 1 / 60)
+                    if truncated and velocity:
+                        measured = max(measured, velocity * 2)
+                    velocity = measured if velocity is None else velocity + self.smoothing * (measured - velocity)
+                entry["last_crawl"] = now
+                interval = self._interval(velocity)
+            else:
+                self.stats["failed"] += 1
+                interval = min(self._interval(velocity), self.initial_interval)
+            entry["velocity"] = velocity
+            entry["interval"] = interval
+            entry["max_page"] = self._depth(velocity, interval)
+            entry["next_due"] = now + interval
+            heapq.heappush(self._heap, (entry["next_due"], stock_code))
+            self._dirty = True
+            need_save = time.monotonic() - self._last_save >= self.save_interval
+        logger.info(f"调度：{stock_code}，新帖 {new_posts}，速度 {velocity if velocity is not None else '未知'} 帖/小时，"
+                    f"{interval:.0f} 秒后刷新，深度 {entry['max_page']} 页")
+        if need_save:
+            self.save()
+
+    def save(self):
+        """调度状态落盘（爬取中的股票保存为立即到期，重启后优先爬取）"""
+        now = time.time()
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                stock_code: dict(entry, next_due=min(entry["next_due"], now)) if stock_code in self._in_flight else entry
+                for stock_code, entry in self._stocks.items()
+            }
+            data = json.dumps(data, ensure_ascii=False)
+            self._dirty = False
+            self._last_save = time.monotonic()
+        try:
+            tmp_file = self.state_file + ".tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_file, self.state_file)
+        except Exception as e:
+            logger.error(f"保存调度状态失败：{e}")
+
+    def health(self):
+        """调度指标（股票数、爬取中、已到期未取出的股票数、累计调度次数）"""
+        now = time.time()
+        with self._lock:
+            overdue = sum(1 for stock_code, entry in self._stocks.items()
+                          if entry["next_due"] <= now and stock_code not in self._in_flight)
+            return dict(self.stats, stocks=len(self._stocks), in_flight=len(self._in_flight), overdue=overdue)
+
+    def close(self):
+        """落盘并输出调度统计"""
+        self.save()
+        logger.info(f"调度统计：{self.health()}")
+
+# 全局股票调度实例
+stock_scheduler = None
+
+def init_stock_scheduler(config):
+    """按[DAEMON]配置初始化常驻模式的股票调度（翻页深度上限取[BASE] MAX_PAGE）"""
+    global stock_scheduler
+    stock_scheduler = StockScheduler(
+        config.get("BASE", "CACHE_DIR"),
+        max_page=config.getint("BASE", "MAX_PAGE"),
+        posts_per_page=config.getint("DAEMON", "POSTS_PER_PAGE", fallback=80),
+        min_interval=config.getfloat("DAEMON", "MIN_INTERVAL", fallback=180),
+        max_interval=config.getfloat("DAEMON", "MAX_INTERVAL", fallback=86400),
+        initial_interval=config.getfloat("DAEMON", "INITIAL_INTERVAL", fallback=1800),
+        target_pages=config.getfloat("DAEMON", "TARGET_PAGES", fallback=1.0),
+        smoothing=config.getfloat("DAEMON", "SMOOTHING", fallback=0.5),
+        stuck_timeout=config.getfloat("DAEMON", "STUCK_TIMEOUT", fallback=3600),
+        save_interval=config.getfloat("DAEMON", "SAVE_INTERVAL", fallback=60)
+    )
+    return stock_scheduler
+
+def get_stock_scheduler():
+    """获取全局股票调度实例"""
+    return stock_scheduler
\ No newline at end of file
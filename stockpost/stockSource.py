@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import re
+import itertools
+from common.Logger import getLogger
+
+# 初始化日志
+logger = getLogger(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "stock_source.log"))
+
+_IDENTIFIER = re.compile(r"^\w+$")
+
+class ConfigStockSource:
+    """配置文件中的股票代码（[BASE] STOCK_CODES，逗号分隔）"""
+    def __init__(self, stock_codes):
+        self.stock_codes = stock_codes
+
+    def __iter__(self):
+        return iter(self.stock_codes.split(","))
+
+class FileStockSource:
+    """股票代码文件：每行一个代码（也可逗号分隔），#之后为注释；逐行读取，不整体加载"""
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield from line.split("#", 1)[0].split(",")
+
+class TableStockSource:
+    """数据库表中的股票代码：按代码列分块读取（键集分页），每次只取chunk_size个"""
+    def __init__(self, mysql_client, table, column="stock_code", where="", chunk_size=1000):
+        """
+        :param mysql_client: MysqlDB实例
+        :param table: 表名
+        :param column: 股票代码列
+        :param where: 附加过滤条件（SQL片段，如 "status = 1"）
+        :param chunk_size: 每次读取的代码数
+        """
+        if not _IDENTIFIER.match(table) or not _IDENTIFIER.match(column):
+            raise ValueError(f"非法的表名或列名：{table}.{column}")
+        if not mysql_client:
+            raise ValueError("从数据库表读取股票代码需要MySQL连接")
+        self.mysql_client = mysql_client
+        self.chunk_size = max(1, int(chunk_size))
+        self.sql = f"SELECT DISTINCT {column} AS stock_code FROM {table} WHERE {column} > %s"
+        if where.strip():
+            self.sql += f" AND ({where})"
+        self.sql += f" ORDER BY {column} LIMIT %s"
+
+    def __iter__(self):
+        last = ""
+        while True:
+            rows = self.mysql_client.execute_sql(self.sql, (last, self.chunk_size))
+            if rows is False:
+                raise RuntimeError("读取股票代码失败")
+            for row in rows:
+                yield str(row["stock_code"])
+            if len(rows) < self.chunk_size:
+                return
+            last = str(rows[-1]["stock_code"])
+
+class RangeStockSource:
+    """股票代码区间："600000-600999,000001-000999"（含两端，按起始代码的位数补零），也可以是单个代码"""
+    def __init__(self, ranges):
+        self.ranges = []
+        for part in ranges.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            start, _, end = part.partition("-")
+            start, end = start.strip(), (end or start).strip()
+            if not (start.isdigit() and end.isdigit()) or int(end) < int(start):
+                raise ValueError(f"非法的股票代码区间：{part}")
+            self.ranges.append((int(start), int(end), len(start)))
+
+    def __iter__(self):
+        for start, end, width in self.ranges:
+            for number in range(start, end + 1):
+                yield f"{number:0{width}d}"
+
+def iter_stock_codes(source):
+    """逐个取出来源中的股票代码（去除空白与空项，跳过重复代码）"""
+    seen = set()
+    for stock_code in source:
+        stock_code = stock_code.strip()
+        if stock_code and stock_code not in seen:
+            seen.add(stock_code)
+            yield stock_code
+
+def interleave_tasks(stock_codes, max_page, window=50):
+    """
+    按需生成股票+页码任务，相邻股票交错：每window只股票为一组，组内按页码轮流（第1页全部、再第2页……）
+    同一股票的相邻请求之间隔着组内其它股票的请求；只预读一组股票代码
+    :param stock_codes: 股票代码（可为生成器）
+    :param max_page: 每只股票的页数
+    :param window: 每组股票数（1表示不交错，逐只股票按页码顺序）
+    """
+    stock_codes = iter(stock_codes)
+    window = max(1, int(window))
+    while True:
+        group = list(itertools.islice(stock_codes, window))
+        if not group:
+            return
+        for page in range(1, max_page + 1):
+            for stock_code in group:
+                yield stock_code, page
+
+def init_stock_source(config, mysql_client=None):
+    """
+    按[SOURCE]配置创建股票代码来源（未配置时使用[BASE] STOCK_CODES）
+    :return: 可迭代对象，每次迭代重新读取（常驻模式与多轮爬取可反复使用）
+    """
+    source_type = config.get("SOURCE", "TYPE", fallback="config").strip().lower()
+    logger.info(f"股票代码来源：{source_type}")
+    if source_type == "config":
+        return ConfigStockSource(config.get("BASE", "STOCK_CODES"))
+    if source_type == "file":
+        return FileStockSource(config.get("SOURCE", "FILE"))
+    if source_type == "table":
+        return TableStockSource(
+            mysql_client,
+            config.get("SOURCE", "TABLE"),
+            column=config.get("SOURCE", "COLUMN", fallback="stock_code"),
+            where=config.get("SOURCE", "WHERE", fallback=""),
+            chunk_size=config.getint("SOURCE", "CHUNK_SIZE", fallback=1000)
+        )
+    if source_type == "range":
+        return RangeStockSource(config.get("SOURCE", "RANGES"))
+    raise ValueError(f"不支持的股票代码来源：{source_type}")
\ No newline at end of file
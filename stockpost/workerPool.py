@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import queue
+import threading
+import collections
+from common.Logger import getLogger
+from common.Metrics import get_metrics
+
+# 初始化日志
+logger = getLogger(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "worker_pool.log"))
+
+class CrawlTaskQueue(queue.Queue):
+    """
+    有界爬取队列：新任务受maxsize限制（任务生成线程在队列满时阻塞）；
+    增量模式的下一页任务走优先通道，不受maxsize限制，避免解析线程与爬取线程互相等待
+    """
+    def _init(self, maxsize):
+        self.queue = collections.deque()
+        self.followups = collections.deque()
+
+    def _qsize(self):
+        return len(self.queue) + len(self.followups)
+
+    def _put(self, item):
+        self.queue.append(item)
+
+    def _get(self):
+        return self.followups.popleft() if self.followups else self.queue.popleft()
+
+    def put_followup(self, item, held=False):
+        """
+        加入后续页任务（不阻塞，优先于新任务被取出）
+        :param held: 任务已通过hold计入未完成任务数（重试任务）
+        """
+        with self.mutex:
+            self.followups.append(item)
+            if not held:
+                self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def hold(self):
+        """预先计入一个稍后才放入的任务（等待重试期间join不会返回），之后用put_followup(item, held=True)放入"""
+        with self.mutex:
+            self.unfinished_tasks += 1
+
+class WorkerPool:
+    """可伸缩工作线程组：线程编号不小于目标线程数时挂起，目标数增加时唤醒或新建线程"""
+    def __init__(self, name, target, size, min_size=1, max_size=None):
+        """
+        :param name: 线程名前缀
+        :param target: 线程函数 target(pool, index)
+        :param size: 初始线程数
+        :param min_size: 最少活跃线程数
+        :param max_size: 最多活跃线程数（默认等于初始线程数，即不伸缩）
+        """
+        self.name = name
+        self.target = target
+        self.min_size = max(1, int(min_size))
+        self.max_size = max(self.min_size, int(max_size or size))
+        self.size = min(max(self.min_size, int(size)), self.max_size)
+        self.threads = []
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    @property
+    def stopped(self):
+        return self._stopped
+
+    def start(self):
+        self._spawn(self.size)
+        return self
+
+    def _spawn(self, count):
+        while len(self.threads) < count:
+            t = threading.Thread(target=self.target, args=(self, len(self.threads)),
+                                 name=f"{self.name}-{len(self.threads) + 1}", daemon=True)
+            t.start()
+            self.threads.append(t)
+            logger.info(f"启动线程：{t.name}")
+
+    def resize(self, size):
+        """调整活跃线程数（限制在[min_size, max_size]内），返回调整后的线程数"""
+        size = min(max(self.min_size, int(size)), self.max_size)
+        with self._cond:
+            if size == self.size:
+                return size
+            logger.info(f"{self.name} 线程数调整：{self.size} -> {size}")
+            self.size = size
+            self._cond.notify_all()
+        self._spawn(size)
+        return size
+
+    def wait_active(self, index):
+        """工作线程每轮循环开始时调用：超出活跃线程数时挂起，线程组停止时立即返回"""
+        if index < self.size:
+            return
+        with self._cond:
+            while index >= self.size and not self._stopped:
+                self._cond.wait()
+
+    def stop(self, timeout=5):
+        """停止线程组并等待线程退出"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for t in self.threads:
+            t.join(timeout=timeout)
+
+class AdaptiveController:
+    """
+    线程数自适应控制：按结果队列水位与抓取延迟调整爬取/解析线程数
+    - 结果队列积压（解析跟不上）：增加解析线程，减少爬取线程，限制在途HTML占用的内存
+    - 结果队列空闲且仍有爬取任务（抓取跟不上）：抓取延迟未明显上升时增加爬取线程，延迟翻倍说明对端变慢，减少爬取线程
+    - 结果队列空闲：逐步减少多余的解析线程
+    """
+    def __init__(self, crawl_pool, parse_pool, crawl_queue, result_queue, interval=2.0,
+                 high_watermark=0.8, low_watermark=0.2):
+        """
+        :param crawl_pool: 爬取线程组（async引擎时为None，只调整解析线程）
+        :param parse_pool: 解析线程组
+        :param interval: 调整间隔（秒）
+        :param high_watermark: 结果队列水位高于该比例时视为解析积压
+        :param low_watermark: 结果队列水位低于该比例时视为解析空闲
+        """
+        self.crawl_pool = crawl_pool
+        self.parse_pool = parse_pool
+        self.crawl_queue = crawl_queue
+        self.result_queue = result_queue
+        self.interval = interval
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._last_fetch = (0, 0.0)
+        self._baseline_latency = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="AdaptiveControllerThread", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _recent_fetch_latency(self):
+        """上次调整以来的平均抓取延迟（由抓取耗时直方图的次数/总和增量计算），无新请求时返回None"""
+        count, total = get_metrics().totals("fetch_seconds")
+        last_count, last_total = self._last_fetch
+        self._last_fetch = (count, total)
+        if count <= last_count:
+            return None
+        return (total - last_total) / (count - last_count)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.adjust()
+            except Exception as e:
+                logger.error(f"线程数调整失败：{e}")
+
+    def adjust(self):
+        """执行一次调整"""
+        fill = self.result_queue.qsize() / self.result_queue.maxsize if self.result_queue.maxsize else 0.0
+        latency = self._recent_fetch_latency()
+        if latency is not None:
+            # 基线延迟为慢速滑动平均，用于识别延迟突然翻倍（对端限流或变慢）
+            if self._baseline_latency is None:
+                self._baseline_latency = latency
+            else:
+                self._baseline_latency += 0.1 * (latency - self._baseline_latency)
+
+        if fill >= self.high_watermark:
+            self.parse_pool.resize(self.parse_pool.size + 1)
+            if self.crawl_pool is not None:
+                self.crawl_pool.resize(self.crawl_pool.size - 1)
+        elif fill <= self.low_watermark:
+            if self.parse_pool.size > self.parse_pool.min_size and self.result_queue.qsize() == 0:
+                self.parse_pool.resize(self.parse_pool.size - 1)
+            if self.crawl_pool is not None and self.crawl_queue.qsize() > 0 and latency is not None:
+                if latency > 2 * self._baseline_latency:
+                    self.crawl_pool.resize(self.crawl_pool.size - 1)
+                else:
+                    self.crawl_pool.resize(self.crawl_pool.size + 1)
\ No newline at end of file